@@ -0,0 +1,157 @@
+from Stmt import Stmt
+from typing import Any
+import hashlib
+import hmac
+import os
+import pickle
+import secrets
+import sys
+
+'''
+Caches the resolved program for a script on disk so that reruns skip the
+scanner, parser and resolver. The Resolver records its results on the tree
+itself, so the pickled statement list is everything the engines need.
+
+Entries live in a `__loxcache__` directory beside the script and are keyed by
+a hash of the script's source and of the interpreter's front end. Editing the
+script or any module that shapes the tree produces a new key; the stale entry
+for that script is removed when the new one is written.
+
+Unpickling runs code named by the data, and anyone who can write beside a
+script could plant an entry under a key they can compute. So every entry
+starts with an HMAC of its key and contents under a secret kept in the
+user's own cache directory, and an entry whose tag does not match is never
+unpickled. Without a usable secret the cache is not used.
+'''
+
+CACHE_DIR: str = "__loxcache__"
+TAG_SIZE: int = hashlib.sha256().digest_size
+
+# Modules whose classes end up in, or decide the shape of, a cached tree.
+FRONT_END: list[str] = [
+    "Token.py", "TokenType.py", "Expr.py", "Stmt.py",
+    "Scanner.py", "Parser.py", "Resolver.py", "InlineCache.py", "Cache.py",
+]
+
+def interpreterVersion() -> str:
+    digest = hashlib.sha256(sys.version.encode())
+    here: str = os.path.dirname(os.path.abspath(__file__))
+    for module in FRONT_END:
+        with open(os.path.join(here, module), "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+def secretPath() -> str:
+    base: str = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "pylox", "secret")
+
+def loadSecret() -> bytes | None:
+    '''
+    The user's signing secret, created on first use. None if it can't be
+    made, or if it is not private to the user and so can't be trusted.
+    '''
+    path: str = secretPath()
+    try:
+        os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+        try:
+            created: int = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        except FileExistsError:
+            pass
+        else:
+            with os.fdopen(created, "wb") as f:
+                f.write(secrets.token_bytes(32))
+
+        with open(path, "rb") as f:
+            info: os.stat_result = os.fstat(f.fileno())
+            if hasattr(os, "getuid") and (info.st_uid != os.getuid() or info.st_mode & 0o077):
+                return None
+            secret: bytes = f.read()
+    except OSError:
+        return None
+    return secret if len(secret) == 32 else None
+
+class Cache:
+    def __init__(self) -> None:
+        self.version: str = interpreterVersion()
+        self.secret: bytes | None = loadSecret()
+        self.hits: int = 0
+        self.misses: int = 0
+        self.writes: int = 0
+        self.errors: int = 0
+
+    def key(self, source: bytes) -> str:
+        digest = hashlib.sha256(self.version.encode())
+        digest.update(source)
+        return digest.hexdigest()[:32]
+
+    def entryPath(self, script: str, key: str) -> str:
+        directory: str = os.path.join(os.path.dirname(os.path.abspath(script)), CACHE_DIR)
+        return os.path.join(directory, f"{os.path.basename(script)}.{key}.pickle")
+
+    def sign(self, key: str, data: bytes) -> bytes:
+        return hmac.new(self.secret, key.encode() + data, hashlib.sha256).digest()
+
+    def load(self, script: str, source: bytes) -> list[Stmt] | None:
+        if self.secret is None:
+            self.misses += 1
+            return None
+
+        key: str = self.key(source)
+        path: str = self.entryPath(script, key)
+        try:
+            with open(path, "rb") as f:
+                entry: bytes = f.read()
+            tag, data = entry[:TAG_SIZE], entry[TAG_SIZE:]
+            if not hmac.compare_digest(tag, self.sign(key, data)):
+                raise ValueError("cache entry not signed by this user")
+            statements: list[Stmt] = pickle.loads(data)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except Exception:
+            self.errors += 1
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return statements
+
+    def store(self, script: str, source: bytes, statements: list[Stmt]) -> None:
+        if self.secret is None:
+            self.errors += 1
+            return
+
+        key: str = self.key(source)
+        path: str = self.entryPath(script, key)
+        directory: str = os.path.dirname(path)
+        prefix: str = f"{os.path.basename(script)}."
+
+        try:
+            os.makedirs(directory, exist_ok=True)
+            data: bytes = pickle.dumps(statements, protocol=pickle.HIGHEST_PROTOCOL)
+
+            temporary: str = f"{path}.{os.getpid()}.tmp"
+            with open(temporary, "wb") as f:
+                f.write(self.sign(key, data))
+                f.write(data)
+            os.replace(temporary, path)
+
+            for entry in os.listdir(directory):
+                stale: str = os.path.join(directory, entry)
+                if (entry.startswith(prefix) and entry.endswith(".pickle")
+                        and len(entry) == len(prefix) + len(key) + len(".pickle")
+                        and stale != path):
+                    os.remove(stale)
+        except (OSError, RecursionError, pickle.PicklingError):
+            self.errors += 1
+            return
+
+        self.writes += 1
+
+    def report(self) -> dict[str, Any]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "writes": self.writes,
+            "errors": self.errors,
+        }
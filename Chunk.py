@@ -0,0 +1,147 @@
+from enum import IntEnum, auto
+from Token import Token
+from typing import Any
+
+class OpCode(IntEnum):
+    CONSTANT = auto()
+    NIL = auto()
+    TRUE = auto()
+    FALSE = auto()
+    POP = auto()
+
+    GET_LOCAL = auto()
+    SET_LOCAL = auto()
+    GET_GLOBAL = auto()
+    DEFINE_GLOBAL = auto()
+    SET_GLOBAL = auto()
+    GET_UPVALUE = auto()
+    SET_UPVALUE = auto()
+    GET_PROPERTY = auto()
+    SET_PROPERTY = auto()
+    GET_SUPER = auto()
+
+    EQUAL = auto()
+    NOT_EQUAL = auto()
+    GREATER = auto()
+    GREATER_EQUAL = auto()
+    LESS = auto()
+    LESS_EQUAL = auto()
+    ADD = auto()
+    SUBTRACT = auto()
+    MULTIPLY = auto()
+    DIVIDE = auto()
+    NOT = auto()
+    NEGATE = auto()
+
+    PRINT = auto()
+    JUMP = auto()
+    JUMP_IF_FALSE = auto()
+    LOOP = auto()
+    CALL = auto()
+    INVOKE = auto()
+    SUPER_INVOKE = auto()
+    CLOSURE = auto()
+    CLOSE_UPVALUE = auto()
+    RETURN = auto()
+    CLASS = auto()
+    INHERIT = auto()
+    METHOD = auto()
+
+# Number of inline operands that follow each opcode in Chunk.code.
+# CLOSURE is followed by a further two operands per captured upvalue.
+OPERANDS: dict[OpCode, int] = {
+    OpCode.CONSTANT: 1,
+    OpCode.GET_LOCAL: 1,
+    OpCode.SET_LOCAL: 1,
+    OpCode.GET_GLOBAL: 1,
+    OpCode.DEFINE_GLOBAL: 1,
+    OpCode.SET_GLOBAL: 1,
+    OpCode.GET_UPVALUE: 1,
+    OpCode.SET_UPVALUE: 1,
+    OpCode.GET_PROPERTY: 1,
+    OpCode.SET_PROPERTY: 1,
+    OpCode.GET_SUPER: 1,
+    OpCode.JUMP: 1,
+    OpCode.JUMP_IF_FALSE: 1,
+    OpCode.LOOP: 1,
+    OpCode.CALL: 1,
+    OpCode.INVOKE: 2,
+    OpCode.SUPER_INVOKE: 2,
+    OpCode.CLOSURE: 1,
+    OpCode.CLASS: 1,
+    OpCode.METHOD: 1,
+}
+
+class Chunk:
+    '''
+    A flat sequence of instructions. Opcodes and their operands are stored
+    inline as plain ints so the VM can index them without decoding. Jump
+    operands are absolute offsets into `code`. `tokens` runs parallel to
+    `code` and holds the source token each instruction was compiled from,
+    which is what runtime errors report their line from.
+    '''
+    def __init__(self) -> None:
+        self.code: list[int] = []
+        self.tokens: list[Token | None] = []
+        self.constants: list[Any] = []
+        self.constantIndex: dict[tuple[type, Any], int] = dict()
+
+    def write(self, byte: int, token: Token | None) -> int:
+        self.code.append(int(byte))
+        self.tokens.append(token)
+        return len(self.code) - 1
+
+    def addConstant(self, value: Any) -> int:
+        key: tuple[type, Any] = (type(value), value)
+        if type(value) is float:
+            # 0.0 == -0.0, but they print differently.
+            key = (float, repr(value))
+        if key in self.constantIndex:
+            return self.constantIndex[key]
+
+        self.constants.append(value)
+        self.constantIndex[key] = len(self.constants) - 1
+        return len(self.constants) - 1
+
+    def disassemble(self, name: str) -> str:
+        out: list[str] = [f"== {name} =="]
+        offset: int = 0
+        while offset < len(self.code):
+            op: OpCode = OpCode(self.code[offset])
+            token: Token | None = self.tokens[offset]
+            line: str = str(token.line) if token is not None else '-'
+            count: int = OPERANDS.get(op, 0)
+            operands: list[int] = self.code[offset + 1:offset + 1 + count]
+
+            text: str = f"{offset:04d} {line:>4} {op.name:<16}"
+            text += ' '.join(str(operand) for operand in operands)
+            if op in (OpCode.CONSTANT, OpCode.GET_GLOBAL, OpCode.SET_GLOBAL,
+                      OpCode.DEFINE_GLOBAL, OpCode.GET_PROPERTY,
+                      OpCode.SET_PROPERTY, OpCode.GET_SUPER, OpCode.CLASS,
+                      OpCode.METHOD, OpCode.CLOSURE, OpCode.INVOKE,
+                      OpCode.SUPER_INVOKE):
+                text += f" '{self.constants[operands[0]]}'"
+            out.append(text)
+
+            offset += 1 + count
+            if op == OpCode.CLOSURE:
+                upvalueCount: int = self.constants[operands[0]].upvalueCount
+                offset += 2 * upvalueCount
+
+        return '\n'.join(out)
+
+class FunctionProto:
+    '''
+    The compiled, environment-free form of a Lox function. Closures created
+    at runtime share a single FunctionProto.
+    '''
+    def __init__(self, name: str, arity: int) -> None:
+        self.name: str = name
+        self.arity: int = arity
+        self.chunk: Chunk = Chunk()
+        self.upvalueCount: int = 0
+
+    def __str__(self) -> str:
+        if self.name == "":
+            return "<script>"
+        return f"<fn {self.name}>"
@@ -0,0 +1,546 @@
+from Expr import *
+from Stmt import *
+from Environment import Cell, Environment, GlobalEnvironment
+from Interpreter import Interpreter
+from LoxCallable import LoxCallable, LoxClass, LoxFunction, LoxInstance, LoxNative, MemoFunction
+from Return import Completion, RETURN
+from RuntimeError import NativeError, RuntimeError
+from Rope import ROPE_MIN, STRINGS, concat
+from Equality import isEqual
+from TokenType import TokenType
+from typing import Any, Callable
+
+'''
+The closure compiler walks the resolved tree once and turns every node into a
+Python closure specialised for that node: its operator, its resolved scope
+distance and its children are all bound when the closure is built. Running
+the program is then a matter of calling closures, so the `match` dispatch in
+Interpreter.execute/evaluate and the operator `match` in visitBinaryExpr are
+paid once per node instead of once per evaluation.
+
+Closures take the current frame as their only argument instead of reading
+and restoring `self.environment`.
+'''
+
+Exec = Callable[[Environment], Completion | None]
+Eval = Callable[[Environment], Any]
+
+class ClosureInterpreter(Interpreter):
+    def __init__(self) -> None:
+        super().__init__()
+        self.bodies: dict[int, tuple[list[Stmt], Exec]] = dict()
+
+    def interpret(self, statements: list[Stmt]) -> None:
+        try:
+            program: list[Exec] = [self.compileStmt(s) for s in statements]
+            for statement in program:
+                statement(self.environment)
+        except RuntimeError as error:
+            for hook in self.hooks:
+                hook.error(self, error)
+            self.output.flush()
+            import Lox
+            Lox.runtime_error(error)
+        finally:
+            self.output.flush()
+
+    def executeBlock(self, statements: list[Stmt], environment: Environment) -> Completion | None:
+        compiled: tuple[list[Stmt], Exec] | None = self.bodies.get(id(statements))
+        if compiled is None:
+            compiled = (statements, self.compileBlock(statements))
+            self.bodies[id(statements)] = compiled
+        return compiled[1](environment)
+
+    def compileBlock(self, statements: list[Stmt]) -> Exec:
+        body: tuple[Exec, ...] = tuple(self.compileStmt(s) for s in statements)
+
+        def run(env: Environment) -> Completion | None:
+            for statement in body:
+                if statement(env) is not None:
+                    return RETURN
+            return None
+        return run
+
+    def compileStmt(self, stmt: Stmt) -> Exec:
+        match stmt:
+            case Expression():
+                return self.compileExpression(stmt)
+            case Print():
+                return self.compilePrint(stmt)
+            case Var():
+                return self.compileVar(stmt)
+            case Block():
+                return self.compileBlockStmt(stmt)
+            case If():
+                return self.compileIf(stmt)
+            case While():
+                return self.compileWhile(stmt)
+            case Function():
+                return self.compileFunction(stmt)
+            case Return():
+                return self.compileReturn(stmt)
+            case Class():
+                return self.compileClass(stmt)
+            case _:
+                raise Exception(f"Attempted to compile unmatched stmt type.")
+
+    def compileExpr(self, expr: Expr) -> Eval:
+        match expr:
+            case Literal():
+                return self.compileLiteral(expr)
+            case Group():
+                return self.compileExpr(expr.expression)
+            case Unary():
+                return self.compileUnary(expr)
+            case Binary():
+                return self.compileBinary(expr)
+            case Variable():
+                return self.compileLookUp(expr.name, expr)
+            case Assign():
+                return self.compileAssign(expr)
+            case Logical():
+                return self.compileLogical(expr)
+            case Call():
+                return self.compileCall(expr)
+            case Get():
+                return self.compileGet(expr)
+            case Set():
+                return self.compileSet(expr)
+            case This():
+                return self.compileLookUp(expr.keyword, expr)
+            case Super():
+                return self.compileSuper(expr)
+            case _:
+                raise Exception(f"Attempted to compile unmatched expression type.")
+
+    def compileExpression(self, stmt: Expression) -> Exec:
+        expression: Eval = self.compileExpr(stmt.expression)
+
+        def run(env: Environment) -> None:
+            expression(env)
+        return run
+
+    def compilePrint(self, stmt: Print) -> Exec:
+        expression: Eval = self.compileExpr(stmt.expression)
+        stringify: Callable[[Any], str] = self.stringify
+        interpreter: Interpreter = self
+
+        def run(env: Environment) -> None:
+            interpreter.output.write(stringify(expression(env)) + "\n")
+        return run
+
+    def compileVar(self, stmt: Var) -> Exec:
+        name: str = stmt.name.lexeme
+        initializer: Eval = self.compileLiteral(Literal(None))
+        if stmt.initializer is not None:
+            initializer = self.compileExpr(stmt.initializer)
+
+        slot: int | None = stmt.slot
+        if slot is None:
+            globals: GlobalEnvironment = self.globals
+
+            def defineGlobal(env: Environment) -> None:
+                globals.define(name, initializer(env))
+            return defineGlobal
+
+        if stmt.cell:
+            def defineCell(env: Environment) -> None:
+                env.values[slot] = Cell(initializer(env))
+            return defineCell
+
+        def defineLocal(env: Environment) -> None:
+            env.values[slot] = initializer(env)
+        return defineLocal
+
+    def compileDefine(self, stmt: Function | Class,
+                      build: Callable[[Environment], Any]) -> Exec:
+        '''
+        Stores what `build` makes in the variable `stmt` declares. A captured
+        name gets its cell first, so the closures `build` makes can capture it.
+        '''
+        slot: int | None = stmt.slot
+        if slot is None:
+            name: str = stmt.name.lexeme
+            globals: GlobalEnvironment = self.globals
+
+            def defineGlobal(env: Environment) -> None:
+                globals.define(name, build(env))
+            return defineGlobal
+
+        if stmt.cell:
+            def defineCell(env: Environment) -> None:
+                cell: Cell = Cell()
+                env.values[slot] = cell
+                cell.value = build(env)
+            return defineCell
+
+        def defineLocal(env: Environment) -> None:
+            env.values[slot] = build(env)
+        return defineLocal
+
+    def compileBlockStmt(self, stmt: Block) -> Exec:
+        body: Exec = self.compileBlock(stmt.statements)
+        if not stmt.frameSize:
+            return body
+
+        size: int = stmt.frameSize
+
+        def run(env: Environment) -> Completion | None:
+            return body(Environment([None] * size))
+        return run
+
+    def compileIf(self, stmt: If) -> Exec:
+        condition: Eval = self.compileExpr(stmt.condition)
+        thenBranch: Exec = self.compileStmt(stmt.thenBranch)
+
+        if stmt.elseBranch is None:
+            def run(env: Environment) -> Completion | None:
+                value: Any = condition(env)
+                if value is not None and value is not False:
+                    return thenBranch(env)
+                return None
+            return run
+
+        elseBranch: Exec = self.compileStmt(stmt.elseBranch)
+
+        def runElse(env: Environment) -> Completion | None:
+            value: Any = condition(env)
+            if value is not None and value is not False:
+                return thenBranch(env)
+            return elseBranch(env)
+        return runElse
+
+    def compileWhile(self, stmt: While) -> Exec:
+        condition: Eval = self.compileExpr(stmt.condition)
+        body: Exec = self.compileStmt(stmt.body)
+
+        def run(env: Environment) -> Completion | None:
+            while True:
+                value: Any = condition(env)
+                if value is None or value is False:
+                    return None
+                if body(env) is not None:
+                    return RETURN
+        return run
+
+    def compileFunction(self, stmt: Function) -> Exec:
+        self.precompileBody(stmt.body)
+
+        kind: type[LoxFunction] = LoxFunction
+        if stmt.pure and self.memo is not None:
+            kind = MemoFunction
+        upvalues: list[tuple[bool, int]] = stmt.upvalues
+
+        def build(env: Environment) -> LoxFunction:
+            return kind(stmt, env.capture(upvalues), False)
+        return self.compileDefine(stmt, build)
+
+    def precompileBody(self, statements: list[Stmt]) -> None:
+        if id(statements) not in self.bodies:
+            self.bodies[id(statements)] = (statements, self.compileBlock(statements))
+
+    def compileReturn(self, stmt: Return) -> Exec:
+        interpreter: Interpreter = self
+
+        if stmt.value is None:
+            def returnNil(env: Environment) -> Completion:
+                interpreter.returnValue = None
+                return RETURN
+            return returnNil
+
+        value: Eval = self.compileExpr(stmt.value)
+
+        def run(env: Environment) -> Completion:
+            interpreter.returnValue = value(env)
+            return RETURN
+        return run
+
+    def compileClass(self, stmt: Class) -> Exec:
+        for method in stmt.methods:
+            self.precompileBody(method.body)
+
+        superclassExpr: Eval | None = None
+        if stmt.superclass is not None:
+            superclassExpr = self.compileExpr(stmt.superclass)
+
+        def build(env: Environment) -> LoxClass:
+            superclass: Any = None
+            frame: Environment = env
+            if stmt.frameSize:
+                frame = Environment([None] * stmt.frameSize)
+            if superclassExpr is not None:
+                assert stmt.superclass is not None
+                superclass = superclassExpr(env)
+                if not (type(superclass) is LoxClass):
+                    raise RuntimeError(stmt.superclass.name, "Superclass must be a class.")
+                frame.values[stmt.superSlot] = Cell(superclass)
+
+            methods: dict[str, LoxFunction] = dict()
+            for method in stmt.methods:
+                methods[method.name.lexeme] = LoxFunction(
+                    method, frame.capture(method.upvalues), method.name.lexeme == "init")
+
+            return LoxClass(stmt.name.lexeme, superclass, methods)
+        return self.compileDefine(stmt, build)
+
+    def compileLiteral(self, expr: Literal) -> Eval:
+        value: Any = expr.value
+
+        def run(env: Environment) -> Any:
+            return value
+        return run
+
+    def compileLookUp(self, name: Token, expr: Variable | This | Super) -> Eval:
+        slot: int | None = expr.slot
+        if slot is None:
+            globals: GlobalEnvironment = self.globals
+
+            def lookUpGlobal(env: Environment) -> Any:
+                return globals.get(name)
+            return lookUpGlobal
+
+        if expr.upvalue:
+            def lookUpUpvalue(env: Environment) -> Any:
+                return env.cells[slot].value
+            return lookUpUpvalue
+        elif expr.cell:
+            def lookUpCell(env: Environment) -> Any:
+                return env.values[slot].value
+            return lookUpCell
+
+        def lookUpLocal(env: Environment) -> Any:
+            return env.values[slot]
+        return lookUpLocal
+
+    def compileAssign(self, expr: Assign) -> Eval:
+        value: Eval = self.compileExpr(expr.value)
+        name: Token = expr.name
+
+        slot: int | None = expr.slot
+        if slot is None:
+            globals: GlobalEnvironment = self.globals
+
+            def assignGlobal(env: Environment) -> Any:
+                result: Any = value(env)
+                globals.assign(name, result)
+                return result
+            return assignGlobal
+
+        if expr.upvalue:
+            def assignUpvalue(env: Environment) -> Any:
+                result: Any = value(env)
+                env.cells[slot].value = result
+                return result
+            return assignUpvalue
+        elif expr.cell:
+            def assignCell(env: Environment) -> Any:
+                result: Any = value(env)
+                env.values[slot].value = result
+                return result
+            return assignCell
+
+        def assignLocal(env: Environment) -> Any:
+            result: Any = value(env)
+            env.values[slot] = result
+            return result
+        return assignLocal
+
+    def compileLogical(self, expr: Logical) -> Eval:
+        left: Eval = self.compileExpr(expr.left)
+        right: Eval = self.compileExpr(expr.right)
+
+        if expr.operator.token_type == TokenType.OR:
+            def orExpr(env: Environment) -> Any:
+                value: Any = left(env)
+                if value is not None and value is not False:
+                    return value
+                return right(env)
+            return orExpr
+
+        def andExpr(env: Environment) -> Any:
+            value: Any = left(env)
+            if value is None or value is False:
+                return value
+            return right(env)
+        return andExpr
+
+    def compileUnary(self, expr: Unary) -> Eval:
+        right: Eval = self.compileExpr(expr.right)
+        operator: Token = expr.operator
+
+        if operator.token_type == TokenType.MINUS:
+            def negate(env: Environment) -> Any:
+                value: Any = right(env)
+                if type(value) is not float:
+                    raise RuntimeError(operator, "Operand must be a number.")
+                return -value
+            return negate
+
+        def bang(env: Environment) -> Any:
+            value: Any = right(env)
+            return value is None or value is False
+        return bang
+
+    def compileBinary(self, expr: Binary) -> Eval:
+        left: Eval = self.compileExpr(expr.left)
+        right: Eval = self.compileExpr(expr.right)
+        operator: Token = expr.operator
+
+        match operator.token_type:
+            case TokenType.PLUS:
+                def add(env: Environment) -> Any:
+                    a: Any = left(env)
+                    b: Any = right(env)
+                    if type(a) is float and type(b) is float:
+                        return a + b
+                    elif type(a) is str and type(b) is str and len(a) + len(b) < ROPE_MIN:
+                        return a + b
+                    elif type(a) in STRINGS and type(b) in STRINGS:
+                        return concat(a, b)
+                    raise RuntimeError(operator, "Operands must both be numbers or strings")
+                return add
+            case TokenType.EQUAL_EQUAL:
+                def equal(env: Environment) -> Any:
+                    return isEqual(left(env), right(env))
+                return equal
+            case TokenType.BANG_EQUAL:
+                def notEqual(env: Environment) -> Any:
+                    return not isEqual(left(env), right(env))
+                return notEqual
+
+        operation: Callable[[float, float], Any] = ClosureInterpreter.numberOps[operator.token_type]
+
+        def arithmetic(env: Environment) -> Any:
+            a: Any = left(env)
+            b: Any = right(env)
+            if type(a) is not float or type(b) is not float:
+                raise RuntimeError(operator, "Operands must be numbers.")
+            return operation(a, b)
+        return arithmetic
+
+    numberOps: dict[TokenType, Callable[[float, float], Any]] = {
+        TokenType.GREATER: float.__gt__,
+        TokenType.GREATER_EQUAL: float.__ge__,
+        TokenType.LESS: float.__lt__,
+        TokenType.LESS_EQUAL: float.__le__,
+        TokenType.MINUS: float.__sub__,
+        TokenType.SLASH: float.__truediv__,
+        TokenType.STAR: float.__mul__,
+    }
+
+    def compileCall(self, expr: Call) -> Eval:
+        if type(expr.callee) is Get:
+            return self.compileInvoke(expr, expr.callee)
+
+        callee: Eval = self.compileExpr(expr.callee)
+        arguments: tuple[Eval, ...] = tuple(self.compileExpr(a) for a in expr.arguments)
+        paren: Token = expr.paren
+        interpreter: Interpreter = self
+
+        def call(env: Environment) -> Any:
+            function: Any = callee(env)
+            values: list[Any] = [argument(env) for argument in arguments]
+
+            if not isinstance(function, LoxCallable):
+                raise RuntimeError(paren, "Can only call functions and classes.")
+            if len(values) != function.arity():
+                raise RuntimeError(
+                    paren,
+                    f"Expected {function.arity()} arguments but got {len(values)}.")
+
+            try:
+                return function.call(interpreter, values)
+            except RecursionError:
+                raise RuntimeError(paren, "Stack overflow.")
+            except NativeError as error:
+                raise RuntimeError(paren, str(error))
+        return call
+
+    def compileInvoke(self, expr: Call, get: Get) -> Eval:
+        thing: Eval = self.compileExpr(get.thing)
+        arguments: tuple[Eval, ...] = tuple(self.compileExpr(a) for a in expr.arguments)
+        name: Token = get.name
+        cache: InlineCache = get.cache
+        paren: Token = expr.paren
+        interpreter: Interpreter = self
+
+        def invoke(env: Environment) -> Any:
+            instance: Any = thing(env)
+            if type(instance) is LoxInstance:
+                method: LoxFunction | None = cache.method(instance)
+            elif isinstance(instance, LoxNative):
+                method = None
+            else:
+                raise RuntimeError(name, "Only instances have properties.")
+
+            if method is None:
+                function: Any = (cache.get(instance) if type(instance) is LoxInstance
+                                 else instance.getField(name))
+                values: list[Any] = [argument(env) for argument in arguments]
+                if not isinstance(function, LoxCallable):
+                    raise RuntimeError(paren, "Can only call functions and classes.")
+                if len(values) != function.arity():
+                    raise RuntimeError(
+                        paren,
+                        f"Expected {function.arity()} arguments but got {len(values)}.")
+                try:
+                    return function.call(interpreter, values)
+                except RecursionError:
+                    raise RuntimeError(paren, "Stack overflow.")
+                except NativeError as error:
+                    raise RuntimeError(paren, str(error))
+
+            values = [argument(env) for argument in arguments]
+            if len(values) != len(method.declaration.params):
+                raise RuntimeError(
+                    paren,
+                    f"Expected {method.arity()} arguments but got {len(values)}.")
+            try:
+                return method.invoke(interpreter, instance, values)
+            except RecursionError:
+                raise RuntimeError(paren, "Stack overflow.")
+        return invoke
+
+    def compileGet(self, expr: Get) -> Eval:
+        thing: Eval = self.compileExpr(expr.thing)
+        name: Token = expr.name
+        cache: InlineCache = expr.cache
+
+        def get(env: Environment) -> Any:
+            instance: Any = thing(env)
+            if type(instance) is LoxInstance:
+                return cache.get(instance)
+            if isinstance(instance, LoxNative):
+                return instance.getField(name)
+            raise RuntimeError(name, "Only instances have properties.")
+        return get
+
+    def compileSet(self, expr: Set) -> Eval:
+        thing: Eval = self.compileExpr(expr.thing)
+        value: Eval = self.compileExpr(expr.value)
+        name: Token = expr.name
+        cache: InlineCache = expr.cache
+
+        def set(env: Environment) -> Any:
+            instance: Any = thing(env)
+            if type(instance) is not LoxInstance:
+                raise RuntimeError(name, "Only instances have fields.")
+            result: Any = value(env)
+            cache.set(instance, result)
+            return result
+        return set
+
+    def compileSuper(self, expr: Super) -> Eval:
+        lookUpClass: Eval = self.compileLookUp(expr.keyword, expr)
+        lookUpThis: Eval = self.compileLookUp(expr.this.keyword, expr.this)
+        method: Token = expr.method
+        cache: InlineCache = expr.cache
+
+        def lookUpSuper(env: Environment) -> Any:
+            superclass: LoxClass = lookUpClass(env)
+            instance: LoxInstance = lookUpThis(env)
+            function: LoxFunction | None = cache.findMethod(superclass)
+            if function is None:
+                raise RuntimeError(method, f"Undefined property '{method.lexeme}'.")
+            return function.bind(instance)
+        return lookUpSuper
@@ -0,0 +1,386 @@
+from __future__ import annotations
+from Expr import *
+from Stmt import *
+from Chunk import Chunk, FunctionProto, OpCode
+from TokenType import TokenType
+from enum import Enum, auto
+
+'''
+Lowers a resolved program into bytecode for the VM. Name resolution follows
+the same rules as the Resolver: a name is a local if a lexically enclosing
+scope of the current function declares it, an upvalue if an enclosing
+function's scope does, and a global otherwise. Locals live in stack slots
+relative to the frame base; slot 0 holds the callee or, for methods, `this`.
+'''
+
+class FunType(Enum):
+    SCRIPT = auto()
+    FUNCTION = auto()
+    INITIALIZER = auto()
+    METHOD = auto()
+
+class Local:
+    def __init__(self, name: str, depth: int) -> None:
+        self.name: str = name
+        self.depth: int = depth
+        self.isCaptured: bool = False
+
+class FunctionState:
+    def __init__(self, enclosing: FunctionState | None,
+                 function: FunctionProto, fun_type: FunType) -> None:
+        self.enclosing: FunctionState | None = enclosing
+        self.function: FunctionProto = function
+        self.fun_type: FunType = fun_type
+        self.scopeDepth: int = 0
+        self.upvalues: list[tuple[bool, int]] = []
+
+        slotZero: str = "this" if fun_type in (FunType.METHOD, FunType.INITIALIZER) else ""
+        self.locals: list[Local] = [Local(slotZero, 0)]
+
+class Compiler:
+    def __init__(self) -> None:
+        self.state: FunctionState = FunctionState(
+            None, FunctionProto("", 0), FunType.SCRIPT)
+        self.token: Token | None = None
+
+    def compile(self, statements: list[Stmt]) -> FunctionProto:
+        for statement in statements:
+            self.compileStmt(statement)
+
+        self.emitReturn()
+        return self.state.function
+
+    @property
+    def chunk(self) -> Chunk:
+        return self.state.function.chunk
+
+    def emit(self, *code: int) -> int:
+        offset: int = 0
+        for byte in code:
+            offset = self.chunk.write(byte, self.token)
+        return offset
+
+    def emitConstant(self, value: Any) -> None:
+        self.emit(OpCode.CONSTANT, self.chunk.addConstant(value))
+
+    def emitJump(self, op: OpCode) -> int:
+        return self.emit(op, 0)
+
+    def patchJump(self, offset: int) -> None:
+        self.chunk.code[offset] = len(self.chunk.code)
+
+    def emitLoop(self, start: int) -> None:
+        self.emit(OpCode.LOOP, start)
+
+    def emitReturn(self) -> None:
+        if self.state.fun_type == FunType.INITIALIZER:
+            self.emit(OpCode.GET_LOCAL, 0)
+        else:
+            self.emit(OpCode.NIL)
+        self.emit(OpCode.RETURN)
+
+    def beginScope(self) -> None:
+        self.state.scopeDepth += 1
+
+    def endScope(self) -> None:
+        state: FunctionState = self.state
+        state.scopeDepth -= 1
+
+        while len(state.locals) > 0 and state.locals[-1].depth > state.scopeDepth:
+            if state.locals[-1].isCaptured:
+                self.emit(OpCode.CLOSE_UPVALUE)
+            else:
+                self.emit(OpCode.POP)
+            state.locals.pop()
+
+    def declareLocal(self, name: str) -> None:
+        self.state.locals.append(Local(name, self.state.scopeDepth))
+
+    def defineVariable(self, name: Token) -> None:
+        if self.state.scopeDepth > 0:
+            self.declareLocal(name.lexeme)
+            return
+
+        self.emit(OpCode.DEFINE_GLOBAL, self.chunk.addConstant(name.lexeme))
+
+    def resolveLocal(self, state: FunctionState, name: str) -> int:
+        for i in range(len(state.locals) - 1, -1, -1):
+            if state.locals[i].name == name:
+                return i
+        return -1
+
+    def addUpvalue(self, state: FunctionState, isLocal: bool, index: int) -> int:
+        upvalue: tuple[bool, int] = (isLocal, index)
+        if upvalue in state.upvalues:
+            return state.upvalues.index(upvalue)
+
+        state.upvalues.append(upvalue)
+        state.function.upvalueCount = len(state.upvalues)
+        return len(state.upvalues) - 1
+
+    def resolveUpvalue(self, state: FunctionState, name: str) -> int:
+        if state.enclosing is None:
+            return -1
+
+        local: int = self.resolveLocal(state.enclosing, name)
+        if local != -1:
+            state.enclosing.locals[local].isCaptured = True
+            return self.addUpvalue(state, True, local)
+
+        upvalue: int = self.resolveUpvalue(state.enclosing, name)
+        if upvalue != -1:
+            return self.addUpvalue(state, False, upvalue)
+
+        return -1
+
+    def namedVariable(self, name: Token, assign: Expr | None) -> None:
+        getOp: OpCode
+        setOp: OpCode
+        arg: int = self.resolveLocal(self.state, name.lexeme)
+        if arg != -1:
+            getOp, setOp = OpCode.GET_LOCAL, OpCode.SET_LOCAL
+        else:
+            arg = self.resolveUpvalue(self.state, name.lexeme)
+            if arg != -1:
+                getOp, setOp = OpCode.GET_UPVALUE, OpCode.SET_UPVALUE
+            else:
+                arg = self.chunk.addConstant(name.lexeme)
+                getOp, setOp = OpCode.GET_GLOBAL, OpCode.SET_GLOBAL
+
+        if assign is not None:
+            self.compileExpr(assign)
+            self.token = name
+            self.emit(setOp, arg)
+        else:
+            self.token = name
+            self.emit(getOp, arg)
+
+    def compileStmt(self, stmt: Stmt) -> None:
+        match stmt:
+            case Expression():
+                self.compileExpr(stmt.expression)
+                self.emit(OpCode.POP)
+            case Print():
+                self.compileExpr(stmt.expression)
+                self.emit(OpCode.PRINT)
+            case Var():
+                self.token = stmt.name
+                if stmt.initializer is not None:
+                    self.compileExpr(stmt.initializer)
+                else:
+                    self.emit(OpCode.NIL)
+                self.token = stmt.name
+                self.defineVariable(stmt.name)
+            case Block():
+                self.beginScope()
+                for statement in stmt.statements:
+                    self.compileStmt(statement)
+                self.endScope()
+            case If():
+                self.compileIf(stmt)
+            case While():
+                self.compileWhile(stmt)
+            case Function():
+                self.token = stmt.name
+                if self.state.scopeDepth > 0:
+                    # Declared before the body so the function can recurse.
+                    self.declareLocal(stmt.name.lexeme)
+                    self.compileFunction(stmt, FunType.FUNCTION)
+                else:
+                    self.compileFunction(stmt, FunType.FUNCTION)
+                    self.defineVariable(stmt.name)
+            case Return():
+                self.token = stmt.keyword
+                if stmt.value is None:
+                    self.emitReturn()
+                else:
+                    self.compileExpr(stmt.value)
+                    self.emit(OpCode.RETURN)
+            case Class():
+                self.compileClass(stmt)
+            case _:
+                raise Exception(f"Attempted to compile unmatched stmt type.")
+
+    def compileIf(self, stmt: If) -> None:
+        self.compileExpr(stmt.condition)
+        thenJump: int = self.emitJump(OpCode.JUMP_IF_FALSE)
+        self.emit(OpCode.POP)
+        self.compileStmt(stmt.thenBranch)
+
+        elseJump: int = self.emitJump(OpCode.JUMP)
+        self.patchJump(thenJump)
+        self.emit(OpCode.POP)
+
+        if stmt.elseBranch is not None:
+            self.compileStmt(stmt.elseBranch)
+        self.patchJump(elseJump)
+
+    def compileWhile(self, stmt: While) -> None:
+        loopStart: int = len(self.chunk.code)
+        self.compileExpr(stmt.condition)
+
+        exitJump: int = self.emitJump(OpCode.JUMP_IF_FALSE)
+        self.emit(OpCode.POP)
+        self.compileStmt(stmt.body)
+        self.emitLoop(loopStart)
+
+        self.patchJump(exitJump)
+        self.emit(OpCode.POP)
+
+    def compileFunction(self, stmt: Function, fun_type: FunType) -> None:
+        function: FunctionProto = FunctionProto(stmt.name.lexeme, len(stmt.params))
+        self.state = FunctionState(self.state, function, fun_type)
+        self.beginScope()
+
+        for param in stmt.params:
+            self.declareLocal(param.lexeme)
+
+        for statement in stmt.body:
+            self.compileStmt(statement)
+
+        self.token = stmt.name
+        self.emitReturn()
+
+        state: FunctionState = self.state
+        assert state.enclosing is not None
+        self.state = state.enclosing
+
+        self.token = stmt.name
+        self.emit(OpCode.CLOSURE, self.chunk.addConstant(function))
+        for isLocal, index in state.upvalues:
+            self.emit(1 if isLocal else 0, index)
+
+    def compileClass(self, stmt: Class) -> None:
+        self.token = stmt.name
+        nameConstant: int = self.chunk.addConstant(stmt.name.lexeme)
+        self.emit(OpCode.CLASS, nameConstant)
+        self.defineVariable(stmt.name)
+
+        if stmt.superclass is not None:
+            self.namedVariable(stmt.superclass.name, None)
+
+            self.beginScope()
+            self.declareLocal("super")
+
+            self.namedVariable(stmt.name, None)
+            self.token = stmt.superclass.name
+            self.emit(OpCode.INHERIT)
+
+        self.namedVariable(stmt.name, None)
+        for method in stmt.methods:
+            fun_type: FunType = FunType.METHOD
+            if method.name.lexeme == "init":
+                fun_type = FunType.INITIALIZER
+            self.compileFunction(method, fun_type)
+            self.emit(OpCode.METHOD, self.chunk.addConstant(method.name.lexeme))
+        self.emit(OpCode.POP)
+
+        if stmt.superclass is not None:
+            self.endScope()
+
+    def compileExpr(self, expr: Expr) -> None:
+        match expr:
+            case Literal():
+                if expr.value is None:
+                    self.emit(OpCode.NIL)
+                elif expr.value is True:
+                    self.emit(OpCode.TRUE)
+                elif expr.value is False:
+                    self.emit(OpCode.FALSE)
+                else:
+                    self.emitConstant(expr.value)
+            case Group():
+                self.compileExpr(expr.expression)
+            case Unary():
+                self.compileExpr(expr.right)
+                self.token = expr.operator
+                if expr.operator.token_type == TokenType.MINUS:
+                    self.emit(OpCode.NEGATE)
+                else:
+                    self.emit(OpCode.NOT)
+            case Binary():
+                self.compileExpr(expr.left)
+                self.compileExpr(expr.right)
+                self.token = expr.operator
+                self.emit(Compiler.binaryOps[expr.operator.token_type])
+            case Variable():
+                self.namedVariable(expr.name, None)
+            case Assign():
+                self.namedVariable(expr.name, expr.value)
+            case Logical():
+                self.compileLogical(expr)
+            case Call():
+                self.compileCall(expr)
+            case Get():
+                self.compileExpr(expr.thing)
+                self.token = expr.name
+                self.emit(OpCode.GET_PROPERTY, self.chunk.addConstant(expr.name.lexeme))
+            case Set():
+                self.compileExpr(expr.thing)
+                self.compileExpr(expr.value)
+                self.token = expr.name
+                self.emit(OpCode.SET_PROPERTY, self.chunk.addConstant(expr.name.lexeme))
+            case This():
+                self.namedVariable(expr.keyword, None)
+            case Super():
+                self.namedVariable(Token(TokenType.THIS, "this", None, expr.keyword.line), None)
+                self.namedVariable(expr.keyword, None)
+                self.token = expr.method
+                self.emit(OpCode.GET_SUPER, self.chunk.addConstant(expr.method.lexeme))
+            case _:
+                raise Exception(f"Attempted to compile unmatched expression type.")
+
+    binaryOps: dict[TokenType, OpCode] = {
+        TokenType.BANG_EQUAL: OpCode.NOT_EQUAL,
+        TokenType.EQUAL_EQUAL: OpCode.EQUAL,
+        TokenType.GREATER: OpCode.GREATER,
+        TokenType.GREATER_EQUAL: OpCode.GREATER_EQUAL,
+        TokenType.LESS: OpCode.LESS,
+        TokenType.LESS_EQUAL: OpCode.LESS_EQUAL,
+        TokenType.MINUS: OpCode.SUBTRACT,
+        TokenType.PLUS: OpCode.ADD,
+        TokenType.SLASH: OpCode.DIVIDE,
+        TokenType.STAR: OpCode.MULTIPLY,
+    }
+
+    def compileLogical(self, expr: Logical) -> None:
+        self.compileExpr(expr.left)
+
+        if expr.operator.token_type == TokenType.OR:
+            elseJump: int = self.emitJump(OpCode.JUMP_IF_FALSE)
+            endJump: int = self.emitJump(OpCode.JUMP)
+            self.patchJump(elseJump)
+            self.emit(OpCode.POP)
+            self.compileExpr(expr.right)
+            self.patchJump(endJump)
+        else:
+            endJump = self.emitJump(OpCode.JUMP_IF_FALSE)
+            self.emit(OpCode.POP)
+            self.compileExpr(expr.right)
+            self.patchJump(endJump)
+
+    def compileCall(self, expr: Call) -> None:
+        match expr.callee:
+            case Get():
+                self.compileExpr(expr.callee.thing)
+                for argument in expr.arguments:
+                    self.compileExpr(argument)
+                self.token = expr.paren
+                self.emit(OpCode.INVOKE,
+                          self.chunk.addConstant(expr.callee.name.lexeme),
+                          len(expr.arguments))
+            case Super():
+                self.namedVariable(Token(TokenType.THIS, "this", None, expr.paren.line), None)
+                for argument in expr.arguments:
+                    self.compileExpr(argument)
+                self.namedVariable(expr.callee.keyword, None)
+                self.token = expr.paren
+                self.emit(OpCode.SUPER_INVOKE,
+                          self.chunk.addConstant(expr.callee.method.lexeme),
+                          len(expr.arguments))
+            case _:
+                self.compileExpr(expr.callee)
+                for argument in expr.arguments:
+                    self.compileExpr(argument)
+                self.token = expr.paren
+                self.emit(OpCode.CALL, len(expr.arguments))
@@ -1,46 +1,66 @@
-from typing import Any, Self
+from __future__ import annotations
+from typing import Any
 from Token import Token
+from RuntimeError import RuntimeError
 
-class Environment:
-    def __init__(self, enclosing: Self | None = None) -> None:
-        self.values: dict = dict()
-        self.enclosing: Environment | None = enclosing
+class Cell:
+    '''
+    A local captured by a nested function. Its slot in the frame holds the
+    cell rather than the value, and every closure that captures it holds the
+    same cell, so assignments on either side are seen by the other after
+    the call that declared it has returned.
+    '''
+    __slots__ = ('value',)
 
-    def define(self, name: str, value: Any) -> None:
-        self.values[name] = value
+    def __init__(self, value: Any = None) -> None:
+        self.value: Any = value
 
-    def ancestor(self, distance: int) -> Self:
-        environment: Environment = self
+class Environment:
+    '''
+    The frame of one call. The Resolver gives each local of a function a
+    slot in a single flat frame shared by all the blocks of its body, so
+    entering a block allocates nothing and `values[slot]` finds a variable
+    without walking a chain of scopes. Only locals some nested function
+    captures are boxed in a `Cell`; `cells` holds the cells the running
+    function itself captured when it was declared.
+    '''
+    __slots__ = ('values', 'cells')
 
-        for i in range(distance):
-            if environment.enclosing is None:
-                raise Exception(f"Incorrect distance reached {i} in enclosing environments")
-            environment = environment.enclosing
+    def __init__(self, values: list[Any] | None = None, cells: tuple[Cell, ...] = ()) -> None:
+        self.values: list[Any] = values if values is not None else []
+        self.cells: tuple[Cell, ...] = cells
 
-        return environment
+    def capture(self, upvalues: list[tuple[bool, int]]) -> tuple[Cell, ...]:
+        '''
+        The cells for a function declared in this frame: each upvalue is a
+        captured local of this frame, or one of the cells this frame's own
+        function captured.
+        '''
+        if not upvalues:
+            return ()
+        return tuple(self.values[index] if local else self.cells[index]
+                     for local, index in upvalues)
 
-    def getAt(self, distance: int, name: str) -> Any:
-        return self.ancestor(distance).values[name]
+class GlobalEnvironment:
+    '''
+    The outermost scope. Globals are late bound, so unlike locals they are
+    looked up by name.
+    '''
+    def __init__(self) -> None:
+        self.values: dict[str, Any] = dict()
+
+    def define(self, name: str, value: Any) -> None:
+        self.values[name] = value
 
     def get(self, name: Token) -> Any:
-        if name.lexeme in self.values.keys():
+        if name.lexeme in self.values:
             return self.values[name.lexeme]
 
-        if self.enclosing is not None:
-            return self.enclosing.get(name)
-
         raise RuntimeError(name, f"Undefined variable '{name.lexeme}'.")
 
     def assign(self, name: Token, value: Any) -> None:
-        if name.lexeme in self.values.keys():
+        if name.lexeme in self.values:
             self.values[name.lexeme] = value
             return
 
-        if self.enclosing is not None:
-            self.enclosing.assign(name, value)
-            return
-
         raise RuntimeError(name, f"Undefined variable '{name.lexeme}'.")
-
-    def assignAt(self, distance: int, name: Token, value: Any) -> None:
-        self.ancestor(distance).values[name.lexeme] = value
@@ -0,0 +1,13 @@
+from typing import Any
+
+'''
+Lox `==`, shared by every engine and the optimizer. Values of different
+types are never equal in Lox, but Python has `True == 1` and `False == 0`,
+so a boolean only equals itself. Strings compare by text whether or not they
+are ropes, and everything else uses Python's `==`.
+'''
+
+def isEqual(left: Any, right: Any) -> bool:
+    if type(left) is bool or type(right) is bool:
+        return left is right
+    return left == right
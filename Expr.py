@@ -1,6 +1,8 @@
 from abc import ABC
 from Token import Token
-from typing import Any
+from TokenType import TokenType
+from InlineCache import InlineCache
+from typing import Any, Callable
 
 class Expr(ABC):
     ...
@@ -17,21 +19,34 @@ class Unary(Expr):
     def __init__(self, operator: Token, right: Expr) -> None:
         self.operator: Token = operator
         self.right: Expr = right
+        self.quick: Callable[[Any], Any] | None = None
+        self.deopts: int = 0
 
 class Binary(Expr):
     def __init__(self, left: Expr, operator: Token, right: Expr) -> None:
         self.left: Expr = left
         self.operator: Token = operator
         self.right: Expr = right
+        self.quick: Callable[[Any, Any], Any] | None = None
+        self.deopts: int = 0
 
 class Variable(Expr):
     def __init__(self, name: Token) -> None:
         self.name: Token = name
+        # Set by the Resolver: a slot of the frame, or of the closure's
+        # cells when `upvalue` is set, or None for a global. `cell` marks a
+        # frame slot that holds a Cell because a closure captured it.
+        self.slot: int | None = None
+        self.upvalue: bool = False
+        self.cell: bool = False
 
 class Assign(Expr):
     def __init__(self, name: Token, value: Expr) -> None:
         self.name: Token = name
         self.value: Expr = value
+        self.slot: int | None = None
+        self.upvalue: bool = False
+        self.cell: bool = False
 
 class Logical(Expr):
     def __init__(self, left: Expr, operator: Token, right: Expr) -> None:
@@ -49,18 +64,29 @@ class Get(Expr):
     def __init__(self, thing: Expr, name: Token) -> None:
         self.thing: Expr = thing
         self.name: Token = name
+        self.cache: InlineCache = InlineCache(name)
 
 class Set(Expr):
     def __init__(self, thing: Expr, name: Token, value: Expr) -> None:
         self.thing: Expr = thing
         self.name: Token = name
         self.value: Expr = value
+        self.cache: InlineCache = InlineCache(name)
 
 class This(Expr):
     def __init__(self, keyword: Token) -> None:
         self.keyword: Token = keyword
+        self.slot: int | None = None
+        self.upvalue: bool = False
+        self.cell: bool = False
 
 class Super(Expr):
     def __init__(self, keyword: Token, method: Token) -> None:
         self.keyword: Token = keyword
         self.method: Token = method
+        self.slot: int | None = None
+        self.upvalue: bool = False
+        self.cell: bool = False
+        # The receiver the method is bound to, resolved like any `this`.
+        self.this: This = This(Token(TokenType.THIS, "this", None, keyword.line))
+        self.cache: InlineCache = InlineCache(method)
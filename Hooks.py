@@ -0,0 +1,108 @@
+from __future__ import annotations
+from Expr import *
+from Stmt import *
+from RuntimeError import RuntimeError
+from typing import Any, Callable
+
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    from Interpreter import Interpreter
+
+'''
+Observers for a running program. Subclass `Hook`, override the events of
+interest and pass an instance to `Interpreter.addHook`:
+
+- `statement` before each statement runs,
+- `expression` before each expression is evaluated,
+- `call` before each call expression, and `returned` with its value after,
+- `error` when a runtime error stops the program.
+
+Nothing in the interpreter checks for hooks. Installing them replaces the
+interpreter's `execute`, `evaluate` or `visitCallExpr` with a wrapper that
+fires the events and then runs the original, and only for the events some
+hook overrides. Removing the last hook removes the wrappers, so an
+interpreter without hooks runs exactly the code it always did.
+
+The events come from the tree walker. Code compiled by the closure engine or
+the tier does not pass through those methods and is not observed, except for
+`error`.
+'''
+
+class Hook:
+    def statement(self, interpreter: Interpreter, stmt: Stmt) -> None:
+        ...
+
+    def expression(self, interpreter: Interpreter, expr: Expr) -> None:
+        ...
+
+    def call(self, interpreter: Interpreter, expr: Call) -> None:
+        ...
+
+    def returned(self, interpreter: Interpreter, expr: Call, value: Any) -> None:
+        ...
+
+    def error(self, interpreter: Interpreter, error: RuntimeError) -> None:
+        ...
+
+class NodeCounter(Hook):
+    '''Counts how many times each kind of statement and expression ran.'''
+    def __init__(self) -> None:
+        self.counts: dict[str, int] = {}
+
+    def statement(self, interpreter: Interpreter, stmt: Stmt) -> None:
+        name: str = type(stmt).__name__
+        self.counts[name] = self.counts.get(name, 0) + 1
+
+    def expression(self, interpreter: Interpreter, expr: Expr) -> None:
+        name: str = type(expr).__name__
+        self.counts[name] = self.counts.get(name, 0) + 1
+
+    def report(self) -> str:
+        total: int = sum(self.counts.values())
+        lines: list[str] = [f"nodes: {total} executed"]
+        for name, count in sorted(self.counts.items(), key=lambda item: item[1], reverse=True):
+            lines.append(f"  {name:<12} {count:>12} {100 * count / total:>6.1f}%")
+        return "\n".join(lines)
+
+def handlers(hooks: list[Hook], event: str) -> list[Callable[..., None]]:
+    '''The bound `event` methods of the hooks that override it.'''
+    return [getattr(hook, event) for hook in hooks
+            if getattr(type(hook), event) is not getattr(Hook, event)]
+
+def install(interpreter: Interpreter) -> None:
+    for name in ("execute", "evaluate", "visitCallExpr"):
+        interpreter.__dict__.pop(name, None)
+
+    statements: list[Callable[..., None]] = handlers(interpreter.hooks, "statement")
+    if statements:
+        execute: Callable[[Stmt], Any] = interpreter.execute
+
+        def hookedExecute(stmt: Stmt) -> Any:
+            for handler in statements:
+                handler(interpreter, stmt)
+            return execute(stmt)
+        interpreter.execute = hookedExecute
+
+    expressions: list[Callable[..., None]] = handlers(interpreter.hooks, "expression")
+    if expressions:
+        evaluate: Callable[[Expr], Any] = interpreter.evaluate
+
+        def hookedEvaluate(expr: Expr) -> Any:
+            for handler in expressions:
+                handler(interpreter, expr)
+            return evaluate(expr)
+        interpreter.evaluate = hookedEvaluate
+
+    calls: list[Callable[..., None]] = handlers(interpreter.hooks, "call")
+    returns: list[Callable[..., None]] = handlers(interpreter.hooks, "returned")
+    if calls or returns:
+        visitCallExpr: Callable[[Call], Any] = interpreter.visitCallExpr
+
+        def hookedCall(expr: Call) -> Any:
+            for handler in calls:
+                handler(interpreter, expr)
+            value: Any = visitCallExpr(expr)
+            for handler in returns:
+                handler(interpreter, expr, value)
+            return value
+        interpreter.visitCallExpr = hookedCall
@@ -0,0 +1,144 @@
+from __future__ import annotations
+from Token import Token
+from RuntimeError import RuntimeError
+from typing import Any
+
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    from LoxCallable import LoxClass, LoxFunction, LoxInstance, Shape
+
+'''
+Per-site caches for property access. Every `Get`, `Set` and `Super` node owns
+one, so a site that keeps seeing the same kinds of object skips the field
+and method lookups:
+
+- a `Get` site maps an instance shape to either the field's slot or the
+  method found on the class,
+- a `Set` site maps a shape to the field's slot, or to the shape the
+  instance moves to when the field is added,
+- a `Super` site maps a superclass to the method found.
+
+Lox classes cannot change once declared, and a shape belongs to one class,
+so an entry never goes stale.
+
+A site holds up to POLYMORPHIC_LIMIT entries. Once it has seen more keys than
+that it is megamorphic and stops caching.
+'''
+
+POLYMORPHIC_LIMIT: int = 4
+
+# Every cache that has missed at least once, for `report`.
+sites: list[InlineCache] = []
+
+class InlineCache:
+    __slots__ = ('token', 'entries', 'hits', 'misses', 'megamorphic')
+
+    def __init__(self, token: Token) -> None:
+        self.token: Token = token
+        self.entries: list[tuple[Any, ...]] = []
+        self.hits: int = 0
+        self.misses: int = 0
+        self.megamorphic: bool = False
+
+    def get(self, instance: LoxInstance) -> Any:
+        slot, method = self.lookup(instance.shape)
+        if slot is not None:
+            return instance.values[slot]
+        if method is None:
+            raise RuntimeError(self.token, f"Undefined property '{self.token.lexeme}'.")
+        return method.bind(instance)
+
+    def method(self, instance: LoxInstance) -> LoxFunction | None:
+        '''
+        The method a call through this site invokes on `instance`, or None
+        when the property is a field or is missing and `get` must decide.
+        '''
+        slot, method = self.lookup(instance.shape)
+        if slot is not None:
+            return None
+        return method
+
+    def lookup(self, shape: Shape) -> tuple[int | None, LoxFunction | None]:
+        for entry in self.entries:
+            if entry[0] is shape:
+                self.hits += 1
+                return entry[1], entry[2]
+
+        self.miss()
+        slot: int | None = shape.slots.get(self.token.lexeme)
+        method: LoxFunction | None = None
+        if slot is None:
+            method = shape.loxClass.findMethod(self.token.lexeme)
+        self.remember((shape, slot, method))
+        return slot, method
+
+    def set(self, instance: LoxInstance, value: Any) -> None:
+        shape: Shape = instance.shape
+        for entry in self.entries:
+            if entry[0] is shape:
+                self.hits += 1
+                if entry[1] is shape:
+                    instance.values[entry[2]] = value
+                else:
+                    instance.shape = entry[1]
+                    instance.values.append(value)
+                return
+
+        self.miss()
+        instance.setField(self.token, value)
+        self.remember((shape, instance.shape, instance.shape.slots[self.token.lexeme]))
+
+    def findMethod(self, loxClass: LoxClass) -> LoxFunction | None:
+        for entry in self.entries:
+            if entry[0] is loxClass:
+                self.hits += 1
+                return entry[1]
+
+        self.miss()
+        method: LoxFunction | None = loxClass.findMethod(self.token.lexeme)
+        self.remember((loxClass, method))
+        return method
+
+    def miss(self) -> None:
+        if self.misses == 0:
+            sites.append(self)
+        self.misses += 1
+
+    def remember(self, entry: tuple[Any, ...]) -> None:
+        if self.megamorphic:
+            return
+
+        if len(self.entries) < POLYMORPHIC_LIMIT:
+            self.entries.append(entry)
+        else:
+            self.entries = []
+            self.megamorphic = True
+
+    def state(self) -> str:
+        if self.megamorphic:
+            return "megamorphic"
+        if len(self.entries) > 1:
+            return "polymorphic"
+        return "monomorphic"
+
+def report(limit: int = 10) -> str:
+    hits: int = sum(site.hits for site in sites)
+    misses: int = sum(site.misses for site in sites)
+    total: int = hits + misses
+    rate: float = 100 * hits / total if total else 0.0
+
+    states: dict[str, int] = {"monomorphic": 0, "polymorphic": 0, "megamorphic": 0}
+    for site in sites:
+        states[site.state()] += 1
+
+    lines: list[str] = [
+        f"inline caches: {len(sites)} sites, {hits} hits, {misses} misses ({rate:.1f}% hit rate)",
+        "  " + ", ".join(f"{count} {state}" for state, count in states.items()),
+    ]
+
+    worst: list[InlineCache] = sorted(sites, key=lambda site: site.misses, reverse=True)
+    for site in worst[:limit]:
+        lines.append(f"  [line {site.token.line}] .{site.token.lexeme}: "
+                     f"{site.hits} hits, {site.misses} misses, {site.state()}")
+
+    return "\n".join(lines)
@@ -1,41 +1,74 @@
 from sre_compile import dis
 from Expr import *
-from LoxCallable import LoxInstance
+from LoxCallable import LoxFunction, LoxInstance, LoxNative
 from Stmt import *
-from Environment import Environment
+from Environment import Cell, Environment, GlobalEnvironment
 from TokenType import TokenType
 from typing import Any
-from RuntimeError import RuntimeError
-from Return import ReturnException
+from RuntimeError import NativeError, RuntimeError
+from Return import Completion, RETURN
+from Tier import Tier
+from Memo import MemoCache
+from Hooks import Hook
+from Output import Sink, StreamSink
+import Hooks
+from Quicken import DEOPT
+from Rope import ROPE_MIN, STRINGS, concat
+from Equality import isEqual
+import Quicken
 
 class Interpreter:
     def __init__(self):
-        self.globals: Environment = Environment()
-        self.environment: Environment = self.globals
-        self.locals: dict[Expr, int] = dict()
-
-        from LoxCallable import Clock
+        self.globals: GlobalEnvironment = GlobalEnvironment()
+        self.environment: Environment = Environment()
+        self.tier: Tier | None = None
+        self.memo: MemoCache | None = None
+        self.returnValue: Any = None
+        self.hooks: list[Hook] = []
+        self.output: Sink = StreamSink()
+
+        from LoxCallable import Clock, LoxList, LoxMap, NativeClass
         self.globals.define("clock", Clock())
+        self.globals.define("List", NativeClass("List", LoxList))
+        self.globals.define("Map", NativeClass("Map", LoxMap))
+        from NumArray import makeNumArray
+        self.globals.define("NumArray", NativeClass("NumArray", makeNumArray, 1))
 
     def interpret(self, statements: list[Stmt]) -> None:
         try:
             for statement in statements:
                 self.execute(statement)
         except RuntimeError as error:
+            for hook in self.hooks:
+                hook.error(self, error)
+            self.output.flush()
             import Lox
             Lox.runtime_error(error)
+        finally:
+            self.output.flush()
+
+    def addHook(self, hook: Hook) -> None:
+        self.hooks.append(hook)
+        Hooks.install(self)
 
-    def resolve(self, expr: Expr, depth: int) -> None:
-        self.locals[expr] = depth
+    def removeHook(self, hook: Hook) -> None:
+        self.hooks.remove(hook)
+        Hooks.install(self)
 
-    def execute(self, stmt: Stmt) -> None:
+    def resolve(self, expr: Variable | Assign | This | Super,
+                slot: int, upvalue: bool, cell: bool) -> None:
+        expr.slot = slot
+        expr.upvalue = upvalue
+        expr.cell = cell
+
+    def execute(self, stmt: Stmt) -> Completion | None:
         match stmt:
             case Print():
                 self.visitPrintStmt(stmt)
             case Expression():
                 self.visitExpressionStmt(stmt)
             case Block():
-                self.visitBlockStmt(stmt)
+                return self.visitBlockStmt(stmt)
             case Var():
                 self.visitVarStmt(stmt)
             case If():
@@ -83,24 +116,31 @@ class Interpreter:
     def stringify(self, object: Any) -> str:
         if object is None:
             return 'nil'
+        elif type(object) is bool:
+            return 'true' if object else 'false'
         elif type(object) is float:
             text: str = str(object)
             if len(text) >= 2 and text[-2:] == ".0":
                 text = text[:-2]
             return text
+        elif isinstance(object, LoxNative):
+            return object.show(self.stringify)
         return str(object)
 
-    def executeBlock(self, statements: list[Stmt], environment: Environment) -> None:
+    def executeBlock(self, statements: list[Stmt], environment: Environment) -> Completion | None:
         previous: Environment = self.environment
 
         try:
             self.environment = environment
 
             for statement in statements:
-                self.execute(statement)
+                if self.execute(statement) is not None:
+                    return RETURN
         finally:
             self.environment = previous
 
+        return None
+
     def visitClassStmt(self, stmt: Class) -> None:
         superclass: Any = None
         if stmt.superclass is not None:
@@ -109,77 +149,104 @@ class Interpreter:
             if not (type(superclass) is LoxClass):
                 raise RuntimeError(stmt.superclass.name, "Superclass must be a class.")
 
-        self.environment.define(stmt.name.lexeme, None)
-
+        self.declare(stmt)
+        frame: Environment = self.environment
+        if stmt.frameSize:
+            frame = Environment([None] * stmt.frameSize)
         if stmt.superclass is not None:
-            self.environment = Environment(self.environment)
-            self.environment.define("super", superclass)
+            frame.values[stmt.superSlot] = Cell(superclass)
 
         from LoxCallable import LoxFunction
         methods: dict[str, LoxFunction] = dict()
         for method in stmt.methods:
             function: LoxFunction = LoxFunction(
-                method, self.environment, method.name.lexeme == "init")
+                method, frame.capture(method.upvalues), method.name.lexeme == "init")
             methods[method.name.lexeme] = function
 
         from LoxCallable import LoxClass
-        loxClass: LoxClass = LoxClass(stmt.name.lexeme, superclass, methods)
-
-        if superclass is not None:
-            assert self.environment.enclosing is not None
-            self.environment = self.environment.enclosing
-
-        self.environment.assign(stmt.name, loxClass)
+        self.define(stmt, LoxClass(stmt.name.lexeme, superclass, methods))
+
+    def declare(self, stmt: Function | Class) -> None:
+        # A captured name gets its cell before its value is built, so the
+        # function or methods can capture the cell they will be stored in.
+        if stmt.cell:
+            self.environment.values[stmt.slot] = Cell()
+
+    def define(self, stmt: Function | Class, value: Any) -> None:
+        if stmt.slot is None:
+            self.globals.define(stmt.name.lexeme, value)
+        elif stmt.cell:
+            self.environment.values[stmt.slot].value = value
+        else:
+            self.environment.values[stmt.slot] = value
 
-    def visitReturnStmt(self, stmt: Return) -> None:
+    def visitReturnStmt(self, stmt: Return) -> Completion:
         value: Any = None
 
         if stmt.value is not None:
             value = self.evaluate(stmt.value)
 
-        raise ReturnException(value)
+        self.returnValue = value
+        return RETURN
 
     def visitFunctionStmt(self, stmt: Function) -> None:
-        from LoxCallable import LoxFunction
-        function: LoxFunction = LoxFunction(stmt, self.environment, 
-                                            False)
-        self.environment.define(stmt.name.lexeme, function)
+        from LoxCallable import LoxFunction, MemoFunction
+        self.declare(stmt)
+        cells: tuple[Cell, ...] = self.environment.capture(stmt.upvalues)
+        if stmt.pure and self.memo is not None:
+            function: LoxFunction = MemoFunction(stmt, cells, False)
+        else:
+            function = LoxFunction(stmt, cells, False)
+        self.define(stmt, function)
 
-    def visitWhileStmt(self, stmt: While) -> None:
+    def visitWhileStmt(self, stmt: While) -> Completion | None:
         while self.isTruthy(self.evaluate(stmt.condition)):
-            self.execute(stmt.body)
+            if self.execute(stmt.body) is not None:
+                return RETURN
+        return None
 
-    def visitIfStmt(self, stmt: If) -> None:
+    def visitIfStmt(self, stmt: If) -> Completion | None:
         if self.isTruthy(self.evaluate(stmt.condition)):
-            self.execute(stmt.thenBranch)
+            return self.execute(stmt.thenBranch)
         elif stmt.elseBranch is not None:
-            self.execute(stmt.elseBranch)
+            return self.execute(stmt.elseBranch)
+        return None
+
+    def visitBlockStmt(self, stmt: Block) -> Completion | None:
+        if stmt.frameSize:
+            return self.executeBlock(stmt.statements, Environment([None] * stmt.frameSize))
 
-    def visitBlockStmt(self, stmt: Block) -> None:
-        self.executeBlock(stmt.statements, Environment(enclosing=self.environment))
+        for statement in stmt.statements:
+            if self.execute(statement) is not None:
+                return RETURN
+        return None
 
     def visitVarStmt(self, stmt: Var) -> None:
         value: Any = None
         if stmt.initializer is not None:
             value = self.evaluate(stmt.initializer)
 
-        self.environment.define(stmt.name.lexeme, value)
+        slot: int | None = stmt.slot
+        if slot is None:
+            self.globals.define(stmt.name.lexeme, value)
+        elif stmt.cell:
+            self.environment.values[slot] = Cell(value)
+        else:
+            self.environment.values[slot] = value
 
     def visitExpressionStmt(self, stmt: Expression) -> None:
         self.evaluate(stmt.expression)
 
     def visitPrintStmt(self, stmt: Print) -> None:
         value: Any = self.evaluate(stmt.expression)
-        print(self.stringify(value))
+        self.output.write(self.stringify(value) + "\n")
 
     def visitSuperExpr(self, expr: Super) -> Any:
-        distance: int = self.locals[expr]
-
         from LoxCallable import LoxClass, LoxInstance, LoxFunction
-        superclass: LoxClass = self.environment.getAt(distance, "super")
-        thing: LoxInstance = self.environment.getAt(distance - 1, "this")
+        superclass: LoxClass = self.lookUpVariable(expr.keyword, expr)
+        thing: LoxInstance = self.lookUpVariable(expr.this.keyword, expr.this)
 
-        method: LoxFunction | None = superclass.findMethod(expr.method.lexeme)
+        method: LoxFunction | None = expr.cache.findMethod(superclass)
 
         if method is None:
             raise RuntimeError(expr.method, f"Undefined property '{expr.method.lexeme}'.")
@@ -196,25 +263,74 @@ class Interpreter:
             raise RuntimeError(expr.name, "Only instances have fields.")
 
         value: Any = self.evaluate(expr.value)
-        thing.setField(expr.name, value)
+        expr.cache.set(thing, value)
+        return value
 
     def visitGetExpr(self, expr: Get) -> Any:
         thing: Any = self.evaluate(expr.thing)
         if type(thing) is LoxInstance:
+            return expr.cache.get(thing)
+        if isinstance(thing, LoxNative):
             return thing.getField(expr.name)
 
         raise RuntimeError(expr.name, "Only instances have properties.")
 
     def visitCallExpr(self, expr: Call) -> Any:
-        callee: Any = self.evaluate(expr.callee)
+        # Deep Lox recursion is bounded by the Python frames each call nests,
+        # so calls are dispatched here rather than through helper methods.
+        get: Expr = expr.callee
+        if type(get) is Get:
+            # obj.method(...) calls the method with obj as its receiver rather
+            # than building a bound method just to call it once.
+            thing: Any = self.evaluate(get.thing)
+            if type(thing) is not LoxInstance:
+                if not isinstance(thing, LoxNative):
+                    raise RuntimeError(get.name, "Only instances have properties.")
+                native: Any = thing.getField(get.name)
+                return self.callValue(expr, native, [self.evaluate(a) for a in expr.arguments])
+
+            method: LoxFunction | None = get.cache.method(thing)
+            if method is None:
+                callee: Any = get.cache.get(thing)
+                arguments: list[Any] = [self.evaluate(argument) for argument in expr.arguments]
+                return self.callValue(expr, callee, arguments)
+
+            arguments = [thing]
+            for argument in expr.arguments:
+                arguments.append(self.evaluate(argument))
+            if len(arguments) - 1 != method.arity():
+                raise RuntimeError(
+                    expr.paren,
+                    f"Expected {method.arity()} arguments but got {len(arguments) - 1}.")
 
-        arguments: list[Expr] = []
+            try:
+                result: Any = method.run(self, arguments)
+            except RecursionError:
+                raise RuntimeError(expr.paren, "Stack overflow.")
+            return thing if method.isInitializer else result
+
+        callee = self.evaluate(get)
+
+        arguments = []
         for argument in expr.arguments:
             arguments.append(self.evaluate(argument))
 
+        if type(callee) is not LoxFunction or callee.declaration.isMethod:
+            return self.callValue(expr, callee, arguments)
+
+        if len(arguments) != callee.arity():
+            raise RuntimeError(
+                expr.paren,
+                f"Expected {callee.arity()} arguments but got {len(arguments)}.")
+
+        try:
+            return callee.run(self, arguments)
+        except RecursionError:
+            raise RuntimeError(expr.paren, "Stack overflow.")
+
+    def callValue(self, expr: Call, callee: Any, arguments: list[Any]) -> Any:
         from LoxCallable import LoxCallable
         if not issubclass(type(callee), LoxCallable):
-            print(type(callee))
             raise RuntimeError(
                 expr.paren, 
                 "Can only call functions and classes.")
@@ -226,7 +342,14 @@ class Interpreter:
                 expr.paren, 
                 f"Expected {function.arity()} arguments but got {len(arguments)}.")
 
-        return function.call(self, arguments)
+        # Each Lox call nests several Python frames, so deep Lox recursion
+        # hits Python's recursion limit; report that as a Lox error.
+        try:
+            return function.call(self, arguments)
+        except RecursionError:
+            raise RuntimeError(expr.paren, "Stack overflow.")
+        except NativeError as error:
+            raise RuntimeError(expr.paren, str(error))
 
     def visitLogicalExpr(self, expr: Logical) -> Any:
         left: Any = self.evaluate(expr.left)
@@ -243,37 +366,55 @@ class Interpreter:
     def visitAssignExpr(self, expr: Assign) -> Any:
         value: Any = self.evaluate(expr.value)
 
-
-        if expr in self.locals.keys():
-            distance: int = self.locals[expr]
-            return self.environment.assignAt(distance, expr.name, value)
-        else:
+        slot: int | None = expr.slot
+        if slot is None:
             self.globals.assign(expr.name, value)
+        elif expr.upvalue:
+            self.environment.cells[slot].value = value
+        elif expr.cell:
+            self.environment.values[slot].value = value
+        else:
+            self.environment.values[slot] = value
 
         return value
 
     def visitVariableExpr(self, expr: Variable) -> Any:
         return self.lookUpVariable(expr.name, expr)
 
-    def lookUpVariable(self, name: Token, expr: Expr) -> Any:
-        if expr in self.locals.keys():
-            distance: int = self.locals[expr]
-            return self.environment.getAt(distance, name.lexeme)
-        else:
+    def lookUpVariable(self, name: Token, expr: Variable | This | Super) -> Any:
+        slot: int | None = expr.slot
+        if slot is None:
             return self.globals.get(name)
+        if expr.upvalue:
+            return self.environment.cells[slot].value
+
+        value: Any = self.environment.values[slot]
+        return value.value if expr.cell else value
 
     def visitLiteralExpr(self, expr: Literal) -> Any:
         return expr.value
 
     def visitGroupExpr(self, expr: Group) -> Any:
-        return expr.expression
+        return self.evaluate(expr.expression)
 
     def visitUnaryExpr(self, expr: Unary) -> Any:
         right: Any = self.evaluate(expr.right)
 
-        match expr.operator.token_type:
+        if expr.quick is not None:
+            value: Any = expr.quick(right)
+            if value is not DEOPT:
+                return value
+            Quicken.deoptimize(expr)
+
+        value = self.unary(expr.operator, right)
+        Quicken.specializeUnary(expr, right)
+        return value
+
+    def unary(self, operator: Token, right: Any) -> Any:
+        match operator.token_type:
             case TokenType.MINUS:
-                return -float(right)
+                self.checkNumberOperand(operator, right)
+                return -right
             case TokenType.BANG:
                 return not self.isTruthy(right)
 
@@ -283,52 +424,63 @@ class Interpreter:
         left: Any = self.evaluate(expr.left)
         right: Any = self.evaluate(expr.right)
 
-        match expr.operator.token_type:
+        if expr.quick is not None:
+            value: Any = expr.quick(left, right)
+            if value is not DEOPT:
+                return value
+            Quicken.deoptimize(expr)
+
+        value = self.binary(expr.operator, left, right)
+        Quicken.specializeBinary(expr, left, right)
+        return value
+
+    def binary(self, operator: Token, left: Any, right: Any) -> Any:
+        match operator.token_type:
             case TokenType.BANG_EQUAL:
-                self.checkNumberOperands(expr.operator, left, right)
-                return not self.isEqual(left, right)
+                return not isEqual(left, right)
 
             case TokenType.EQUAL_EQUAL:
-                self.checkNumberOperands(expr.operator, left, right)
-                return self.isEqual(left, right)
+                return isEqual(left, right)
 
             case TokenType.GREATER:
-                self.checkNumberOperands(expr.operator, left, right)
-                return float(left) > float(right)
+                self.checkNumberOperands(operator, left, right)
+                return left > right
 
             case TokenType.GREATER_EQUAL:
-                self.checkNumberOperands(expr.operator, left, right)
-                return float(left) >= float(right)
+                self.checkNumberOperands(operator, left, right)
+                return left >= right
 
             case TokenType.LESS:
-                self.checkNumberOperands(expr.operator, left, right)
-                return float(left) < float(right)
+                self.checkNumberOperands(operator, left, right)
+                return left < right
 
             case TokenType.LESS_EQUAL:
-                self.checkNumberOperands(expr.operator, left, right)
-                return float(left) <= float(right)
+                self.checkNumberOperands(operator, left, right)
+                return left <= right
 
             case TokenType.MINUS:
-                self.checkNumberOperand(expr.operator, right)
-                return float(left) - float(right)
+                self.checkNumberOperands(operator, left, right)
+                return left - right
 
             case TokenType.PLUS:
                 if type(left) is float and type(right) is float:
-                    return float(left) + float(right)
-                elif type(left) is str and type(right) is str:
-                    return str(left) + str(right)
+                    return left + right
+                elif type(left) is str and type(right) is str and len(left) + len(right) < ROPE_MIN:
+                    return left + right
+                elif type(left) in STRINGS and type(right) in STRINGS:
+                    return concat(left, right)
 
                 raise RuntimeError(
-                    expr.operator,
+                    operator,
                     "Operands must both be numbers or strings")
 
             case TokenType.SLASH:
-                self.checkNumberOperands(expr.operator, left, right)
-                return float(left) / float(right)
+                self.checkNumberOperands(operator, left, right)
+                return left / right
 
             case TokenType.STAR:
-                self.checkNumberOperands(expr.operator, left, right)
-                return float(left) * float(right)
+                self.checkNumberOperands(operator, left, right)
+                return left * right
 
     def checkNumberOperand(self, operator: Token, operand: Any) -> None:
         if type(operand) is float:
@@ -342,13 +494,6 @@ class Interpreter:
 
         raise RuntimeError(operator, "Operands must be numbers.")
 
-    def isEqual(self, left: Any, right: Any) -> bool:
-        if left == None and right == None:
-            return True
-        elif left == None:
-            return False
-        return left == right
-
     def isTruthy(self, object: Any) -> bool:
         match object:
             case None:
@@ -1,47 +1,180 @@
 #!/usr/bin/env python3.12
 
 import sys
-from Scanner import Scanner, TokenType
+import mmap
+import threading
+from contextlib import nullcontext
+from argparse import ArgumentParser, Namespace
+from Scanner import Scanner, LegacyScanner, StreamingScanner, TokenType
 from Token import Token
 from Parser import Parser, Stmt
 from RuntimeError import RuntimeError
 from Interpreter import Interpreter
 from Resolver import Resolver
+from Optimizer import Optimizer
+from Purity import Purity
+from Output import BUFFER_SIZE, FileSink, IntervalSink, Sink, StreamSink
+from typing import Any, BinaryIO, Callable, ContextManager, Iterable
 
 
 interpreter = Interpreter()
+engine = "tree"
+vm = None
+cache = None
+optimizer: Optimizer | None = Optimizer()
+profiler = None
+stats = None
+stream = False
+scanner: type[Scanner] = Scanner
 hadError = False
 hadRuntimeError = False
-args = sys.argv[1:]
 
 def run(source: str) -> None:
-    scanner: Scanner = Scanner(source)
-    tokens: list[Token] = scanner.scanTokens()
+    stmts: list[Stmt] | None = frontEnd(scanner(source).scanTokens())
+    if stmts is not None:
+        execute(optimize(stmts))
 
-    parser: Parser = Parser(tokens)
-    stmts: list[Stmt] = parser.parse()
+def frontEnd(tokens: Iterable[Token]) -> list[Stmt] | None:
+    with measure("parse"):
+        parser: Parser = Parser(tokens)
+        stmts: list[Stmt] = parser.parse()
 
     if hadError:
-        return
+        return None
 
-    resolver: Resolver = Resolver(interpreter)
-    resolver.resolve(stmts)
+    with measure("resolve"):
+        resolver: Resolver = Resolver(interpreter)
+        resolver.resolve(stmts)
 
     if hadError:
-        return
+        return None
 
-    interpreter.interpret(stmts)
+    return stmts
+
+def optimize(stmts: list[Stmt]) -> list[Stmt]:
+    # Runs after the cache so that one cached tree serves every -O level.
+    if optimizer is None:
+        return stmts
+    return optimizer.optimize(stmts)
+
+def measure(phase: str, counting: bool = False) -> ContextManager[None]:
+    if stats is None:
+        return nullcontext()
+    return stats.phase(phase, counting)
+
+def execute(stmts: list[Stmt]) -> None:
+    if engine == "vm":
+        from Compiler import Compiler
+        vm.interpret(Compiler().compile(stmts))
+    elif profiler is not None:
+        profiler.start()
+        try:
+            interpreter.interpret(stmts)
+        finally:
+            profiler.stop()
+    else:
+        interpreter.interpret(stmts)
 
 def runFile(path: str) -> None:
-    with open(path) as f:
-        data = f.read()
-        run(data)
+    with open(path, "rb") as f:
+        data: bytes | mmap.mmap = mapFile(f) if stream else f.read()
+
+        stmts: list[Stmt] | None = None
+        if cache is not None:
+            with measure("cache"):
+                stmts = cache.load(path, data)
+
+        if stmts is None:
+            # A streamed script is scanned as it is parsed, so its scanning
+            # time is part of the parse phase.
+            with measure("scan"):
+                if stream:
+                    tokens: Iterable[Token] = StreamingScanner(data).scanTokens()
+                else:
+                    tokens = scanner(data.decode()).scanTokens()
+            if stats is not None:
+                tokens = stats.tokens(tokens)
+
+            stmts = frontEnd(tokens)
+            if stmts is not None and cache is not None:
+                cache.store(path, data, stmts)
+
+        if isinstance(data, mmap.mmap):
+            data.close()
+
+    if stmts is not None:
+        if stats is not None:
+            stats.nodes(stmts)
+        with measure("optimize"):
+            stmts = optimize(stmts)
+            if interpreter.memo is not None:
+                Purity().analyze(stmts)
+        with measure("execute", counting=True):
+            execute(stmts)
 
     if hadError:
         exit(65)
     if hadRuntimeError:
         exit(70)
 
+def mapFile(f: BinaryIO) -> bytes | mmap.mmap:
+    try:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except ValueError:
+        # Empty files cannot be mapped.
+        return b""
+
+# The tree engines nest Python frames for every Lox call (about ten on the
+# walker). `--max-frames` sizes the recursion limit, and the C stack of the
+# thread the program runs on, with room for that many nested Lox calls, and
+# counts calls to stop the program at exactly that depth.
+PY_FRAMES_PER_CALL: int = 16
+C_STACK_PER_CALL: int = 2048
+C_STACK_MAX: int = 1 << 30
+
+def limitFrames(maxFrames: int) -> None:
+    '''
+    Makes Lox calls fail with "Stack overflow." once `maxFrames` frames, the
+    script's included as on the VM, are live. Every call on the tree engines
+    runs through `LoxFunction.run`, and the engines already report a
+    RecursionError from a call as that error.
+    '''
+    from LoxCallable import LoxFunction
+    run: Callable[..., Any] = LoxFunction.run
+    depth: int = 1
+
+    def limited(function: LoxFunction, interpreter: Interpreter, values: list[Any]) -> Any:
+        nonlocal depth
+        if depth >= maxFrames:
+            raise RecursionError
+        depth += 1
+        try:
+            return run(function, interpreter, values)
+        finally:
+            depth -= 1
+
+    LoxFunction.run = limited
+
+def runDeep(path: str, maxFrames: int) -> None:
+    limitFrames(maxFrames)
+    sys.setrecursionlimit(maxFrames * PY_FRAMES_PER_CALL + 1000)
+    threading.stack_size(min(max(maxFrames * C_STACK_PER_CALL, 1 << 24), C_STACK_MAX))
+
+    # Whatever ends the worker, exits included, is raised again here so the
+    # process fails the way it would have without the thread.
+    failure: list[BaseException] = []
+    def target() -> None:
+        try:
+            runFile(path)
+        except BaseException as error:
+            failure.append(error)
+
+    worker: threading.Thread = threading.Thread(target=target)
+    worker.start()
+    worker.join()
+    if failure:
+        raise failure[0]
+
 def runPrompt() -> None:
     global hadError
     while True:
@@ -75,12 +208,189 @@ def report(line: int, where: str, message: str) -> None:
     global hadError
     hadError = True
 
-if __name__ == '__main__':
-    if len(args) > 1:
-        print("Usage: pylox <script>")
+class UsageParser(ArgumentParser):
+    def error(self, message: str) -> None:
+        self.print_usage(sys.stderr)
+        print(f"pylox: {message}", file=sys.stderr)
         exit(64)
-    elif len(args) == 1:
-        runFile(args[0])
+
+def parseArgs(argv: list[str]) -> Namespace:
+    parser: UsageParser = UsageParser(prog="pylox")
+    parser.add_argument("script", nargs="?")
+    parser.add_argument("--engine", choices=["tree", "closure", "vm"], default="tree",
+                        help="execution engine (default: tree)")
+    parser.add_argument("--tier", action="store_true",
+                        help="compile hot functions to Python source (tree and closure engines)")
+    parser.add_argument("--tier-threshold", type=int, default=100, metavar="CALLS",
+                        help="calls before a function is compiled (default: 100)")
+    parser.add_argument("--tier-dump", action="store_true",
+                        help="print the Python source generated for hot functions to stderr")
+    parser.add_argument("--stream", action="store_true",
+                        help="scan the script from a memory map as it is parsed")
+    parser.add_argument("--legacy-scanner", action="store_true",
+                        help="scan with the original character at a time scanner")
+    parser.add_argument("--ic-stats", action="store_true",
+                        help="print inline cache hits and misses per property site to stderr")
+    parser.add_argument("--quicken-stats", action="store_true",
+                        help="print the specialization of each quickened operator to stderr")
+    parser.add_argument("--max-frames", type=int, metavar="N",
+                        help="report a stack overflow once N call frames, the script's included, "
+                             "are live")
+    parser.add_argument("--max-stack", type=int, metavar="N",
+                        help="limit the VM value stack to N slots")
+    parser.add_argument("-O", type=int, choices=[0, 1], default=1, dest="opt_level",
+                        metavar="LEVEL",
+                        help="0 runs the program as written, 1 folds constants and "
+                             "removes dead code first (default: 1)")
+    parser.add_argument("--opt-report", action="store_true",
+                        help="print what the optimizer changed to stderr")
+    parser.add_argument("--memoize", action="store_true",
+                        help="reuse the results of pure functions (tree and closure engines)")
+    parser.add_argument("--memo-size", type=int, default=1024, metavar="N",
+                        help="results kept for --memoize before the least recently used "
+                             "is evicted (default: 1024)")
+    parser.add_argument("--memo-stats", action="store_true",
+                        help="print memo cache hits, misses and evictions to stderr")
+    parser.add_argument("--node-counts", action="store_true",
+                        help="print how many times each kind of node ran to stderr (tree engine)")
+    parser.add_argument("--profile", action="store_true",
+                        help="print the time spent in each Lox function and line to stderr")
+    parser.add_argument("--profile-mode", choices=["sample", "trace"], default="sample",
+                        help="sample the running program, or trace every call and statement "
+                             "(default: sample)")
+    parser.add_argument("--profile-stacks", metavar="FILE",
+                        help="write profiled call stacks to FILE in collapsed flame graph format")
+    parser.add_argument("--stats", action="store_true",
+                        help="print the time and peak memory of each phase, and counts of "
+                             "tokens, nodes, environments, instances and calls, to stderr")
+    parser.add_argument("--stats-trace-memory", action="store_true",
+                        help="measure --stats memory exactly with tracemalloc, which runs "
+                             "the program several times slower")
+    parser.add_argument("--stats-format", choices=["text", "json"], default="text",
+                        help="format of the --stats report (default: text)")
+    parser.add_argument("--output", metavar="FILE",
+                        help="write what the program prints to FILE instead of stdout")
+    parser.add_argument("--output-buffer", type=int, metavar="CHARS",
+                        help="characters of output held before they are written, 0 to write "
+                             "every print (default: 65536, or 0 on a terminal)")
+    parser.add_argument("--flush-interval", type=float, metavar="SECONDS",
+                        help="also write held output every SECONDS while the program runs")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="do not read or write the resolved program cache")
+    parser.add_argument("--cache-stats", action="store_true",
+                        help="print program cache hits and misses to stderr")
+    options: Namespace = parser.parse_args(argv)
+    if options.stream and options.legacy_scanner:
+        parser.error("--stream cannot be used with --legacy-scanner")
+    if options.memoize and options.engine == "vm":
+        parser.error("--memoize cannot be used with --engine=vm")
+    if options.node_counts and options.engine != "tree":
+        parser.error("--node-counts can only be used with --engine=tree")
+    if options.profile and options.engine == "vm":
+        parser.error("--profile cannot be used with --engine=vm")
+    if options.profile_stacks is not None and not options.profile:
+        parser.error("--profile-stacks requires --profile")
+    if options.memo_size < 1:
+        parser.error("--memo-size must be at least 1")
+    if options.output_buffer is not None and options.output_buffer < 0:
+        parser.error("--output-buffer cannot be negative")
+    return options
+
+def main(argv: list[str]) -> None:
+    global engine, interpreter, vm, cache, optimizer, profiler, stats, stream, scanner
+    options: Namespace = parseArgs(argv)
+
+    engine = options.engine
+    stream = options.stream
+    if options.legacy_scanner:
+        scanner = LegacyScanner
+    if engine == "closure":
+        from ClosureCompiler import ClosureInterpreter
+        interpreter = ClosureInterpreter()
+    elif engine == "vm":
+        from VM import VM, FRAMES_MAX, STACK_MAX
+        vm = VM(options.max_frames or FRAMES_MAX, options.max_stack or STACK_MAX)
+
+    limit: int = options.output_buffer
+    if limit is None:
+        limit = 0 if options.output is None and sys.stdout.isatty() else BUFFER_SIZE
+    if options.output is not None:
+        output: Sink = FileSink(options.output, limit)
+    else:
+        output = StreamSink(None, limit)
+    if options.flush_interval is not None:
+        output = IntervalSink(output, options.flush_interval)
+    if vm is not None:
+        vm.output = output
+    else:
+        interpreter.output = output
+
+    if options.opt_level == 0:
+        optimizer = None
+
+    if options.profile and options.profile_mode == "trace":
+        from Profiler import TracingProfiler
+        profiler = TracingProfiler()
+    elif options.profile:
+        from Profiler import SamplingProfiler
+        profiler = SamplingProfiler()
+
+    if options.stats:
+        from Stats import Stats
+        stats = Stats(engine, options.stats_trace_memory)
+
+    counter = None
+    if options.node_counts:
+        from Hooks import NodeCounter
+        counter = NodeCounter()
+        interpreter.addHook(counter)
+
+    if options.memoize:
+        from Memo import MemoCache
+        interpreter.memo = MemoCache(options.memo_size)
+
+    if options.tier:
+        from Tier import Tier
+        interpreter.tier = Tier(interpreter, options.tier_threshold, options.tier_dump)
+
+    if options.script is not None:
+        if not options.no_cache:
+            from Cache import Cache
+            cache = Cache()
+        try:
+            if options.max_frames is not None and engine != "vm":
+                runDeep(options.script, options.max_frames)
+            else:
+                runFile(options.script)
+        finally:
+            output.close()
+            if cache is not None and options.cache_stats:
+                print(f"cache: {cache.report()}", file=sys.stderr)
+            if stats is not None:
+                print(stats.json() if options.stats_format == "json" else stats.report(),
+                      file=sys.stderr)
+            if counter is not None:
+                print(counter.report(), file=sys.stderr)
+            if profiler is not None:
+                print(profiler.report(), file=sys.stderr)
+                if options.profile_stacks is not None:
+                    with open(options.profile_stacks, "w") as stacks:
+                        stacks.write(profiler.collapsed())
+            if interpreter.memo is not None and options.memo_stats:
+                print(f"memo: {interpreter.memo.report()}", file=sys.stderr)
+            if optimizer is not None and options.opt_report:
+                print(f"optimizer: {optimizer.report()}", file=sys.stderr)
+            if options.ic_stats:
+                import InlineCache
+                print(InlineCache.report(), file=sys.stderr)
+            if options.quicken_stats:
+                import Quicken
+                print(Quicken.report(), file=sys.stderr)
     else:
         runPrompt()
 
+if __name__ == '__main__':
+    # Other modules report errors through `import Lox`, so the driver has to
+    # run inside that module rather than in a separate __main__ copy of it.
+    import Lox
+    Lox.main(sys.argv[1:])
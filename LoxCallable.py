@@ -1,11 +1,13 @@
 from __future__ import annotations
 from abc import ABC, abstractmethod
-from Return import ReturnException
-from Environment import Environment
+from Return import RETURN
+from Environment import Cell, Environment
 from Stmt import Function
-from typing import Any, Self
+from typing import Any, Callable, Self
 from time import time
 from Token import Token
+from RuntimeError import RuntimeError
+from Rope import Rope
 
 from typing import TYPE_CHECKING
 if TYPE_CHECKING:
@@ -34,35 +36,214 @@ class Clock(LoxCallable):
     def __str__(self) -> str:
         return "<fn native clock>"
 
+class LoxNative:
+    '''
+    A value of a built-in type. Its methods are Python functions listed in
+    the type's `methods` table with their arity; looking one up by name binds
+    it to the value and to the name token, where errors are reported.
+    '''
+    __slots__ = ()
+    methods: dict[str, tuple[int, Callable[..., Any]]] = {}
+    # Values being printed, so that one containing itself prints as "...".
+    printing: set[int] = set()
+
+    def getField(self, name: Token) -> NativeMethod:
+        method: tuple[int, Callable[..., Any]] | None = self.methods.get(name.lexeme)
+        if method is None:
+            raise RuntimeError(name, f"Undefined property '{name.lexeme}'.")
+        return NativeMethod(self, name, *method)
+
+    def show(self, stringify: Callable[[Any], str]) -> str:
+        if id(self) in LoxNative.printing:
+            return "..."
+        LoxNative.printing.add(id(self))
+        try:
+            return self.format(stringify)
+        finally:
+            LoxNative.printing.discard(id(self))
+
+    def format(self, stringify: Callable[[Any], str]) -> str:
+        ...
+
+class NativeMethod(LoxCallable):
+    def __init__(self, this: LoxNative, name: Token, count: int,
+                 function: Callable[..., Any]) -> None:
+        self.this: LoxNative = this
+        self.name: Token = name
+        self.count: int = count
+        self.function: Callable[..., Any] = function
+
+    def call(self, interpreter: Interpreter, arguments: list[Any]) -> Any:
+        return self.function(self.this, self.name, *arguments)
+
+    def arity(self) -> int:
+        return self.count
+
+    def __str__(self) -> str:
+        return f"<fn native {self.name.lexeme}>"
+
+class NativeClass(LoxCallable):
+    '''
+    A built-in type, called like a class. `make` builds a value from the
+    arguments and raises NativeError for ones it can't use.
+    '''
+    def __init__(self, name: str, make: Callable[..., LoxNative], count: int = 0) -> None:
+        self.name: str = name
+        self.make: Callable[..., LoxNative] = make
+        self.count: int = count
+
+    def call(self, interpreter: Interpreter, arguments: list[Any]) -> Any:
+        return self.make(*arguments)
+
+    def arity(self) -> int:
+        return self.count
+
+    def __str__(self) -> str:
+        return f"<native class {self.name}>"
+
+def checkIndex(name: Token, index: Any, length: int) -> int:
+    if type(index) is not float or not index.is_integer():
+        raise RuntimeError(name, "Index must be a whole number.")
+    if not 0 <= index < length:
+        raise RuntimeError(name, "Index out of range.")
+    return int(index)
+
+class LoxList(LoxNative):
+    __slots__ = ('values',)
+
+    def __init__(self, values: list[Any] | None = None) -> None:
+        self.values: list[Any] = values if values is not None else []
+
+    def append(self, name: Token, value: Any) -> None:
+        self.values.append(value)
+
+    def get(self, name: Token, index: Any) -> Any:
+        return self.values[checkIndex(name, index, len(self.values))]
+
+    def set(self, name: Token, index: Any, value: Any) -> Any:
+        self.values[checkIndex(name, index, len(self.values))] = value
+        return value
+
+    def length(self, name: Token) -> float:
+        return float(len(self.values))
+
+    def pop(self, name: Token) -> Any:
+        if not self.values:
+            raise RuntimeError(name, "Can't pop from an empty list.")
+        return self.values.pop()
+
+    def format(self, stringify: Callable[[Any], str]) -> str:
+        return "[" + ", ".join(stringify(value) for value in self.values) + "]"
+
+    methods = {
+        "append": (1, append),
+        "get": (1, get),
+        "set": (2, set),
+        "length": (0, length),
+        "pop": (0, pop),
+    }
+
+def mapKey(value: Any) -> Any:
+    # true == 1 in Python, so booleans are kept apart from numbers.
+    if type(value) is bool:
+        return (bool, value)
+    if type(value) is Rope:
+        return value.flatten()
+    return value
+
+class LoxMap(LoxNative):
+    '''
+    Maps keys to values. Numbers, strings, booleans and nil are keys by
+    value, anything else by identity.
+    '''
+    __slots__ = ('entries',)
+
+    def __init__(self) -> None:
+        self.entries: dict[Any, tuple[Any, Any]] = dict()
+
+    def get(self, name: Token, key: Any) -> Any:
+        entry: tuple[Any, Any] | None = self.entries.get(mapKey(key))
+        return None if entry is None else entry[1]
+
+    def set(self, name: Token, key: Any, value: Any) -> Any:
+        self.entries[mapKey(key)] = (key, value)
+        return value
+
+    def has(self, name: Token, key: Any) -> bool:
+        return mapKey(key) in self.entries
+
+    def remove(self, name: Token, key: Any) -> Any:
+        entry: tuple[Any, Any] | None = self.entries.pop(mapKey(key), None)
+        return None if entry is None else entry[1]
+
+    def length(self, name: Token) -> float:
+        return float(len(self.entries))
+
+    def keys(self, name: Token) -> LoxList:
+        return LoxList([key for key, _ in self.entries.values()])
+
+    def values(self, name: Token) -> LoxList:
+        return LoxList([value for _, value in self.entries.values()])
+
+    def format(self, stringify: Callable[[Any], str]) -> str:
+        return "{" + ", ".join(f"{stringify(key)}: {stringify(value)}"
+                               for key, value in self.entries.values()) + "}"
+
+    methods = {
+        "get": (1, get),
+        "set": (2, set),
+        "has": (1, has),
+        "remove": (1, remove),
+        "length": (0, length),
+        "keys": (0, keys),
+        "values": (0, values),
+    }
 
 class LoxFunction(LoxCallable):
     def __init__(self, declaration: Function, 
-                 closure: Environment, isInitializer: bool) -> None:
+                 cells: tuple[Cell, ...], isInitializer: bool,
+                 this: LoxInstance | None = None) -> None:
         self.declaration: Function = declaration
-        self.closure: Environment = closure
+        self.cells: tuple[Cell, ...] = cells
         self.isInitializer: bool = isInitializer
+        self.this: LoxInstance | None = this
 
     def call(self, interpreter: Interpreter, arguments: list[Any]) -> Any:
-        environment: Environment = Environment(self.closure)
-
-        for i, param in enumerate(self.declaration.params):
-            environment.define(param.lexeme, arguments[i])
-
-        try:
-            interpreter.executeBlock(self.declaration.body, environment)
-        except ReturnException as returnValue:
-            if self.isInitializer:
-                return self.closure.getAt(0, "this")
-            return returnValue.value
-
+        if self.declaration.isMethod:
+            return self.invoke(interpreter, self.this, arguments)
+        return self.run(interpreter, list(arguments))
+
+    def invoke(self, interpreter: Interpreter, this: LoxInstance, arguments: list[Any]) -> Any:
+        '''
+        Calls a method with `this` as its receiver. `this` is the first slot
+        of the method's frame, so obj.method(...) can call straight through
+        without binding the method first.
+        '''
+        result: Any = self.run(interpreter, [this, *arguments])
         if self.isInitializer:
-            return self.closure.getAt(0, "this")
+            return this
+        return result
+
+    def run(self, interpreter: Interpreter, values: list[Any]) -> Any:
+        if interpreter.tier is not None:
+            compiled: Callable[..., Any] | None = interpreter.tier.lookup(self)
+            if compiled is not None:
+                return compiled(self.cells, *values)
+
+        declaration: Function = self.declaration
+        if declaration.frameSize > len(values):
+            values.extend([None] * (declaration.frameSize - len(values)))
+        for slot in declaration.cellSlots:
+            values[slot] = Cell(values[slot])
+        environment: Environment = Environment(values, self.cells)
+
+        if interpreter.executeBlock(declaration.body, environment) is RETURN:
+            return interpreter.returnValue
+        return None
 
     def bind(self, instance: LoxInstance) -> Self:
-        environment: Environment = Environment(self.closure)
-        environment.define("this", instance)
-        return LoxFunction(self.declaration, environment, 
-                           self.isInitializer)
+        return LoxFunction(self.declaration, self.cells,
+                           self.isInitializer, instance)
 
     def arity(self) -> int:
         return len(self.declaration.params)
@@ -70,24 +251,32 @@ class LoxFunction(LoxCallable):
     def __str__(self) -> str:
         return f"<fn {self.declaration.name.lexeme}>"
 
+class MemoFunction(LoxFunction):
+    '''
+    A pure function run with `--memoize`, whose calls go through the
+    interpreter's memo cache.
+    '''
+    def call(self, interpreter: Interpreter, arguments: list[Any]) -> Any:
+        return interpreter.memo.call(self, interpreter, arguments)
+
 class LoxClass(LoxCallable):
     def __init__(self, name: str, superclass: LoxClass | None, methods: dict[str, LoxFunction]) -> None:
         self.name: str = name
         self.methods: dict[str, LoxFunction] = methods
         self.superclass: LoxClass | None = superclass
+        self.shape: Shape = Shape(self, {})
+        self.initializer: LoxFunction | None = self.findMethod("init")
 
     def call(self, interpreter: Interpreter, arguments: list[Any]) -> Any:
         instance: LoxInstance = LoxInstance(self)
-        if "init" in self.methods.keys():
-            initializer: LoxFunction = self.methods["init"]
-            initializer.bind(instance).call(interpreter, arguments)
+        if self.initializer is not None:
+            self.initializer.invoke(interpreter, instance, arguments)
 
         return instance
 
     def arity(self) -> int:
-        if "init" in self.methods.keys():
-            initializer: LoxFunction = self.methods["init"]
-            return initializer.arity()
+        if self.initializer is not None:
+            return self.initializer.arity()
 
         return 0
 
@@ -95,7 +284,7 @@ class LoxClass(LoxCallable):
         return f"<class {self.name}>"
 
     def findMethod(self, name: str) -> LoxFunction | None:
-        if name in self.methods.keys():
+        if name in self.methods:
             return self.methods[name]
 
         if self.superclass is not None:
@@ -104,17 +293,48 @@ class LoxClass(LoxCallable):
         return None
 
 
+class Shape:
+    '''
+    The layout of an instance: which slot of `LoxInstance.values` holds each
+    field. Instances of a class start at the class's empty shape and move
+    along `transitions` as fields are added, so instances that add the same
+    fields in the same order share one shape, and a shape identifies both
+    the class and the field layout.
+    '''
+    __slots__ = ('loxClass', 'slots', 'transitions')
+
+    def __init__(self, loxClass: LoxClass, slots: dict[str, int]) -> None:
+        self.loxClass: LoxClass = loxClass
+        self.slots: dict[str, int] = slots
+        self.transitions: dict[str, Shape] = dict()
+
+    def withField(self, name: str) -> Shape:
+        shape: Shape | None = self.transitions.get(name)
+        if shape is None:
+            slots: dict[str, int] = dict(self.slots)
+            slots[name] = len(slots)
+            shape = Shape(self.loxClass, slots)
+            self.transitions[name] = shape
+        return shape
+
 class LoxInstance:
+    __slots__ = ('shape', 'values')
+
     def __init__(self, loxClass: LoxClass) -> None:
-        self.loxClass: LoxClass = loxClass
-        self.fields: dict[str, Any] = dict()
+        self.shape: Shape = loxClass.shape
+        self.values: list[Any] = []
+
+    @property
+    def loxClass(self) -> LoxClass:
+        return self.shape.loxClass
 
     def __str__(self) -> str:
         return f"<class instance {self.loxClass.name}>"
 
     def getField(self, name: Token) -> Any:
-        if name.lexeme in self.fields.keys():
-            return self.fields[name.lexeme]
+        slot: int | None = self.shape.slots.get(name.lexeme)
+        if slot is not None:
+            return self.values[slot]
 
         method: LoxFunction | None = self.loxClass.findMethod(name.lexeme)
         if method is not None:
@@ -123,4 +343,9 @@ class LoxInstance:
         raise RuntimeError(name, f"Undefined property '{name.lexeme}'.")
 
     def setField(self, name: Token, value: Any) -> None:
-        self.fields[name.lexeme] = value
+        slot: int | None = self.shape.slots.get(name.lexeme)
+        if slot is not None:
+            self.values[slot] = value
+        else:
+            self.shape = self.shape.withField(name.lexeme)
+            self.values.append(value)
@@ -0,0 +1,74 @@
+from __future__ import annotations
+from collections import OrderedDict
+from Rope import Rope
+from typing import Any
+
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    from Interpreter import Interpreter
+    from LoxCallable import LoxFunction
+
+'''
+The results of calls to pure functions under `--memoize`, shared by every
+function and bounded to `size` entries. The least recently used entry is
+evicted when a new one would not fit.
+
+Calls are keyed by the function and its arguments. Only nil, booleans,
+numbers and strings make keys; a call passing anything else runs normally.
+Each argument's type is part of the key because Python treats `1 == true`,
+and so does the sign of zero, which prints differently.
+'''
+
+KEYS: set[type] = {float, str, bool, type(None)}
+
+MISSING: object = object()
+
+class MemoCache:
+    def __init__(self, size: int) -> None:
+        self.size: int = size
+        self.entries: OrderedDict[tuple[Any, ...], Any] = OrderedDict()
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+
+    def call(self, function: LoxFunction, interpreter: Interpreter, arguments: list[Any]) -> Any:
+        key: tuple[Any, ...] | None = self.key(function, arguments)
+        if key is None:
+            return function.run(interpreter, list(arguments))
+
+        value: Any = self.entries.get(key, MISSING)
+        if value is not MISSING:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return value
+
+        self.misses += 1
+        value = function.run(interpreter, list(arguments))
+        self.entries[key] = value
+        if len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+        return value
+
+    def key(self, function: LoxFunction, arguments: list[Any]) -> tuple[Any, ...] | None:
+        key: list[Any] = [function]
+        for argument in arguments:
+            kind: type = type(argument)
+            if kind is Rope:
+                kind, argument = str, argument.flatten()
+            if kind not in KEYS:
+                return None
+            if kind is float and argument == 0:
+                argument = str(argument)
+            key.append((kind, argument))
+        return tuple(key)
+
+    def report(self) -> dict[str, Any]:
+        calls: int = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit rate": f"{100 * self.hits / calls if calls else 0.0:.1f}%",
+            "evictions": self.evictions,
+            "entries": len(self.entries),
+        }
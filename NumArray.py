@@ -0,0 +1,202 @@
+from __future__ import annotations
+from LoxCallable import LoxList, LoxNative, checkIndex
+from RuntimeError import NativeError, RuntimeError
+from Token import Token
+from array import array
+from functools import reduce
+from itertools import repeat
+from typing import Any, Callable
+import operator
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+'''
+`NumArray`, a fixed length array of numbers whose arithmetic and reductions
+run over the whole array at once: as NumPy operations when NumPy is
+installed, or as loops over an `array.array` of doubles, run in C by `map`
+and `reduce`, when it isn't. Either way a Lox program touches the elements
+in one call instead of one `Binary` node per element.
+
+Elements are doubles, exactly like Lox numbers, and every operation rounds
+the way the equivalent Lox loop would: element-wise results are the same
+IEEE operations, and sums and dot products add left to right rather than
+pairwise, so they match a loop bit for bit. Dividing by zero is an error,
+as it is for numbers.
+
+    var a = NumArray(1000000);      // a million zeros
+    var b = NumArray(list);         // the numbers in a List
+    print a.add(1).mul(b).sum();
+'''
+
+if numpy is not None:
+    def fromValues(values: list[float]) -> Any:
+        return numpy.array(values, dtype=numpy.float64)
+
+    def zeros(length: int) -> Any:
+        return numpy.zeros(length, dtype=numpy.float64)
+
+    def copy(values: Any) -> Any:
+        return values.copy()
+
+    def combine(operation: Callable[[Any, Any], Any], left: Any, right: Any) -> Any:
+        return operation(left, right)
+
+    def hasZero(values: Any) -> bool:
+        return bool((values == 0.0).any())
+
+    def total(values: Any) -> float:
+        if len(values) == 0:
+            return 0.0
+        # cumsum adds in order, where sum() would add pairwise.
+        return float(numpy.cumsum(values)[-1])
+
+    def dot(left: Any, right: Any) -> float:
+        return total(left * right)
+
+    def smallest(values: Any) -> float:
+        return float(values.min())
+
+    def largest(values: Any) -> float:
+        return float(values.max())
+
+    def toList(values: Any) -> list[float]:
+        return values.tolist()
+else:
+    def fromValues(values: list[float]) -> Any:
+        return array('d', values)
+
+    def zeros(length: int) -> Any:
+        return array('d', bytes(8 * length))
+
+    def copy(values: Any) -> Any:
+        return array('d', values)
+
+    def combine(operation: Callable[[Any, Any], Any], left: Any, right: Any) -> Any:
+        if type(right) is float:
+            right = repeat(right)
+        return array('d', map(operation, left, right))
+
+    def hasZero(values: Any) -> bool:
+        return 0.0 in values
+
+    def total(values: Any) -> float:
+        return reduce(operator.add, values, 0.0)
+
+    def dot(left: Any, right: Any) -> float:
+        return reduce(operator.add, map(operator.mul, left, right), 0.0)
+
+    def smallest(values: Any) -> float:
+        return min(values)
+
+    def largest(values: Any) -> float:
+        return max(values)
+
+    def toList(values: Any) -> list[float]:
+        return values.tolist()
+
+def makeNumArray(source: Any) -> NumArray:
+    if type(source) is float:
+        if not source.is_integer() or source < 0:
+            raise NativeError("NumArray length must be a whole number.")
+        return NumArray(zeros(int(source)))
+
+    if type(source) is LoxList:
+        if any(type(value) is not float for value in source.values):
+            raise NativeError("NumArray can only hold numbers.")
+        return NumArray(fromValues(source.values))
+
+    raise NativeError("NumArray takes a length or a List of numbers.")
+
+class NumArray(LoxNative):
+    __slots__ = ('values',)
+
+    def __init__(self, values: Any) -> None:
+        self.values: Any = values
+
+    def operand(self, name: Token, other: Any) -> Any:
+        if type(other) is float:
+            return other
+        if type(other) is not NumArray:
+            raise RuntimeError(name, "Operand must be a number or a NumArray.")
+        if len(other.values) != len(self.values):
+            raise RuntimeError(name, "NumArrays must have the same length.")
+        return other.values
+
+    def length(self, name: Token) -> float:
+        return float(len(self.values))
+
+    def get(self, name: Token, index: Any) -> float:
+        return float(self.values[checkIndex(name, index, len(self.values))])
+
+    def set(self, name: Token, index: Any, value: Any) -> Any:
+        if type(value) is not float:
+            raise RuntimeError(name, "NumArray can only hold numbers.")
+        self.values[checkIndex(name, index, len(self.values))] = value
+        return value
+
+    def add(self, name: Token, other: Any) -> NumArray:
+        return NumArray(combine(operator.add, self.values, self.operand(name, other)))
+
+    def sub(self, name: Token, other: Any) -> NumArray:
+        return NumArray(combine(operator.sub, self.values, self.operand(name, other)))
+
+    def mul(self, name: Token, other: Any) -> NumArray:
+        return NumArray(combine(operator.mul, self.values, self.operand(name, other)))
+
+    def div(self, name: Token, other: Any) -> NumArray:
+        divisor: Any = self.operand(name, other)
+        if (divisor == 0.0) if type(divisor) is float else hasZero(divisor):
+            raise RuntimeError(name, "Division by zero.")
+        return NumArray(combine(operator.truediv, self.values, divisor))
+
+    def sum(self, name: Token) -> float:
+        return total(self.values)
+
+    def min(self, name: Token) -> float:
+        if len(self.values) == 0:
+            raise RuntimeError(name, "Can't take the min of an empty NumArray.")
+        return smallest(self.values)
+
+    def max(self, name: Token) -> float:
+        if len(self.values) == 0:
+            raise RuntimeError(name, "Can't take the max of an empty NumArray.")
+        return largest(self.values)
+
+    def dot(self, name: Token, other: Any) -> float:
+        if type(other) is not NumArray:
+            raise RuntimeError(name, "Operand must be a NumArray.")
+        return dot(self.values, self.operand(name, other))
+
+    def slice(self, name: Token, start: Any, end: Any) -> NumArray:
+        length: int = len(self.values)
+        first: int = checkIndex(name, start, length + 1)
+        last: int = checkIndex(name, end, length + 1)
+        if last < first:
+            raise RuntimeError(name, "Slice ends before it starts.")
+        # A copy, as NumPy's slices share memory with the array.
+        return NumArray(copy(self.values[first:last]))
+
+    def toList(self, name: Token) -> LoxList:
+        return LoxList(toList(self.values))
+
+    def format(self, stringify: Callable[[Any], str]) -> str:
+        return "NumArray[" + ", ".join(stringify(value) for value in toList(self.values)) + "]"
+
+    methods = {
+        "length": (0, length),
+        "get": (1, get),
+        "set": (2, set),
+        "add": (1, add),
+        "sub": (1, sub),
+        "mul": (1, mul),
+        "div": (1, div),
+        "sum": (0, sum),
+        "min": (0, min),
+        "max": (0, max),
+        "dot": (1, dot),
+        "slice": (2, slice),
+        "toList": (0, toList),
+    }
@@ -0,0 +1,193 @@
+from Expr import *
+from Stmt import *
+from TokenType import TokenType
+from Equality import isEqual
+from typing import Any
+
+'''
+Simplifies a resolved program before it runs. The pass folds operators whose
+operands are all literals, strips grouping parentheses, drops the branch of an
+`if` whose condition is a literal that can never run, and drops statements
+that follow a `return` in the same block.
+
+Only expressions that cannot fail are folded: an operator applied to literals
+of the wrong type, or a division by zero, is left in place so it still fails
+at runtime with the usual error. Removing code never disturbs the frames the
+Resolver laid out: every declaration keeps its slot, and a removed one simply
+leaves its slot unused.
+'''
+
+class Optimizer:
+    def __init__(self) -> None:
+        self.changes: dict[str, int] = {
+            "folded": 0,
+            "groups": 0,
+            "branches": 0,
+            "unreachable": 0,
+        }
+
+    def optimize(self, stmts: list[Stmt]) -> list[Stmt]:
+        return self.optimizeStmts(stmts)
+
+    def optimizeStmts(self, stmts: list[Stmt]) -> list[Stmt]:
+        result: list[Stmt] = []
+        for i, stmt in enumerate(stmts):
+            optimized: Stmt | None = self.optimizeStmt(stmt)
+            if optimized is not None:
+                result.append(optimized)
+
+            if type(optimized) is Return:
+                self.changes["unreachable"] += len(stmts) - i - 1
+                break
+        return result
+
+    def optimizeStmt(self, stmt: Stmt) -> Stmt | None:
+        match stmt:
+            case Expression() | Print():
+                stmt.expression = self.optimizeExpr(stmt.expression)
+            case Var():
+                if stmt.initializer is not None:
+                    stmt.initializer = self.optimizeExpr(stmt.initializer)
+            case Block():
+                stmt.statements = self.optimizeStmts(stmt.statements)
+            case If():
+                return self.optimizeIf(stmt)
+            case While():
+                stmt.condition = self.optimizeExpr(stmt.condition)
+                stmt.body = self.branch(stmt.body)
+            case Function():
+                stmt.body = self.optimizeStmts(stmt.body)
+            case Return():
+                if stmt.value is not None:
+                    stmt.value = self.optimizeExpr(stmt.value)
+            case Class():
+                for method in stmt.methods:
+                    self.optimizeStmt(method)
+        return stmt
+
+    def optimizeIf(self, stmt: If) -> Stmt | None:
+        stmt.condition = self.optimizeExpr(stmt.condition)
+        if type(stmt.condition) is not Literal:
+            stmt.thenBranch = self.branch(stmt.thenBranch)
+            if stmt.elseBranch is not None:
+                stmt.elseBranch = self.branch(stmt.elseBranch)
+            return stmt
+
+        self.changes["branches"] += 1
+        if self.isTruthy(stmt.condition.value):
+            return self.optimizeStmt(stmt.thenBranch)
+        if stmt.elseBranch is not None:
+            return self.optimizeStmt(stmt.elseBranch)
+        return None
+
+    def branch(self, stmt: Stmt) -> Stmt:
+        # A loop body or branch has to be some statement, even when the `if`
+        # standing there turns out to do nothing.
+        optimized: Stmt | None = self.optimizeStmt(stmt)
+        if optimized is None:
+            return Block([])
+        return optimized
+
+    def optimizeExpr(self, expr: Expr) -> Expr:
+        match expr:
+            case Group():
+                self.changes["groups"] += 1
+                return self.optimizeExpr(expr.expression)
+            case Unary():
+                expr.right = self.optimizeExpr(expr.right)
+                return self.foldUnary(expr)
+            case Binary():
+                expr.left = self.optimizeExpr(expr.left)
+                expr.right = self.optimizeExpr(expr.right)
+                return self.foldBinary(expr)
+            case Logical():
+                expr.left = self.optimizeExpr(expr.left)
+                expr.right = self.optimizeExpr(expr.right)
+                return self.foldLogical(expr)
+            case Assign():
+                expr.value = self.optimizeExpr(expr.value)
+            case Call():
+                expr.callee = self.optimizeExpr(expr.callee)
+                expr.arguments = [self.optimizeExpr(argument) for argument in expr.arguments]
+            case Get():
+                expr.thing = self.optimizeExpr(expr.thing)
+            case Set():
+                expr.thing = self.optimizeExpr(expr.thing)
+                expr.value = self.optimizeExpr(expr.value)
+        return expr
+
+    def foldUnary(self, expr: Unary) -> Expr:
+        if type(expr.right) is not Literal:
+            return expr
+
+        right: Any = expr.right.value
+        match expr.operator.token_type:
+            case TokenType.BANG:
+                return self.folded(not self.isTruthy(right))
+            case TokenType.MINUS if type(right) is float:
+                return self.folded(-right)
+        return expr
+
+    def foldBinary(self, expr: Binary) -> Expr:
+        if type(expr.left) is not Literal or type(expr.right) is not Literal:
+            return expr
+
+        left: Any = expr.left.value
+        right: Any = expr.right.value
+        match expr.operator.token_type:
+            case TokenType.EQUAL_EQUAL:
+                return self.folded(isEqual(left, right))
+            case TokenType.BANG_EQUAL:
+                return self.folded(not isEqual(left, right))
+            case TokenType.PLUS if type(left) is str and type(right) is str:
+                return self.folded(left + right)
+
+        if type(left) is not float or type(right) is not float:
+            return expr
+
+        match expr.operator.token_type:
+            case TokenType.GREATER:
+                return self.folded(left > right)
+            case TokenType.GREATER_EQUAL:
+                return self.folded(left >= right)
+            case TokenType.LESS:
+                return self.folded(left < right)
+            case TokenType.LESS_EQUAL:
+                return self.folded(left <= right)
+            case TokenType.PLUS:
+                return self.folded(left + right)
+            case TokenType.MINUS:
+                return self.folded(left - right)
+            case TokenType.STAR:
+                return self.folded(left * right)
+            case TokenType.SLASH if right != 0:
+                return self.folded(left / right)
+        return expr
+
+    def foldLogical(self, expr: Logical) -> Expr:
+        if type(expr.left) is not Literal:
+            return expr
+
+        # The operator yields its left operand when that decides the result,
+        # and otherwise whatever the right operand evaluates to.
+        self.changes["folded"] += 1
+        if expr.operator.token_type == TokenType.OR:
+            decided: bool = self.isTruthy(expr.left.value)
+        else:
+            decided = not self.isTruthy(expr.left.value)
+        return expr.left if decided else expr.right
+
+    def folded(self, value: Any) -> Literal:
+        self.changes["folded"] += 1
+        return Literal(value)
+
+    def isTruthy(self, value: Any) -> bool:
+        match value:
+            case None:
+                return False
+            case bool():
+                return value
+        return True
+
+    def report(self) -> dict[str, int]:
+        return dict(self.changes)
@@ -0,0 +1,110 @@
+from __future__ import annotations
+from abc import ABC, abstractmethod
+from typing import TextIO
+import sys
+import threading
+
+'''
+Where `print` statements write. Calling Python's `print` for every statement
+costs two writes to `sys.stdout` each time, and a flush per line when it is
+a terminal, so the engines write to a `Sink` instead, which collects output
+and hands it to its target in large pieces.
+
+A `StreamSink` writes once `limit` characters are waiting (0 writes every
+print). An `IntervalSink` wraps another sink and flushes it from a daemon
+thread every `interval` seconds, so output held before a long computation
+appears while it runs. The engines flush their sink when a run ends, and before a
+runtime error is reported so that the error comes after the output printed
+ahead of it. Embedders can collect output with a `MemorySink`, or write it
+to a file with a `FileSink`.
+'''
+
+BUFFER_SIZE: int = 1 << 16
+
+class Sink(ABC):
+    @abstractmethod
+    def write(self, text: str) -> None:
+        ...
+
+    @abstractmethod
+    def flush(self) -> None:
+        ...
+
+    def close(self) -> None:
+        self.flush()
+
+class StreamSink(Sink):
+    '''
+    Writes to `stream`, or to whatever `sys.stdout` is at the time when no
+    stream is given, so that redirecting stdout also redirects the program.
+    '''
+    def __init__(self, stream: TextIO | None = None, limit: int = BUFFER_SIZE) -> None:
+        self.stream: TextIO | None = stream
+        self.limit: int = limit
+        self.parts: list[str] = []
+        self.size: int = 0
+
+    def write(self, text: str) -> None:
+        self.parts.append(text)
+        self.size += len(text)
+        if self.size >= self.limit:
+            self.flush()
+
+    def flush(self) -> None:
+        stream: TextIO = self.stream if self.stream is not None else sys.stdout
+        if self.parts:
+            stream.write(''.join(self.parts))
+            self.parts = []
+            self.size = 0
+        stream.flush()
+
+class FileSink(StreamSink):
+    def __init__(self, path: str, limit: int = BUFFER_SIZE) -> None:
+        super().__init__(open(path, "w"), limit)
+
+    def close(self) -> None:
+        super().close()
+        self.stream.close()
+
+class IntervalSink(Sink):
+    '''
+    Flushes `sink` every `interval` seconds from a daemon thread. The
+    wrapped sink is only touched with `lock` held, so only programs that ask
+    for an interval pay for locking.
+    '''
+    def __init__(self, sink: Sink, interval: float) -> None:
+        self.sink: Sink = sink
+        self.lock: threading.Lock = threading.Lock()
+        self.stopped: threading.Event = threading.Event()
+        threading.Thread(target=self.tick, args=(interval,), daemon=True).start()
+
+    def write(self, text: str) -> None:
+        with self.lock:
+            self.sink.write(text)
+
+    def flush(self) -> None:
+        with self.lock:
+            self.sink.flush()
+
+    def close(self) -> None:
+        self.stopped.set()
+        with self.lock:
+            self.sink.close()
+
+    def tick(self, interval: float) -> None:
+        while not self.stopped.wait(interval):
+            with self.lock:
+                self.sink.flush()
+
+class MemorySink(Sink):
+    def __init__(self) -> None:
+        self.parts: list[str] = []
+
+    def write(self, text: str) -> None:
+        self.parts.append(text)
+
+    def flush(self) -> None:
+        ...
+
+    def text(self) -> str:
+        return ''.join(self.parts)
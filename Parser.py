@@ -1,6 +1,7 @@
 from Token import *
 from Expr import *
 from Stmt import *
+from typing import Iterable, Iterator
 
 class Parser:
 
@@ -8,9 +9,12 @@ class Parser:
         def __init__(self, message) -> None:
             super().__init__(message)
 
-    def __init__(self, tokens: list[Token]) -> None:
-        self.tokens: list[Token] = tokens
-        self.current: int = 0
+    def __init__(self, tokens: Iterable[Token]) -> None:
+        # The grammar needs one token of lookahead, so tokens are pulled from
+        # the scanner as they are consumed rather than indexed in a list.
+        self.tokens: Iterator[Token] = iter(tokens)
+        self.current: Token = next(self.tokens)
+        self.last: Token | None = None
 
     def parse(self) -> list[Stmt]:
         statements: list[Stmt] = []
@@ -291,7 +295,7 @@ class Parser:
         return expr
 
     def unary(self) -> Expr:
-        while self.match(TokenType.SLASH, TokenType.STAR):
+        if self.match(TokenType.BANG, TokenType.MINUS):
             operator: Token = self.previous()
             right: Expr = self.unary()
             return Unary(operator, right)
@@ -405,14 +409,15 @@ class Parser:
 
     def advance(self):
         if not self.isAtEnd():
-            self.current += 1
+            self.last = self.current
+            self.current = next(self.tokens)
         return self.previous()
 
     def isAtEnd(self) -> bool:
-        return self.peek().token_type == TokenType.EOF
+        return self.current.token_type == TokenType.EOF
 
     def peek(self) -> Token:
-        return self.tokens[self.current]
+        return self.current
 
     def previous(self) -> Token:
-        return self.tokens[self.current - 1]
+        return self.last
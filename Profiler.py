@@ -0,0 +1,267 @@
+from __future__ import annotations
+from Expr import *
+from Stmt import *
+from Token import Token
+from typing import Any, Callable
+from types import CodeType, FrameType
+import os
+import sys
+import threading
+import time
+
+from LoxCallable import LoxFunction
+
+'''
+Attributes the running time of a Lox program to its functions and source
+lines, for `--profile`.
+
+- `TracingProfiler` wraps `LoxFunction.run` and `Interpreter.execute` while
+  it runs, timing every call and every statement. It counts calls exactly,
+  but slows the program down several times. Statements inside closure
+  compiled or tiered code are not seen, so their time goes to the line of the
+  call or statement that ran them.
+- `SamplingProfiler` leaves the program alone and, from another thread,
+  looks at the Python stack of the thread running it every `interval`
+  seconds. `LoxFunction.run` frames give the Lox call stack, and the node or
+  token the innermost engine frame is working on gives the line.
+
+Both report the total and self time of each function, the self time of each
+line, and the time spent in each distinct call stack in the collapsed format
+read by flame graph tools.
+'''
+
+# A frame for code outside any Lox function.
+SCRIPT: str = "<script>"
+
+# Taken at import, before `--stats` or `--max-frames` can wrap `run`, so the
+# sampler recognizes the frames of the function itself.
+RUN_CODE: CodeType = LoxFunction.run.__code__
+
+def lineOf(node: Stmt | Expr | Token | None) -> int | None:
+    '''The line of the first token of `node` that has one.'''
+    match node:
+        case Token():
+            return node.line
+        case Var() | Function() | Class() | Variable() | Assign():
+            return node.name.line
+        case Return() | This() | Super():
+            return node.keyword.line
+        case Print() | Expression():
+            return lineOf(node.expression)
+        case If() | While():
+            return lineOf(node.condition)
+        case Block():
+            return lineOf(node.statements[0]) if node.statements else None
+        case Group():
+            return lineOf(node.expression)
+        case Unary():
+            return node.operator.line
+        case Binary() | Logical():
+            return lineOf(node.left) or node.operator.line
+        case Call():
+            return lineOf(node.callee) or node.paren.line
+        case Get() | Set():
+            return lineOf(node.thing) or node.name.line
+    return None
+
+def label(function: LoxFunction) -> str:
+    return f"{function.declaration.name.lexeme}:{function.declaration.name.line}"
+
+class FunctionStats:
+    __slots__ = ('calls', 'total', 'own')
+
+    def __init__(self) -> None:
+        self.calls: int = 0
+        self.total: float = 0.0
+        self.own: float = 0.0
+
+class Profiler:
+    def __init__(self) -> None:
+        self.functions: dict[str, FunctionStats] = {}
+        self.lines: dict[int, float] = {}
+        self.stacks: dict[tuple[str, ...], float] = {}
+        self.elapsed: float = 0.0
+
+    def start(self) -> None:
+        ...
+
+    def stop(self) -> None:
+        ...
+
+    def stats(self, name: str) -> FunctionStats:
+        stats: FunctionStats | None = self.functions.get(name)
+        if stats is None:
+            stats = self.functions[name] = FunctionStats()
+        return stats
+
+    def report(self, limit: int = 20) -> str:
+        elapsed: float = self.elapsed or 1e-9
+        lines: list[str] = [
+            f"{'function':<24} {'calls':>9} {'total s':>9} {'self s':>9} {'self %':>7}",
+        ]
+        ranked: list[tuple[str, FunctionStats]] = sorted(
+            self.functions.items(), key=lambda item: item[1].own, reverse=True)
+        for name, stats in ranked[:limit]:
+            calls: str = str(stats.calls) if stats.calls else "-"
+            lines.append(f"{name:<24} {calls:>9} {stats.total:>9.3f} {stats.own:>9.3f} "
+                         f"{100 * stats.own / elapsed:>6.1f}%")
+
+        lines.append("")
+        lines.append(f"{'line':<24} {'self s':>9} {'self %':>7}")
+        for line, own in sorted(self.lines.items(), key=lambda item: item[1], reverse=True)[:limit]:
+            lines.append(f"{f'line {line}':<24} {own:>9.3f} {100 * own / elapsed:>6.1f}%")
+        return "\n".join(lines)
+
+    def collapsed(self) -> str:
+        '''One `frame;frame;frame microseconds` line per distinct call stack.'''
+        return "".join(f"{';'.join(stack)} {round(weight * 1e6)}\n"
+                       for stack, weight in sorted(self.stacks.items())
+                       if round(weight * 1e6) > 0)
+
+class TracingProfiler(Profiler):
+    def __init__(self) -> None:
+        super().__init__()
+        self.calls: list[str] = [SCRIPT]
+        # For every function or statement under way: when it started, and
+        # the time spent in the functions or statements nested inside it.
+        self.callTimes: list[list[float]] = [[0.0, 0.0]]
+        self.lineTimes: list[list[float]] = []
+        self.lineNumbers: list[int | None] = []
+        self.active: dict[str, int] = {}
+        self.known: dict[Stmt, int | None] = {}
+        self.restore: list[Callable[[], None]] = []
+
+    def start(self) -> None:
+        from Interpreter import Interpreter
+        profiler: TracingProfiler = self
+
+        run: Callable[..., Any] = LoxFunction.run
+        def tracedRun(function: LoxFunction, interpreter: Any, values: list[Any]) -> Any:
+            profiler.enter(label(function))
+            try:
+                return run(function, interpreter, values)
+            finally:
+                profiler.exit()
+
+        execute: Callable[..., Any] = Interpreter.execute
+        def tracedExecute(interpreter: Interpreter, stmt: Stmt) -> Any:
+            profiler.enterLine(stmt)
+            try:
+                return execute(interpreter, stmt)
+            finally:
+                profiler.exitLine()
+
+        LoxFunction.run = tracedRun
+        Interpreter.execute = tracedExecute
+        self.restore = [lambda: setattr(LoxFunction, "run", run),
+                        lambda: setattr(Interpreter, "execute", execute)]
+        self.callTimes[0][0] = time.perf_counter()
+
+    def stop(self) -> None:
+        for restore in self.restore:
+            restore()
+        self.restore = []
+
+        self.elapsed = time.perf_counter() - self.callTimes[0][0]
+        stats: FunctionStats = self.stats(SCRIPT)
+        stats.total = self.elapsed
+        stats.own = self.elapsed - self.callTimes[0][1]
+        self.stacks[(SCRIPT,)] = self.stacks.get((SCRIPT,), 0.0) + stats.own
+
+    def enter(self, name: str) -> None:
+        self.calls.append(name)
+        self.active[name] = self.active.get(name, 0) + 1
+        self.callTimes.append([time.perf_counter(), 0.0])
+
+    def exit(self) -> None:
+        started, nested = self.callTimes.pop()
+        spent: float = time.perf_counter() - started
+        self.callTimes[-1][1] += spent
+
+        stack: tuple[str, ...] = tuple(self.calls)
+        name: str = self.calls.pop()
+        stats: FunctionStats = self.stats(name)
+        stats.calls += 1
+        stats.own += spent - nested
+        # Recursive calls are already inside the outermost call's total.
+        self.active[name] -= 1
+        if self.active[name] == 0:
+            stats.total += spent
+        self.stacks[stack] = self.stacks.get(stack, 0.0) + spent - nested
+
+    def enterLine(self, stmt: Stmt) -> None:
+        if stmt not in self.known:
+            self.known[stmt] = lineOf(stmt)
+        self.lineNumbers.append(self.known[stmt])
+        self.lineTimes.append([time.perf_counter(), 0.0])
+
+    def exitLine(self) -> None:
+        started, nested = self.lineTimes.pop()
+        spent: float = time.perf_counter() - started
+        if self.lineTimes:
+            self.lineTimes[-1][1] += spent
+
+        line: int | None = self.lineNumbers.pop()
+        if line is not None:
+            self.lines[line] = self.lines.get(line, 0.0) + spent - nested
+
+class SamplingProfiler(Profiler):
+    # Python frames from these modules work on the node being run.
+    ENGINES: tuple[str, ...] = ("Interpreter.py", "ClosureCompiler.py")
+
+    def __init__(self, interval: float = 0.001) -> None:
+        super().__init__()
+        self.interval: float = interval
+        self.target: int = 0
+        self.done: threading.Event = threading.Event()
+        self.sampler: threading.Thread | None = None
+        self.started: float = 0.0
+
+    def start(self) -> None:
+        self.target = threading.get_ident()
+        self.started = time.perf_counter()
+        self.sampler = threading.Thread(target=self.sample, daemon=True)
+        self.sampler.start()
+
+    def stop(self) -> None:
+        self.done.set()
+        if self.sampler is not None:
+            self.sampler.join()
+        self.elapsed = time.perf_counter() - self.started
+
+    def sample(self) -> None:
+        last: float = time.perf_counter()
+        while not self.done.wait(self.interval):
+            frame: FrameType | None = sys._current_frames().get(self.target)
+            now: float = time.perf_counter()
+            if frame is not None:
+                self.record(frame, now - last)
+            last = now
+
+    def record(self, frame: FrameType | None, weight: float) -> None:
+        calls: list[str] = []
+        line: int | None = None
+        while frame is not None:
+            if frame.f_code is RUN_CODE:
+                function: LoxFunction | None = frame.f_locals.get("self")
+                if function is not None:
+                    calls.append(label(function))
+            elif line is None and os.path.basename(frame.f_code.co_filename) in self.ENGINES:
+                line = self.lineIn(frame)
+            frame = frame.f_back
+
+        stack: tuple[str, ...] = (SCRIPT, *reversed(calls))
+        self.stacks[stack] = self.stacks.get(stack, 0.0) + weight
+        self.stats(stack[-1]).own += weight
+        for name in set(stack):
+            self.stats(name).total += weight
+        if line is not None:
+            self.lines[line] = self.lines.get(line, 0.0) + weight
+
+    def lineIn(self, frame: FrameType) -> int | None:
+        for value in frame.f_locals.values():
+            if isinstance(value, (Stmt, Expr, Token)):
+                line: int | None = lineOf(value)
+                if line is not None:
+                    return line
+        return None
@@ -0,0 +1,152 @@
+from Expr import *
+from Stmt import *
+
+'''
+Finds the top level functions whose result depends only on their arguments,
+so that `--memoize` can reuse earlier results. A function is pure when its
+body
+
+- prints nothing and declares no functions or classes,
+- reads and writes only its own parameters and locals,
+- touches no properties, `this` or `super`,
+- and calls, or reads, only top level functions that are pure themselves.
+
+Calls are only known to be pure when the callee names a top level function
+that is declared once and never assigned, so calling a parameter, a local or
+a native such as `clock` makes a function impure. Functions that call each
+other are assumed pure until one of them is found not to be.
+'''
+
+class Purity:
+    def __init__(self) -> None:
+        # The top level functions, and the names of the top level functions
+        # each one reads.
+        self.candidates: dict[str, Function] = {}
+        self.uses: dict[str, set[str]] = {}
+        self.assigned: set[str] = set()
+
+    def analyze(self, stmts: list[Stmt]) -> None:
+        declared: dict[str, int] = {}
+        for stmt in stmts:
+            match stmt:
+                case Var() | Function() | Class():
+                    declared[stmt.name.lexeme] = declared.get(stmt.name.lexeme, 0) + 1
+
+        for stmt in stmts:
+            if type(stmt) is Function and declared[stmt.name.lexeme] == 1:
+                self.candidates[stmt.name.lexeme] = stmt
+        self.findAssigned(stmts)
+
+        pure: set[str] = set()
+        for name, function in self.candidates.items():
+            if name in self.assigned:
+                continue
+            self.uses[name] = set()
+            if self.isPureBlock(function.body, self.uses[name]):
+                pure.add(name)
+
+        # Drop every function that uses one found impure until nothing changes.
+        changed: bool = True
+        while changed:
+            changed = False
+            for name in list(pure):
+                if not self.uses[name] <= pure:
+                    pure.discard(name)
+                    changed = True
+
+        for name in pure:
+            self.candidates[name].pure = True
+
+    def isPureBlock(self, stmts: list[Stmt], uses: set[str]) -> bool:
+        return all(self.isPureStmt(stmt, uses) for stmt in stmts)
+
+    def isPureStmt(self, stmt: Stmt, uses: set[str]) -> bool:
+        match stmt:
+            case Expression():
+                return self.isPureExpr(stmt.expression, uses)
+            case Var():
+                return stmt.initializer is None or self.isPureExpr(stmt.initializer, uses)
+            case Block():
+                return self.isPureBlock(stmt.statements, uses)
+            case If():
+                return (self.isPureExpr(stmt.condition, uses)
+                        and self.isPureStmt(stmt.thenBranch, uses)
+                        and (stmt.elseBranch is None or self.isPureStmt(stmt.elseBranch, uses)))
+            case While():
+                return self.isPureExpr(stmt.condition, uses) and self.isPureStmt(stmt.body, uses)
+            case Return():
+                return stmt.value is None or self.isPureExpr(stmt.value, uses)
+        # Print, and nested functions or classes.
+        return False
+
+    def isPureExpr(self, expr: Expr, uses: set[str]) -> bool:
+        match expr:
+            case Literal():
+                return True
+            case Group():
+                return self.isPureExpr(expr.expression, uses)
+            case Unary():
+                return self.isPureExpr(expr.right, uses)
+            case Binary() | Logical():
+                return self.isPureExpr(expr.left, uses) and self.isPureExpr(expr.right, uses)
+            case Variable():
+                # A top level function's locals are the only names it
+                # resolves to a scope; anything else is a global.
+                if expr.slot is not None:
+                    return True
+                if expr.name.lexeme not in self.candidates:
+                    return False
+                uses.add(expr.name.lexeme)
+                return True
+            case Assign():
+                return expr.slot is not None and self.isPureExpr(expr.value, uses)
+            case Call():
+                if type(expr.callee) is not Variable or expr.callee.slot is not None:
+                    return False
+                return (self.isPureExpr(expr.callee, uses)
+                        and all(self.isPureExpr(argument, uses) for argument in expr.arguments))
+        # Property access, `this` and `super`.
+        return False
+
+    def findAssigned(self, code: list[Stmt] | Stmt | Expr | None) -> None:
+        '''
+        Records every global name assigned anywhere in the program. A
+        function whose name is reassigned may be replaced by any value, so
+        calls through that name prove nothing.
+        '''
+        match code:
+            case list():
+                for item in code:
+                    self.findAssigned(item)
+            case Expression() | Print():
+                self.findAssigned(code.expression)
+            case Var():
+                self.findAssigned(code.initializer)
+            case Block():
+                self.findAssigned(code.statements)
+            case If():
+                self.findAssigned([code.condition, code.thenBranch, code.elseBranch])
+            case While():
+                self.findAssigned([code.condition, code.body])
+            case Function():
+                self.findAssigned(code.body)
+            case Return():
+                self.findAssigned(code.value)
+            case Class():
+                self.findAssigned(code.methods)
+            case Assign():
+                if code.slot is None:
+                    self.assigned.add(code.name.lexeme)
+                self.findAssigned(code.value)
+            case Group():
+                self.findAssigned(code.expression)
+            case Unary():
+                self.findAssigned(code.right)
+            case Binary() | Logical():
+                self.findAssigned([code.left, code.right])
+            case Call():
+                self.findAssigned([code.callee, *code.arguments])
+            case Get():
+                self.findAssigned(code.thing)
+            case Set():
+                self.findAssigned([code.thing, code.value])
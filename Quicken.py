@@ -0,0 +1,170 @@
+from __future__ import annotations
+from Equality import isEqual
+from Rope import ROPE_MIN, Rope, STRINGS, concat
+from TokenType import TokenType
+from typing import Any, Callable
+
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    from Expr import Binary, Unary
+
+'''
+Self-specializing operators for the tree walker. The first time a `Binary` or
+`Unary` node succeeds on the generic path it records, as its `quick`
+function, a variant specialized to the operator and the operand types it just
+saw: adding two numbers, concatenating two strings, comparing two numbers.
+Later evaluations call that variant directly, skipping the operator dispatch
+and the operand checks of the generic path.
+
+Each variant guards the types it was specialized for and returns DEOPT when
+they do not hold. The node then drops back to the generic path, which reports
+any type error as usual and picks a new variant for the new types. A node
+that deoptimizes more than DEOPT_LIMIT times stays generic.
+
+The variants are module level functions so quickened trees still pickle.
+'''
+
+DEOPT_LIMIT: int = 4
+
+# Returned by a variant whose type guard failed.
+DEOPT: object = object()
+
+# Every node that has been specialized at least once, for `report`.
+sites: list[Binary | Unary] = []
+
+def addNumbers(left: Any, right: Any) -> Any:
+    if type(left) is float and type(right) is float:
+        return left + right
+    return DEOPT
+
+def concatStrings(left: Any, right: Any) -> Any:
+    if type(left) is str and type(right) is str and len(left) + len(right) < ROPE_MIN:
+        return left + right
+    if type(left) in STRINGS and type(right) in STRINGS:
+        return concat(left, right)
+    return DEOPT
+
+def subtractNumbers(left: Any, right: Any) -> Any:
+    if type(left) is float and type(right) is float:
+        return left - right
+    return DEOPT
+
+def multiplyNumbers(left: Any, right: Any) -> Any:
+    if type(left) is float and type(right) is float:
+        return left * right
+    return DEOPT
+
+def divideNumbers(left: Any, right: Any) -> Any:
+    if type(left) is float and type(right) is float:
+        return left / right
+    return DEOPT
+
+def greaterNumbers(left: Any, right: Any) -> Any:
+    if type(left) is float and type(right) is float:
+        return left > right
+    return DEOPT
+
+def greaterEqualNumbers(left: Any, right: Any) -> Any:
+    if type(left) is float and type(right) is float:
+        return left >= right
+    return DEOPT
+
+def lessNumbers(left: Any, right: Any) -> Any:
+    if type(left) is float and type(right) is float:
+        return left < right
+    return DEOPT
+
+def lessEqualNumbers(left: Any, right: Any) -> Any:
+    if type(left) is float and type(right) is float:
+        return left <= right
+    return DEOPT
+
+# Equality is defined for every pair of values, so it never deoptimizes.
+def notEqual(left: Any, right: Any) -> Any:
+    return not isEqual(left, right)
+
+def negateNumber(right: Any) -> Any:
+    if type(right) is float:
+        return -right
+    return DEOPT
+
+def notValue(right: Any) -> Any:
+    return right is None or right is False
+
+BINARY: dict[tuple[TokenType, type, type], Callable[[Any, Any], Any]] = {
+    (TokenType.PLUS, float, float): addNumbers,
+    (TokenType.PLUS, str, str): concatStrings,
+    (TokenType.PLUS, str, Rope): concatStrings,
+    (TokenType.PLUS, Rope, str): concatStrings,
+    (TokenType.PLUS, Rope, Rope): concatStrings,
+    (TokenType.MINUS, float, float): subtractNumbers,
+    (TokenType.STAR, float, float): multiplyNumbers,
+    (TokenType.SLASH, float, float): divideNumbers,
+    (TokenType.GREATER, float, float): greaterNumbers,
+    (TokenType.GREATER_EQUAL, float, float): greaterEqualNumbers,
+    (TokenType.LESS, float, float): lessNumbers,
+    (TokenType.LESS_EQUAL, float, float): lessEqualNumbers,
+}
+
+EQUALITY: dict[TokenType, Callable[[Any, Any], Any]] = {
+    TokenType.EQUAL_EQUAL: isEqual,
+    TokenType.BANG_EQUAL: notEqual,
+}
+
+UNARY: dict[tuple[TokenType, type], Callable[[Any], Any]] = {
+    (TokenType.MINUS, float): negateNumber,
+}
+
+def specializeBinary(expr: Binary, left: Any, right: Any) -> None:
+    if expr.deopts > DEOPT_LIMIT:
+        return
+
+    operator: TokenType = expr.operator.token_type
+    quick: Callable[[Any, Any], Any] | None = EQUALITY.get(operator)
+    if quick is None:
+        quick = BINARY.get((operator, type(left), type(right)))
+    remember(expr, quick)
+
+def specializeUnary(expr: Unary, right: Any) -> None:
+    if expr.deopts > DEOPT_LIMIT:
+        return
+
+    operator: TokenType = expr.operator.token_type
+    quick: Callable[[Any], Any] | None = notValue
+    if operator != TokenType.BANG:
+        quick = UNARY.get((operator, type(right)))
+    remember(expr, quick)
+
+def remember(expr: Binary | Unary, quick: Callable[..., Any] | None) -> None:
+    if quick is None:
+        return
+    if expr.quick is None and expr.deopts == 0:
+        sites.append(expr)
+    expr.quick = quick
+
+def deoptimize(expr: Binary | Unary) -> None:
+    expr.quick = None
+    expr.deopts += 1
+
+def state(expr: Binary | Unary) -> str:
+    if expr.quick is not None:
+        return expr.quick.__name__
+    if expr.deopts > DEOPT_LIMIT:
+        return "generic"
+    return "deoptimized"
+
+def report(limit: int = 10) -> str:
+    quickened: int = sum(1 for site in sites if site.quick is not None)
+    deopts: int = sum(site.deopts for site in sites)
+
+    lines: list[str] = [
+        f"quickening: {len(sites)} sites, {quickened} specialized, "
+        f"{len(sites) - quickened} unspecialized, {deopts} deopts",
+    ]
+
+    worst: list[Binary | Unary] = sorted(sites, key=lambda site: site.deopts, reverse=True)
+    for site in worst[:limit]:
+        lines.append(f"  [line {site.operator.line}] {site.operator.lexeme}: "
+                     f"{state(site)}, {site.deopts} deopts")
+
+    return "\n".join(lines)
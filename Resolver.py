@@ -1,8 +1,24 @@
+from __future__ import annotations
 from Interpreter import Interpreter
 from Stmt import *
 from Expr import *
 from enum import Enum, auto
 
+'''
+Besides checking the program, the Resolver lays out its frames. Every local
+of a function gets a slot in one flat frame for the whole call; a block
+reuses the slots of blocks that ended before it. The script's own locals,
+declared in its blocks, get a frame per outermost block that declares them.
+
+A function that names a local of a function around it captures it, as in
+clox: the local is marked captured, and the reference becomes an upvalue, an
+index into the cells the closure captured when it was declared, each taken
+from a captured local or an upvalue of the frame it was declared in. Whether
+a local is captured is only known once its scope ends, so until then its
+references and declaration are kept and are told then whether its slot holds
+a Cell. Locals no closure uses stay plain values that die with their frame.
+'''
+
 class FunType(Enum):
     NONE = auto()
     FUNCTION = auto()
@@ -14,10 +30,30 @@ class ClassType(Enum):
     CLASS = auto()
     SUBCLASS = auto()
 
+class Local:
+    __slots__ = ('slot', 'frame', 'captured', 'nodes')
+
+    def __init__(self, slot: int, frame: Frame) -> None:
+        self.slot: int = slot
+        self.frame: Frame = frame
+        self.captured: bool = False
+        self.nodes: list[Var | Function | Class | Variable | Assign | This | Super] = []
+
+class Frame:
+    '''The slots of a function being resolved, or of the script.'''
+    def __init__(self, enclosing: Frame | None) -> None:
+        self.enclosing: Frame | None = enclosing
+        self.size: int = 0
+        self.peak: int = 0
+        self.upvalues: list[tuple[bool, int]] = []
+        self.captures: dict[Local, int] = dict()
+
 class Resolver:
     def __init__(self, interpreter: Interpreter) -> None:
         self.interpreter: Interpreter = interpreter
         self.scopes: list[dict[str, bool]] = []
+        self.locals: list[dict[str, Local]] = []
+        self.frame: Frame = Frame(None)
         self.currentFunction: FunType = FunType.NONE
         self.currentClass: ClassType = ClassType.NONE
 
@@ -33,13 +69,23 @@ class Resolver:
 
     def beginScope(self) -> None:
         self.scopes.append(dict())
+        self.locals.append(dict())
 
     def endScope(self) -> None:
         self.scopes.pop()
-
-    def declare(self, name: Token) -> None:
+        locals: dict[str, Local] = self.locals.pop()
+        for local in locals.values():
+            for node in local.nodes:
+                if type(node) in (Var, Function, Class):
+                    node.slot = local.slot
+                    node.cell = local.captured
+                else:
+                    self.interpreter.resolve(node, local.slot, False, local.captured)
+        self.frame.size -= len(locals)
+
+    def declare(self, name: Token) -> Local | None:
         if len(self.scopes) == 0:
-            return
+            return None
 
         scope: dict[str, bool] = self.scopes[-1]
         if name.lexeme in scope.keys():
@@ -47,6 +93,38 @@ class Resolver:
             Lox.parse_error(name,
                             "Already a variable with this name in scope.")
         scope[name.lexeme] = False
+        return self.assignSlot(name.lexeme)
+
+    def assignSlot(self, name: str) -> Local:
+        local: Local | None = self.locals[-1].get(name)
+        if local is None:
+            local = Local(self.frame.size, self.frame)
+            self.locals[-1][name] = local
+            self.frame.size += 1
+            self.frame.peak = max(self.frame.peak, self.frame.size)
+        return local
+
+    def capture(self, frame: Frame, local: Local) -> int:
+        '''The index of `local` among the upvalues of `frame`.'''
+        index: int | None = frame.captures.get(local)
+        if index is not None:
+            return index
+
+        assert frame.enclosing is not None
+        if local.frame is frame.enclosing:
+            local.captured = True
+            frame.upvalues.append((True, local.slot))
+        else:
+            frame.upvalues.append((False, self.capture(frame.enclosing, local)))
+        index = len(frame.upvalues) - 1
+        frame.captures[local] = index
+        return index
+
+    def endFrame(self, stmt: Block | Class) -> None:
+        # The script's locals only live as long as the outermost block
+        # declaring them, which runs in a frame of its own.
+        stmt.frameSize = self.frame.peak
+        self.frame.peak = 0
 
     def define(self, name: Token) -> None:
         if len(self.scopes) == 0:
@@ -107,31 +185,56 @@ class Resolver:
             case _:
                 print(f"Could not resolve expr of type: {type(expr)}")
 
-    def resolveLocal(self, expr: Expr, name: Token) -> None:
-        for i in range(len(self.scopes) - 1, -1, -1):
-            if name.lexeme in self.scopes[i].keys():
-                self.interpreter.resolve(expr, len(self.scopes) - 1 - i)
-                return
+    def resolveLocal(self, expr: Variable | Assign | This | Super, name: Token) -> None:
+        for i in range(len(self.locals) - 1, -1, -1):
+            local: Local | None = self.locals[i].get(name.lexeme)
+            if local is None:
+                continue
+            if local.frame is self.frame:
+                local.nodes.append(expr)
+            else:
+                self.interpreter.resolve(expr, self.capture(self.frame, local), True, False)
+            return
 
     def resolveFunction(self, function: Function, 
                         fun_type: FunType) -> None:
         enclosingFunction: FunType = self.currentFunction
         self.currentFunction = fun_type
+        enclosingFrame: Frame = self.frame
+        self.frame = Frame(enclosingFrame)
 
         self.beginScope()
 
+        # A method's receiver is slot 0 of its own frame, ahead of the
+        # parameters, so calling it needs no separate scope for `this`.
+        if fun_type in (FunType.METHOD, FunType.INITIALIZER):
+            function.isMethod = True
+            self.scopes[-1]["this"] = True
+            self.assignSlot("this")
+
         for param in function.params:
             self.declare(param)
             self.define(param)
 
         self.resolve(function.body)
+
+        # The receiver and parameters come first in the frame; those a
+        # closure captures are moved into cells as the call starts.
+        arguments: int = len(function.params) + function.isMethod
+        function.cellSlots = sorted(local.slot for local in self.locals[-1].values()
+                                    if local.captured and local.slot < arguments)
         self.endScope()
 
+        function.frameSize = self.frame.peak
+        function.upvalues = self.frame.upvalues
+        self.frame = enclosingFrame
         self.currentFunction = enclosingFunction
 
     def visitFunctionStmt(self, stmt: Function) -> None:
-        self.declare(stmt.name)
+        local: Local | None = self.declare(stmt.name)
         self.define(stmt.name)
+        if local is not None:
+            local.nodes.append(stmt)
 
         self.resolveFunction(stmt, FunType.FUNCTION)
 
@@ -140,22 +243,35 @@ class Resolver:
         self.resolveLocal(expr, expr.name)
 
     def visitVarStmt(self, stmt: Var) -> None:
-        self.declare(stmt.name)
+        local: Local | None = self.declare(stmt.name)
         if stmt.initializer is not None:
             self.resolve(stmt.initializer)
         self.define(stmt.name)
+        if local is not None:
+            local.nodes.append(stmt)
 
     def visitBlockStmt(self, stmt: Block) -> None:
+        # A block that binds no names needs no scope of its own: its
+        # variables resolve exactly as they would without the braces.
+        if not any(type(s) in (Var, Function, Class) for s in stmt.statements):
+            self.resolve(stmt.statements)
+            return
+
+        outermost: bool = len(self.scopes) == 0
         self.beginScope()
         self.resolve(stmt.statements)
         self.endScope()
+        if outermost:
+            self.endFrame(stmt)
 
     def visitClassStmt(self, stmt: Class) -> None:
         enclosingClass: ClassType = self.currentClass
         self.currentClass = ClassType.CLASS
 
-        self.declare(stmt.name)
+        local: Local | None = self.declare(stmt.name)
         self.define(stmt.name)
+        if local is not None:
+            local.nodes.append(stmt)
 
         if (stmt.superclass is not None 
                 and stmt.name.lexeme == stmt.superclass.name.lexeme):
@@ -166,12 +282,11 @@ class Resolver:
             self.currentClass = ClassType.SUBCLASS
             self.resolve(stmt.superclass)
 
+        outermost: bool = len(self.scopes) == 0
         if stmt.superclass is not None:
             self.beginScope()
             self.scopes[-1]["super"] = True
-
-        self.beginScope()
-        self.scopes[-1]["this"] = True
+            stmt.superSlot = self.assignSlot("super").slot
 
         for method in stmt.methods:
             declaration: FunType = FunType.METHOD
@@ -179,10 +294,10 @@ class Resolver:
                 declaration = FunType.INITIALIZER
             self.resolveFunction(method, declaration)
 
-        self.endScope()
-
         if stmt.superclass is not None:
             self.endScope()
+            if outermost:
+                self.endFrame(stmt)
 
         self.currentClass = enclosingClass
 
@@ -224,6 +339,7 @@ class Resolver:
             Lox.parse_error(expr.keyword, "Can't use 'super' in a class with no superclass.")
 
         self.resolveLocal(expr, expr.keyword)
+        self.resolveLocal(expr.this, expr.this.keyword)
 
     def visitThisExpr(self, expr: This) -> None:
         if self.currentClass == ClassType.NONE:
@@ -1,6 +1,15 @@
-from typing import Any
+from enum import Enum, auto
 
-class ReturnException(Exception):
-    def __init__(self, value: Any) -> None:
-        super().__init__()
-        self.value: Any = value
+'''
+Statements report how they completed by what `execute` returns: None when
+execution carries on with the next statement, or RETURN when a `return`
+statement ran. The returned value is left on the interpreter's `returnValue`,
+and blocks and loops hand RETURN straight back up to the function call, so a
+return costs a few comparisons rather than raising and unwinding an
+exception through every enclosing block.
+'''
+
+class Completion(Enum):
+    RETURN = auto()
+
+RETURN: Completion = Completion.RETURN
@@ -0,0 +1,74 @@
+from __future__ import annotations
+from typing import Any
+
+'''
+Lazy string concatenation. Adding two strings copies both, so a program that
+builds a string a piece at a time with `+` copies everything it has built so
+far on every step. Once a sum reaches ROPE_MIN characters `concat` instead
+returns a `Rope`, a node holding its two halves, and joins the pieces only
+when the text is needed: when the value is printed, compared, hashed or
+converted with `str`. The joined text then replaces the node's halves, so it
+is built at most once.
+
+Ropes are Lox strings, so every place that accepts a string checks its type
+against STRINGS rather than `str`, and equality and hashing match the text.
+'''
+
+# Sums shorter than this are cheaper to copy than to defer.
+ROPE_MIN: int = 128
+
+class Rope:
+    __slots__ = ('left', 'right', 'length', 'text')
+
+    def __init__(self, left: str | Rope, right: str | Rope, length: int) -> None:
+        self.left: str | Rope | None = left
+        self.right: str | Rope | None = right
+        self.length: int = length
+        self.text: str | None = None
+
+    def flatten(self) -> str:
+        if self.text is not None:
+            return self.text
+
+        # Loops build ropes thousands of nodes deep, so walk them with an
+        # explicit stack, right half pushed first so the left comes out first.
+        pieces: list[str] = []
+        pending: list[str | Rope] = [self]
+        while pending:
+            node: str | Rope = pending.pop()
+            if type(node) is str:
+                pieces.append(node)
+            elif node.text is not None:
+                pieces.append(node.text)
+            else:
+                pending.append(node.right)
+                pending.append(node.left)
+
+        self.text = ''.join(pieces)
+        self.left = self.right = None
+        return self.text
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __str__(self) -> str:
+        return self.flatten()
+
+    def __eq__(self, other: Any) -> bool:
+        if type(other) is Rope:
+            return self.length == other.length and self.flatten() == other.flatten()
+        if type(other) is str:
+            return self.length == len(other) and self.flatten() == other
+        return NotImplemented
+
+    def __hash__(self) -> int:
+        return hash(self.flatten())
+
+STRINGS: frozenset[type] = frozenset({str, Rope})
+
+def concat(left: str | Rope, right: str | Rope) -> str | Rope:
+    length: int = len(left) + len(right)
+    if length < ROPE_MIN:
+        # Both are short, so neither is a rope.
+        return left + right
+    return Rope(left, right, length)
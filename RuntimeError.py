@@ -6,3 +6,10 @@ class RuntimeError(Exception):
         super().__init__(message)
         self.token: Token = token
 
+
+class NativeError(Exception):
+    '''
+    An error raised by a native callable, which has no token of its own. The
+    call reports it as a RuntimeError at the call's closing parenthesis.
+    '''
+    ...
@@ -1,6 +1,54 @@
 from TokenType import *
 from Token import Token
-from typing import Any
+from typing import Any, Iterator
+import re
+
+# Whitespace and comments are skipped as part of the lexeme that follows them
+# (possessively, so they are never given back to `other`), which leaves one
+# match per token, newline or error, plus an empty `end` match when the
+# source ends in whitespace. `re` tries the alternatives in order, and an
+# unterminated string is matched without its closing quote.
+LEXEME = re.compile(r'''
+    (?:[ \t\r]+|//[^\n]*)*+
+    (?:
+        (?P<newline>\n)
+      | (?P<identifier>[A-Za-z_][A-Za-z0-9_]*)
+      | (?P<operator>[!=<>]=?|[(){},.\-+;*/])
+      | (?P<number>[0-9]+(?:\.[0-9]+)?)
+      | (?P<string>"[^"]*"?)
+      | (?P<other>.)
+      | (?P<end>\Z)
+    )
+''', re.VERBOSE)
+
+OPERATORS: dict[str, TokenType] = {
+    '(': TokenType.LEFT_PAREN,
+    ')': TokenType.RIGHT_PAREN,
+    '{': TokenType.LEFT_BRACE,
+    '}': TokenType.RIGHT_BRACE,
+    ',': TokenType.COMMA,
+    '.': TokenType.DOT,
+    '-': TokenType.MINUS,
+    '+': TokenType.PLUS,
+    ';': TokenType.SEMICOLON,
+    '*': TokenType.STAR,
+    '/': TokenType.SLASH,
+    '!': TokenType.BANG,
+    '!=': TokenType.BANG_EQUAL,
+    '=': TokenType.EQUAL,
+    '==': TokenType.EQUAL_EQUAL,
+    '<': TokenType.LESS,
+    '<=': TokenType.LESS_EQUAL,
+    '>': TokenType.GREATER,
+    '>=': TokenType.GREATER_EQUAL,
+}
+
+def normalizeNewlines(text: str) -> str:
+    # Scripts are read as bytes, so this does what reading them as text did:
+    # "\r\n" and a lone "\r" both end a line, and strings hold them as "\n".
+    if '\r' not in text:
+        return text
+    return text.replace('\r\n', '\n').replace('\r', '\n')
 
 class Scanner:
     keywords = {
@@ -30,7 +78,68 @@ class Scanner:
             return TokenType.IDENTIFIER
 
     def __init__(self, source: str) -> None:
-        self.source: str = source
+        self.source: str = normalizeNewlines(source)
+        self.line: int = 1
+        self.tokens: list[Token] = []
+
+    def scanTokens(self) -> list[Token]:
+        pending: int | None = self.scanChunk(self.source)
+        if pending is not None:
+            self.unterminated(self.source[pending:])
+
+        self.tokens.append(Token(TokenType.EOF, "", None, self.line))
+        return self.tokens
+
+    def scanChunk(self, source: str) -> int | None:
+        '''
+        Appends the tokens in `source` to `self.tokens`. An unterminated
+        string literal is left unscanned and its offset returned, so a caller
+        holding more input can retry it.
+        '''
+        tokens: list[Token] = self.tokens
+        line: int = self.line
+        keywords: dict[str, TokenType] = Scanner.keywords
+
+        for m in LEXEME.finditer(source):
+            kind: str = m.lastgroup
+            text: str = m.group(kind)
+
+            if kind == 'newline':
+                line += 1
+            elif kind == 'end':
+                break
+            elif kind == 'identifier':
+                tokens.append(Token(keywords.get(text, TokenType.IDENTIFIER), text, None, line))
+            elif kind == 'operator':
+                tokens.append(Token(OPERATORS[text], text, None, line))
+            elif kind == 'number':
+                tokens.append(Token(TokenType.NUMBER, text, float(text), line))
+            elif kind == 'string':
+                if len(text) == 1 or text[-1] != '"':
+                    self.line = line
+                    return m.start(kind)
+                line += text.count('\n')
+                tokens.append(Token(TokenType.STRING, text, text[1:-1], line))
+            else:
+                import Lox
+                Lox.error(line, f"Unexpected character: {text}")
+
+        self.line = line
+        return None
+
+    def unterminated(self, literal: str) -> None:
+        self.line += literal.count('\n')
+
+        import Lox
+        Lox.error(self.line, "Unterminated string.")
+
+class LegacyScanner(Scanner):
+    '''
+    The original character at a time scanner, kept so its output can be
+    compared against the table driven one (`--legacy-scanner`).
+    '''
+    def __init__(self, source: str) -> None:
+        self.source: str = normalizeNewlines(source)
         self.start: int = 0
         self.current: int = 0
         self.line: int = 1
@@ -78,7 +187,7 @@ class Scanner:
             case '<':
                 self.addToken(TokenType.LESS_EQUAL if self.match('=') else TokenType.LESS)
             case '>':
-                self.addToken(TokenType.GREATER_EQUAL if self.match('=') else TokenType.GREATER_EQUAL)
+                self.addToken(TokenType.GREATER_EQUAL if self.match('=') else TokenType.GREATER)
             case '/':
                 if self.match('/'):
                     while self.peek() != '\n' and not self.isAtEnd():
@@ -108,7 +217,7 @@ class Scanner:
             self.advance()
 
         text = self.source[self.start:self.current]
-        token = Scanner.keywordToTokenType(text)
+        token = self.keywordToTokenType(text)
 
         self.addToken(token)
 
@@ -120,7 +229,8 @@ class Scanner:
 
         if self.isAtEnd():
             import Lox
-            Lox.error(self.line, "Unterminated string.");
+            Lox.error(self.line, "Unterminated string.")
+            return
 
         self.advance()
 
@@ -150,7 +260,7 @@ class Scanner:
         return self.source[self.current]
     
     def isAlpha(self, c: str) -> bool:
-        return (c >= 'a' and c <= 'z') or (c >= 'A' and c <= 'Z') or (c == '=')
+        return (c >= 'a' and c <= 'z') or (c >= 'A' and c <= 'Z') or (c == '_')
 
     def isDigit(self, c: str) -> bool:
         return c >= '0' and c <= '9'
@@ -174,5 +284,43 @@ class Scanner:
 
         self.current += 1
         return True
-    
 
+class StreamingScanner(Scanner):
+    '''
+    Scans a memory-mapped file one line at a time and yields tokens as they
+    are found, so neither the decoded source nor the token list is ever held
+    in full. A string literal that runs past the end of a line is rescanned
+    together with the following line.
+    '''
+    def __init__(self, data: bytes) -> None:
+        super().__init__("")
+        self.data: bytes = data
+        self.offset: int = 0
+
+    def scanTokens(self) -> Iterator[Token]:
+        pending: str = ""
+        while self.nextLine():
+            source: str = pending + self.source
+            start: int | None = self.scanChunk(source)
+
+            if self.tokens:
+                yield from self.tokens
+                self.tokens.clear()
+
+            pending = "" if start is None else source[start:]
+
+        if pending:
+            self.unterminated(pending)
+
+        yield Token(TokenType.EOF, "", None, self.line)
+
+    def nextLine(self) -> bool:
+        if self.offset >= len(self.data):
+            return False
+
+        end: int = self.data.find(b'\n', self.offset)
+        end = len(self.data) if end == -1 else end + 1
+
+        self.source = normalizeNewlines(self.data[self.offset:end].decode())
+        self.offset = end
+        return True
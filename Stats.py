@@ -0,0 +1,150 @@
+from __future__ import annotations
+from Expr import Expr
+from Stmt import Stmt
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator
+import json
+import sys
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+'''
+Phase timings and runtime counts for `--stats`. Each phase the driver runs
+(loading the program cache, scanning, parsing, resolving, optimizing and
+executing) records its wall time and how far it raised the process's peak
+resident memory, which costs nothing to track. With `trace` set, memory is
+instead measured with tracemalloc: the most memory the phase allocated
+beyond what was in use when it began. That is exact, but tracing every
+allocation slows the program down several times.
+
+While the program executes, the constructors of the runtime's environments
+and instances, and the entry point of every Lox call, are wrapped to count
+them. The wrappers are only installed by `start`, so runs without `--stats`
+are untouched.
+'''
+
+def countNodes(node: Any) -> int:
+    match node:
+        case list():
+            return sum(countNodes(item) for item in node)
+        case Stmt() | Expr():
+            return 1 + sum(countNodes(value) for value in vars(node).values())
+    return 0
+
+class Stats:
+    def __init__(self, engine: str, trace: bool = False) -> None:
+        self.engine: str = engine
+        self.trace: bool = trace
+        self.phases: dict[str, dict[str, float]] = {}
+        self.counts: dict[str, int] = {
+            "tokens": 0,
+            "nodes": 0,
+            "environments": 0,
+            "instances": 0,
+            "calls": 0,
+        }
+        self.restore: list[Callable[[], None]] = []
+
+    @contextmanager
+    def phase(self, name: str, counting: bool = False) -> Iterator[None]:
+        if self.trace and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        if self.trace:
+            tracemalloc.reset_peak()
+            before: int = tracemalloc.get_traced_memory()[0]
+        else:
+            before = self.peakResident()
+        if counting:
+            self.start()
+        started: float = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds: float = time.perf_counter() - started
+            if counting:
+                self.stop()
+            if self.trace:
+                peak: int = tracemalloc.get_traced_memory()[1]
+            else:
+                peak = self.peakResident()
+            self.phases[name] = {"seconds": seconds, "peak bytes": peak - before}
+
+    def peakResident(self) -> int:
+        if resource is None:
+            return 0
+        peak: int = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports kilobytes and macOS bytes.
+        return peak if sys.platform == "darwin" else peak * 1024
+
+    def tokens(self, tokens: Any) -> Any:
+        '''Counts `tokens` as they are consumed, returning them to be used instead.'''
+        if isinstance(tokens, list):
+            self.counts["tokens"] += len(tokens)
+            return tokens
+
+        def counted() -> Iterator[Any]:
+            for token in tokens:
+                self.counts["tokens"] += 1
+                yield token
+        return counted()
+
+    def nodes(self, stmts: list[Stmt]) -> None:
+        self.counts["nodes"] = countNodes(stmts)
+
+    def start(self) -> None:
+        if self.engine == "vm":
+            from VM import VMInstance, CallFrame
+            self.count(VMInstance, "__init__", "instances")
+            self.count(CallFrame, "__init__", "calls")
+            # The frame for the script itself is not a call.
+            self.counts["calls"] -= 1
+        else:
+            from Environment import Environment
+            from LoxCallable import LoxFunction, LoxInstance
+            self.count(Environment, "__init__", "environments")
+            self.count(LoxInstance, "__init__", "instances")
+            self.count(LoxFunction, "run", "calls")
+
+    def stop(self) -> None:
+        for restore in self.restore:
+            restore()
+        self.restore = []
+
+    def count(self, owner: type, name: str, counter: str) -> None:
+        original: Callable[..., Any] = getattr(owner, name)
+        counts: dict[str, int] = self.counts
+
+        def counted(*args: Any, **kwargs: Any) -> Any:
+            counts[counter] += 1
+            return original(*args, **kwargs)
+
+        setattr(owner, name, counted)
+        self.restore.append(lambda: setattr(owner, name, original))
+
+    def memory(self) -> str:
+        return "traced allocations" if self.trace else "peak resident growth"
+
+    def report(self) -> str:
+        lines: list[str] = [f"{'phase':<10} {'ms':>10} {'peak KiB':>10}  ({self.memory()})"]
+        for name, phase in self.phases.items():
+            lines.append(f"{name:<10} {1000 * phase['seconds']:>10.2f} "
+                         f"{phase['peak bytes'] / 1024:>10.1f}")
+        lines.append(f"{'peak resident':<10} {self.peakResident() / 1024:>21.1f}")
+        lines.append("")
+        for name, count in self.counts.items():
+            lines.append(f"{name:<14} {count:>12}")
+        return "\n".join(lines)
+
+    def json(self) -> str:
+        return json.dumps({
+            "engine": self.engine,
+            "memory": self.memory(),
+            "peak resident bytes": self.peakResident(),
+            "phases": self.phases,
+            "counts": self.counts,
+        }, indent=2)
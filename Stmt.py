@@ -16,10 +16,18 @@ class Var(Stmt):
     def __init__(self, name: Token, initializer: Expr | None) -> None:
         self.name: Token = name
         self.initializer: Expr | None = initializer
+        # Set by the Resolver: the variable's frame slot, or None for a
+        # global, and whether a closure captures it.
+        self.slot: int | None = None
+        self.cell: bool = False
 
 class Block(Stmt):
     def __init__(self, statements: list[Stmt]) -> None:
         self.statements: list[Stmt] = statements
+        # Set by the Resolver on a block of the script itself that declares
+        # locals: the size of the frame it runs in. Other blocks run in the
+        # frame of the code around them.
+        self.frameSize: int = 0
 
 class If(Stmt):
     def __init__(self, condition: Expr, 
@@ -39,6 +47,17 @@ class Function(Stmt):
         self.name: Token = name
         self.params: list[Token] = params
         self.body: list[Stmt] = body
+        self.isMethod: bool = False
+        self.slot: int | None = None
+        self.cell: bool = False
+        # The frame layout of a call: how many slots it needs, which
+        # parameters closures capture, and where each captured cell comes
+        # from in the frame the function is declared in.
+        self.frameSize: int = 0
+        self.cellSlots: list[int] = []
+        self.upvalues: list[tuple[bool, int]] = []
+        # Set by Purity when the result depends only on the arguments.
+        self.pure: bool = False
 
 class Return(Stmt):
     def __init__(self, keyword: Token, value: Expr | None) -> None:
@@ -50,3 +69,9 @@ class Class(Stmt):
         self.name: Token = name
         self.methods: list[Function] = methods
         self.superclass: Variable | None = superclass
+        self.slot: int | None = None
+        self.cell: bool = False
+        # `super` is a captured local of the frame the class is declared in;
+        # a class of the script itself gets a frame of its own for it.
+        self.superSlot: int = 0
+        self.frameSize: int = 0
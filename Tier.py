@@ -0,0 +1,432 @@
+from __future__ import annotations
+from Expr import *
+from Stmt import *
+from RuntimeError import NativeError, RuntimeError
+from Rope import ROPE_MIN, STRINGS, concat
+from Equality import isEqual
+from TokenType import TokenType
+from typing import Any, Callable
+import math
+import sys
+
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    from Interpreter import Interpreter
+    from LoxCallable import LoxFunction
+
+'''
+Tiered execution for the tree walking engines. LoxFunction.call reports every
+call here; once a function declaration has been called `threshold` times its
+body is translated into Python source, compiled with `compile()`, and later
+calls run the resulting Python function instead of walking the tree.
+
+Only functions whose locals can safely become Python locals are promoted: a
+body that declares nested functions or classes is left on the tree walker,
+since those would capture the call environment. Everything else a body does
+is translated: each frame slot becomes a Python local, and names that resolve
+outside the function are read through the closure's cells or the globals
+exactly as the walker would.
+
+Promotion counts calls only. A running body is never swapped out for its
+compiled form, so a long loop in top-level code, or in a function called
+fewer than `threshold` times, stays on the tree walker however many times it
+goes round; hot loops only benefit once they sit in a function that is called
+repeatedly.
+'''
+
+class Unsupported(Exception):
+    ...
+
+class Tier:
+    def __init__(self, interpreter: Interpreter, threshold: int, dump: bool) -> None:
+        self.interpreter: Interpreter = interpreter
+        self.threshold: int = threshold
+        self.dump: bool = dump
+        self.calls: dict[Function, int] = dict()
+        self.compiled: dict[Function, Callable[..., Any] | None] = dict()
+
+    def lookup(self, function: LoxFunction) -> Callable[..., Any] | None:
+        declaration: Function = function.declaration
+        if declaration in self.compiled:
+            return self.compiled[declaration]
+
+        calls: int = self.calls.get(declaration, 0) + 1
+        self.calls[declaration] = calls
+        if calls < self.threshold or function.isInitializer:
+            return None
+
+        compiled: Callable[..., Any] | None = None
+        try:
+            compiled = SourceCompiler(self.interpreter, declaration).build(self.dump)
+        except Unsupported as reason:
+            if self.dump:
+                print(f"# {declaration.name.lexeme}: staying on the tree walker ({reason})",
+                      file=sys.stderr)
+        self.compiled[declaration] = compiled
+        return compiled
+
+def callValue(interpreter: Interpreter, callee: Any, arguments: list[Any], paren: Token) -> Any:
+    from LoxCallable import LoxCallable
+    if not isinstance(callee, LoxCallable):
+        raise RuntimeError(paren, "Can only call functions and classes.")
+    if len(arguments) != callee.arity():
+        raise RuntimeError(
+            paren,
+            f"Expected {callee.arity()} arguments but got {len(arguments)}.")
+    try:
+        return callee.call(interpreter, arguments)
+    except RecursionError:
+        raise RuntimeError(paren, "Stack overflow.")
+    except NativeError as error:
+        raise RuntimeError(paren, str(error))
+
+def getProperty(thing: Any, cache: InlineCache) -> Any:
+    from LoxCallable import LoxInstance, LoxNative
+    if type(thing) is LoxInstance:
+        return cache.get(thing)
+    if isinstance(thing, LoxNative):
+        return thing.getField(cache.token)
+    raise RuntimeError(cache.token, "Only instances have properties.")
+
+def invokeMethod(interpreter: Interpreter, thing: Any, method: LoxFunction | None,
+                 callee: Any, arguments: list[Any], paren: Token) -> Any:
+    if method is None:
+        return callValue(interpreter, callee, arguments, paren)
+    if len(arguments) != method.arity():
+        raise RuntimeError(
+            paren,
+            f"Expected {method.arity()} arguments but got {len(arguments)}.")
+    try:
+        return method.invoke(interpreter, thing, arguments)
+    except RecursionError:
+        raise RuntimeError(paren, "Stack overflow.")
+
+def getSuper(superclass: Any, cache: InlineCache, thing: Any) -> Any:
+    function: Any = cache.findMethod(superclass)
+    if function is None:
+        method: Token = cache.token
+        raise RuntimeError(method, f"Undefined property '{method.lexeme}'.")
+    return function.bind(thing)
+
+def isNumber(expr: Expr) -> bool:
+    while type(expr) is Group:
+        expr = expr.expression
+    return type(expr) is Literal and type(expr.value) is float
+
+def assigns(expr: Expr) -> bool:
+    '''
+    Whether evaluating `expr` may assign to a Lox local of the function being
+    translated. Calls cannot, since promoted functions never hand their
+    locals to a closure.
+    '''
+    match expr:
+        case Assign():
+            return True
+        case Group():
+            return assigns(expr.expression)
+        case Unary():
+            return assigns(expr.right)
+        case Binary() | Logical():
+            return assigns(expr.left) or assigns(expr.right)
+        case Call():
+            return assigns(expr.callee) or any(assigns(a) for a in expr.arguments)
+        case Get():
+            return assigns(expr.thing)
+        case Set():
+            return assigns(expr.thing) or assigns(expr.value)
+    return False
+
+class SourceCompiler:
+    '''
+    Lowers one function body to Python. Every Lox expression becomes a
+    sequence of Python statements that leave its value in an "atom": a
+    literal, a Python local standing for a Lox local, or a temporary. Operands
+    are evaluated into atoms left to right, so evaluation order and the
+    runtime errors raised are the same as in the tree walker.
+    '''
+    def __init__(self, interpreter: Interpreter, function: Function) -> None:
+        self.interpreter: Interpreter = interpreter
+        self.function: Function = function
+        self.lines: list[str] = []
+        self.depth: int = 1
+        self.constants: dict[str, Any] = dict()
+        self.temps: int = 0
+
+    def build(self, dump: bool) -> Callable[..., Any]:
+        name: str = f"lox_{self.function.name.lexeme}"
+
+        params: list[str] = [param.lexeme for param in self.function.params]
+        if self.function.isMethod:
+            params.insert(0, "this")
+        params = [self.local(lexeme, slot) for slot, lexeme in enumerate(params)]
+        for statement in self.function.body:
+            self.statement(statement)
+        self.emit("return None")
+
+        header: str = f"def {name}({', '.join(['_cells'] + params)}):"
+        source: str = '\n'.join([header] + self.lines) + '\n'
+        if dump:
+            print(f"# tier: {self.function.name.lexeme} "
+                  f"(line {self.function.name.line})\n{source}", file=sys.stderr)
+
+        from LoxCallable import LoxInstance
+        namespace: dict[str, Any] = {
+            '_interp': self.interpreter,
+            '_globals': self.interpreter.globals,
+            '_stringify': self.interpreter.stringify,
+            '_call': callValue,
+            '_invoke': invokeMethod,
+            '_get': getProperty,
+            '_super': getSuper,
+            '_RuntimeError': RuntimeError,
+            '_LoxInstance': LoxInstance,
+            '_STRINGS': STRINGS,
+            '_concat': concat,
+            '_isEqual': isEqual,
+        }
+        namespace.update(self.constants)
+        code: Any = compile(source, f"<tier {self.function.name.lexeme}>", "exec")
+        exec(code, namespace)
+        return namespace[name]
+
+    def emit(self, line: str) -> None:
+        self.lines.append("    " * self.depth + line)
+
+    def local(self, lexeme: str, slot: int) -> str:
+        # Locals sharing a slot never live at the same time, so naming them
+        # by slot as well as name keeps them apart.
+        return f"{lexeme}_{slot}"
+
+    def temp(self, value: str) -> str:
+        self.temps += 1
+        name: str = f"_t{self.temps}"
+        self.emit(f"{name} = {value}")
+        return name
+
+    def constant(self, value: Any) -> str:
+        name: str = f"_k{len(self.constants)}"
+        self.constants[name] = value
+        return name
+
+    def fail(self, token: Token, message: str) -> None:
+        self.emit(f"raise _RuntimeError({self.constant(token)}, {message!r})")
+
+    def statement(self, stmt: Stmt) -> None:
+        match stmt:
+            case Expression():
+                self.expression(stmt.expression)
+            case Print():
+                value: str = self.expression(stmt.expression)
+                self.emit(f"_interp.output.write(_stringify({value}) + '\\n')")
+            case Var():
+                value = "None"
+                if stmt.initializer is not None:
+                    value = self.expression(stmt.initializer)
+                assert stmt.slot is not None
+                self.emit(f"{self.local(stmt.name.lexeme, stmt.slot)} = {value}")
+            case Block():
+                for statement in stmt.statements:
+                    self.statement(statement)
+            case If():
+                condition: str = self.expression(stmt.condition)
+                self.emit(f"if {condition} is not None and {condition} is not False:")
+                self.nested(stmt.thenBranch)
+                if stmt.elseBranch is not None:
+                    self.emit("else:")
+                    self.nested(stmt.elseBranch)
+            case While():
+                self.emit("while True:")
+                self.depth += 1
+                condition = self.expression(stmt.condition)
+                self.emit(f"if {condition} is None or {condition} is False:")
+                self.emit("    break")
+                self.statement(stmt.body)
+                self.depth -= 1
+            case Return():
+                value = "None"
+                if stmt.value is not None:
+                    value = self.expression(stmt.value)
+                self.emit(f"return {value}")
+            case Function():
+                raise Unsupported("declares a nested function")
+            case Class():
+                raise Unsupported("declares a class")
+            case _:
+                raise Unsupported(f"{type(stmt).__name__} statement")
+
+    def nested(self, stmt: Stmt) -> None:
+        self.depth += 1
+        start: int = len(self.lines)
+        self.statement(stmt)
+        if len(self.lines) == start:
+            self.emit("pass")
+        self.depth -= 1
+
+    def expression(self, expr: Expr, keep: bool = False) -> str:
+        '''
+        Returns an atom holding the value of `expr`. When `keep` is set the
+        atom must not change while later sibling operands are evaluated, so
+        a Python local that a sibling could assign to is copied first.
+        '''
+        match expr:
+            case Literal():
+                value: Any = expr.value
+                # inf and nan have no literal form in Python source.
+                if type(value) is str or (type(value) is float and not math.isfinite(value)):
+                    return self.constant(value)
+                return repr(value)
+            case Group():
+                return self.expression(expr.expression, keep)
+            case Variable():
+                return self.variable(expr.name, expr, keep)
+            case This():
+                return self.variable(expr.keyword, expr, keep)
+            case Assign():
+                return self.assign(expr)
+            case Unary():
+                return self.unary(expr)
+            case Binary():
+                return self.binary(expr)
+            case Logical():
+                return self.logical(expr)
+            case Call() if type(expr.callee) is Get:
+                return self.invoke(expr, expr.callee)
+            case Call():
+                callee: str = self.expression(
+                    expr.callee, any(assigns(a) for a in expr.arguments))
+                arguments: list[str] = [
+                    self.expression(a, any(assigns(b) for b in expr.arguments[i + 1:]))
+                    for i, a in enumerate(expr.arguments)]
+                return self.temp(
+                    f"_call(_interp, {callee}, [{', '.join(arguments)}], "
+                    f"{self.constant(expr.paren)})")
+            case Get():
+                thing: str = self.expression(expr.thing)
+                return self.temp(f"_get({thing}, {self.constant(expr.cache)})")
+            case Set():
+                thing = self.expression(expr.thing, assigns(expr.value))
+                self.emit(f"if type({thing}) is not _LoxInstance:")
+                self.depth += 1
+                self.fail(expr.name, "Only instances have fields.")
+                self.depth -= 1
+                value = self.expression(expr.value)
+                self.emit(f"{self.constant(expr.cache)}.set({thing}, {value})")
+                return value
+            case Super():
+                superclass: str = self.variable(expr.keyword, expr, False)
+                this: str = self.variable(expr.this.keyword, expr.this, False)
+                return self.temp(f"_super({superclass}, {self.constant(expr.cache)}, {this})")
+            case _:
+                raise Unsupported(f"{type(expr).__name__} expression")
+
+    def invoke(self, expr: Call, get: Get) -> str:
+        # As in the walker, a method called through obj.method(...) is
+        # invoked on obj directly instead of being bound first.
+        # Anything but an instance goes through _get, which finds the
+        # methods of built-in types and fails for other values.
+        thing: str = self.expression(get.thing, any(assigns(a) for a in expr.arguments))
+        cache: str = self.constant(get.cache)
+        method: str = self.temp(f"{cache}.method({thing}) if type({thing}) is _LoxInstance else None")
+        callee: str = self.temp(f"_get({thing}, {cache}) if {method} is None else None")
+        arguments: list[str] = [
+            self.expression(a, any(assigns(b) for b in expr.arguments[i + 1:]))
+            for i, a in enumerate(expr.arguments)]
+        return self.temp(
+            f"_invoke(_interp, {thing}, {method}, {callee}, [{', '.join(arguments)}], "
+            f"{self.constant(expr.paren)})")
+
+    def variable(self, name: Token, expr: Variable | This | Super, keep: bool) -> str:
+        if expr.slot is None:
+            return self.temp(f"_globals.get({self.constant(name)})")
+
+        if expr.upvalue:
+            return self.temp(f"_cells[{expr.slot}].value")
+
+        local: str = self.local(name.lexeme, expr.slot)
+        return self.temp(local) if keep else local
+
+    def assign(self, expr: Assign) -> str:
+        value: str = self.expression(expr.value, True)
+
+        if expr.slot is None:
+            self.emit(f"_globals.assign({self.constant(expr.name)}, {value})")
+            return value
+
+        if expr.upvalue:
+            self.emit(f"_cells[{expr.slot}].value = {value}")
+            return value
+
+        local: str = self.local(expr.name.lexeme, expr.slot)
+        self.emit(f"{local} = {value}")
+        return local
+
+    def unary(self, expr: Unary) -> str:
+        right: str = self.expression(expr.right)
+        if expr.operator.token_type == TokenType.BANG:
+            return self.temp(f"{right} is None or {right} is False")
+
+        self.emit(f"if type({right}) is not float:")
+        self.depth += 1
+        self.fail(expr.operator, "Operand must be a number.")
+        self.depth -= 1
+        return self.temp(f"-{right}")
+
+    comparisons: dict[TokenType, str] = {
+        TokenType.GREATER: '>',
+        TokenType.GREATER_EQUAL: '>=',
+        TokenType.LESS: '<',
+        TokenType.LESS_EQUAL: '<=',
+        TokenType.MINUS: '-',
+        TokenType.SLASH: '/',
+        TokenType.STAR: '*',
+    }
+
+    def binary(self, expr: Binary) -> str:
+        left: str = self.expression(expr.left, assigns(expr.right))
+        right: str = self.expression(expr.right)
+
+        match expr.operator.token_type:
+            case TokenType.EQUAL_EQUAL:
+                return self.temp(f"_isEqual({left}, {right})")
+            case TokenType.BANG_EQUAL:
+                return self.temp(f"not _isEqual({left}, {right})")
+            case TokenType.PLUS:
+                self.temps += 1
+                result: str = f"_t{self.temps}"
+                self.emit(f"if type({left}) is float and type({right}) is float:")
+                self.emit(f"    {result} = {left} + {right}")
+                self.emit(f"elif (type({left}) is str and type({right}) is str "
+                          f"and len({left}) + len({right}) < {ROPE_MIN}):")
+                self.emit(f"    {result} = {left} + {right}")
+                self.emit(f"elif type({left}) in _STRINGS and type({right}) in _STRINGS:")
+                self.emit(f"    {result} = _concat({left}, {right})")
+                self.emit("else:")
+                self.depth += 1
+                self.fail(expr.operator, "Operands must both be numbers or strings")
+                self.depth -= 1
+                return result
+
+        operator: str = SourceCompiler.comparisons[expr.operator.token_type]
+        checks: list[str] = [f"type({operand}) is not float"
+                             for operand, node in ((left, expr.left), (right, expr.right))
+                             if not isNumber(node)]
+        if len(checks) > 0:
+            self.emit(f"if {' or '.join(checks)}:")
+            self.depth += 1
+            self.fail(expr.operator, "Operands must be numbers.")
+            self.depth -= 1
+        return self.temp(f"{left} {operator} {right}")
+
+    def logical(self, expr: Logical) -> str:
+        result: str = self.temp(self.expression(expr.left))
+
+        if expr.operator.token_type == TokenType.OR:
+            self.emit(f"if {result} is None or {result} is False:")
+        else:
+            self.emit(f"if {result} is not None and {result} is not False:")
+
+        self.depth += 1
+        right: str = self.expression(expr.right)
+        self.emit(f"{result} = {right}")
+        self.depth -= 1
+        return result
@@ -0,0 +1,496 @@
+from __future__ import annotations
+from Chunk import FunctionProto, OpCode
+from LoxCallable import LoxCallable, LoxList, LoxMap, LoxNative, Clock, NativeClass
+from Output import Sink, StreamSink
+from Equality import isEqual
+from RuntimeError import NativeError, RuntimeError
+from Rope import ROPE_MIN, STRINGS, concat
+from Token import Token
+from typing import Any
+
+'''
+A stack machine for the bytecode produced by Compiler. The whole program runs
+inside the single loop in `VM.run`: Lox calls push a CallFrame and switch the
+cached code/ip/base locals rather than recursing in Python, and every value a
+frame needs lives on the shared value stack.
+'''
+
+# Default limits on nested calls and on the value stack. Both stacks are
+# Python lists, so these bound memory rather than protect the C stack.
+FRAMES_MAX: int = 65536
+STACK_MAX: int = FRAMES_MAX * 256
+
+CONSTANT = int(OpCode.CONSTANT)
+NIL = int(OpCode.NIL)
+TRUE = int(OpCode.TRUE)
+FALSE = int(OpCode.FALSE)
+POP = int(OpCode.POP)
+GET_LOCAL = int(OpCode.GET_LOCAL)
+SET_LOCAL = int(OpCode.SET_LOCAL)
+GET_GLOBAL = int(OpCode.GET_GLOBAL)
+DEFINE_GLOBAL = int(OpCode.DEFINE_GLOBAL)
+SET_GLOBAL = int(OpCode.SET_GLOBAL)
+GET_UPVALUE = int(OpCode.GET_UPVALUE)
+SET_UPVALUE = int(OpCode.SET_UPVALUE)
+GET_PROPERTY = int(OpCode.GET_PROPERTY)
+SET_PROPERTY = int(OpCode.SET_PROPERTY)
+GET_SUPER = int(OpCode.GET_SUPER)
+EQUAL = int(OpCode.EQUAL)
+NOT_EQUAL = int(OpCode.NOT_EQUAL)
+GREATER = int(OpCode.GREATER)
+GREATER_EQUAL = int(OpCode.GREATER_EQUAL)
+LESS = int(OpCode.LESS)
+LESS_EQUAL = int(OpCode.LESS_EQUAL)
+ADD = int(OpCode.ADD)
+SUBTRACT = int(OpCode.SUBTRACT)
+MULTIPLY = int(OpCode.MULTIPLY)
+DIVIDE = int(OpCode.DIVIDE)
+NOT = int(OpCode.NOT)
+NEGATE = int(OpCode.NEGATE)
+PRINT = int(OpCode.PRINT)
+JUMP = int(OpCode.JUMP)
+JUMP_IF_FALSE = int(OpCode.JUMP_IF_FALSE)
+LOOP = int(OpCode.LOOP)
+CALL = int(OpCode.CALL)
+INVOKE = int(OpCode.INVOKE)
+SUPER_INVOKE = int(OpCode.SUPER_INVOKE)
+CLOSURE = int(OpCode.CLOSURE)
+CLOSE_UPVALUE = int(OpCode.CLOSE_UPVALUE)
+RETURN = int(OpCode.RETURN)
+CLASS = int(OpCode.CLASS)
+INHERIT = int(OpCode.INHERIT)
+METHOD = int(OpCode.METHOD)
+
+class VMError(Exception):
+    '''
+    Raised inside the dispatch loop. `VM.run` attaches the token of the
+    instruction that failed and re-raises it as a Lox RuntimeError.
+    '''
+
+class Upvalue:
+    __slots__ = ('location', 'value', 'isOpen')
+
+    def __init__(self, location: int) -> None:
+        self.location: int = location
+        self.value: Any = None
+        self.isOpen: bool = True
+
+class Closure:
+    __slots__ = ('function', 'upvalues')
+
+    def __init__(self, function: FunctionProto, upvalues: list[Upvalue]) -> None:
+        self.function: FunctionProto = function
+        self.upvalues: list[Upvalue] = upvalues
+
+    def __str__(self) -> str:
+        return str(self.function)
+
+class VMClass:
+    def __init__(self, name: str) -> None:
+        self.name: str = name
+        self.methods: dict[str, Closure] = dict()
+
+    def __str__(self) -> str:
+        return f"<class {self.name}>"
+
+class VMInstance:
+    __slots__ = ('klass', 'fields')
+
+    def __init__(self, klass: VMClass) -> None:
+        self.klass: VMClass = klass
+        self.fields: dict[str, Any] = dict()
+
+    def __str__(self) -> str:
+        return f"<class instance {self.klass.name}>"
+
+class BoundMethod:
+    __slots__ = ('receiver', 'method')
+
+    def __init__(self, receiver: Any, method: Closure) -> None:
+        self.receiver: Any = receiver
+        self.method: Closure = method
+
+    def __str__(self) -> str:
+        return str(self.method)
+
+class CallFrame:
+    __slots__ = ('closure', 'ip', 'base')
+
+    def __init__(self, closure: Closure, ip: int, base: int) -> None:
+        self.closure: Closure = closure
+        self.ip: int = ip
+        self.base: int = base
+
+class VM:
+    def __init__(self, maxFrames: int = FRAMES_MAX, maxStack: int = STACK_MAX) -> None:
+        self.maxFrames: int = maxFrames
+        self.maxStack: int = maxStack
+        self.globals: dict[str, Any] = dict()
+        self.stack: list[Any] = []
+        self.frames: list[CallFrame] = []
+        self.openUpvalues: dict[int, Upvalue] = dict()
+        self.output: Sink = StreamSink()
+
+        self.globals["clock"] = Clock()
+        self.globals["List"] = NativeClass("List", LoxList)
+        self.globals["Map"] = NativeClass("Map", LoxMap)
+        from NumArray import makeNumArray
+        self.globals["NumArray"] = NativeClass("NumArray", makeNumArray, 1)
+
+    def interpret(self, function: FunctionProto) -> None:
+        closure: Closure = Closure(function, [])
+        self.stack = [closure]
+        self.frames = [CallFrame(closure, 0, 0)]
+        self.openUpvalues = dict()
+
+        try:
+            self.run()
+        except RuntimeError as error:
+            self.output.flush()
+            import Lox
+            Lox.runtime_error(error)
+        finally:
+            self.output.flush()
+
+    def stringify(self, object: Any) -> str:
+        if object is None:
+            return 'nil'
+        elif type(object) is bool:
+            return 'true' if object else 'false'
+        elif type(object) is float:
+            text: str = str(object)
+            if len(text) >= 2 and text[-2:] == ".0":
+                text = text[:-2]
+            return text
+        elif isinstance(object, LoxNative):
+            return object.show(self.stringify)
+        return str(object)
+
+    def captureUpvalue(self, location: int) -> Upvalue:
+        upvalue: Upvalue | None = self.openUpvalues.get(location)
+        if upvalue is None:
+            upvalue = Upvalue(location)
+            self.openUpvalues[location] = upvalue
+        return upvalue
+
+    def closeUpvalues(self, last: int) -> None:
+        for location in [l for l in self.openUpvalues if l >= last]:
+            upvalue: Upvalue = self.openUpvalues.pop(location)
+            upvalue.value = self.stack[location]
+            upvalue.isOpen = False
+
+    def callNative(self, callee: Any, argc: int) -> None:
+        stack: list[Any] = self.stack
+        if not isinstance(callee, LoxCallable):
+            raise VMError("Can only call functions and classes.")
+        if argc != callee.arity():
+            raise VMError(f"Expected {callee.arity()} arguments but got {argc}.")
+
+        arguments: list[Any] = stack[len(stack) - argc:]
+        del stack[len(stack) - argc - 1:]
+        try:
+            stack.append(callee.call(self, arguments))
+        except NativeError as error:
+            raise VMError(str(error))
+
+    def invokeNative(self, receiver: LoxNative, name: str, argc: int, token: Token) -> None:
+        '''
+        Calls a method of a built-in value without binding it first. Its
+        errors are reported at `token`, the call's closing parenthesis.
+        '''
+        method: tuple[int, Any] | None = receiver.methods.get(name)
+        if method is None:
+            raise VMError(f"Undefined property '{name}'.")
+        count, function = method
+        if argc != count:
+            raise VMError(f"Expected {count} arguments but got {argc}.")
+
+        stack: list[Any] = self.stack
+        arguments: list[Any] = stack[len(stack) - argc:]
+        del stack[len(stack) - argc - 1:]
+        stack.append(function(receiver, token, *arguments))
+
+    def run(self) -> None:
+        stack: list[Any] = self.stack
+        frames: list[CallFrame] = self.frames
+        globals: dict[str, Any] = self.globals
+        maxFrames: int = self.maxFrames
+        maxStack: int = self.maxStack
+
+        frame: CallFrame = frames[-1]
+        closure: Closure = frame.closure
+        code: list[int] = closure.function.chunk.code
+        constants: list[Any] = closure.function.chunk.constants
+        upvalues: list[Upvalue] = closure.upvalues
+        ip: int = frame.ip
+        base: int = frame.base
+
+        try:
+            while True:
+                op: int = code[ip]
+                ip += 1
+
+                if op == GET_LOCAL:
+                    stack.append(stack[base + code[ip]])
+                    ip += 1
+                elif op == CONSTANT:
+                    stack.append(constants[code[ip]])
+                    ip += 1
+                elif op == SET_LOCAL:
+                    stack[base + code[ip]] = stack[-1]
+                    ip += 1
+                elif op == POP:
+                    stack.pop()
+                elif op == JUMP_IF_FALSE:
+                    value: Any = stack[-1]
+                    if value is None or value is False:
+                        ip = code[ip]
+                    else:
+                        ip += 1
+                elif op == JUMP:
+                    ip = code[ip]
+                elif op == LOOP:
+                    ip = code[ip]
+                elif op == LESS:
+                    b: Any = stack.pop()
+                    a: Any = stack[-1]
+                    if type(a) is not float or type(b) is not float:
+                        raise VMError("Operands must be numbers.")
+                    stack[-1] = a < b
+                elif op == ADD:
+                    b = stack.pop()
+                    a = stack[-1]
+                    if type(a) is float and type(b) is float:
+                        stack[-1] = a + b
+                    elif type(a) is str and type(b) is str and len(a) + len(b) < ROPE_MIN:
+                        stack[-1] = a + b
+                    elif type(a) in STRINGS and type(b) in STRINGS:
+                        stack[-1] = concat(a, b)
+                    else:
+                        raise VMError("Operands must both be numbers or strings")
+                elif op == SUBTRACT:
+                    b = stack.pop()
+                    a = stack[-1]
+                    if type(a) is not float or type(b) is not float:
+                        raise VMError("Operands must be numbers.")
+                    stack[-1] = a - b
+                elif op == GET_GLOBAL:
+                    name: str = constants[code[ip]]
+                    ip += 1
+                    if name not in globals:
+                        raise VMError(f"Undefined variable '{name}'.")
+                    stack.append(globals[name])
+                elif op == SET_GLOBAL:
+                    name = constants[code[ip]]
+                    ip += 1
+                    if name not in globals:
+                        raise VMError(f"Undefined variable '{name}'.")
+                    globals[name] = stack[-1]
+                elif op == DEFINE_GLOBAL:
+                    globals[constants[code[ip]]] = stack.pop()
+                    ip += 1
+                elif op == GET_UPVALUE:
+                    upvalue: Upvalue = upvalues[code[ip]]
+                    ip += 1
+                    stack.append(stack[upvalue.location] if upvalue.isOpen else upvalue.value)
+                elif op == SET_UPVALUE:
+                    upvalue = upvalues[code[ip]]
+                    ip += 1
+                    if upvalue.isOpen:
+                        stack[upvalue.location] = stack[-1]
+                    else:
+                        upvalue.value = stack[-1]
+                elif op == CALL or op == INVOKE or op == SUPER_INVOKE:
+                    if op == CALL:
+                        argc: int = code[ip]
+                        ip += 1
+                        callee: Any = stack[-argc - 1]
+                    elif op == INVOKE:
+                        name = constants[code[ip]]
+                        argc = code[ip + 1]
+                        ip += 2
+                        receiver: Any = stack[-argc - 1]
+                        if type(receiver) is not VMInstance:
+                            if not isinstance(receiver, LoxNative):
+                                raise VMError("Only instances have properties.")
+                            self.invokeNative(receiver, name, argc,
+                                              closure.function.chunk.tokens[ip - 1])
+                            continue
+                        if name in receiver.fields:
+                            callee = receiver.fields[name]
+                            stack[-argc - 1] = callee
+                        elif name in receiver.klass.methods:
+                            callee = receiver.klass.methods[name]
+                        else:
+                            raise VMError(f"Undefined property '{name}'.")
+                    else:
+                        name = constants[code[ip]]
+                        argc = code[ip + 1]
+                        ip += 2
+                        superclass: VMClass = stack.pop()
+                        if name not in superclass.methods:
+                            raise VMError(f"Undefined property '{name}'.")
+                        callee = superclass.methods[name]
+
+                    if type(callee) is BoundMethod:
+                        stack[-argc - 1] = callee.receiver
+                        callee = callee.method
+                    elif type(callee) is VMClass:
+                        stack[-argc - 1] = VMInstance(callee)
+                        if "init" not in callee.methods:
+                            if argc != 0:
+                                raise VMError(f"Expected 0 arguments but got {argc}.")
+                            continue
+                        callee = callee.methods["init"]
+                    elif type(callee) is not Closure:
+                        self.callNative(callee, argc)
+                        continue
+
+                    if argc != callee.function.arity:
+                        raise VMError(
+                            f"Expected {callee.function.arity} arguments but got {argc}.")
+                    if len(frames) >= maxFrames or len(stack) >= maxStack:
+                        raise VMError("Stack overflow.")
+
+                    frame.ip = ip
+                    frame = CallFrame(callee, 0, len(stack) - argc - 1)
+                    frames.append(frame)
+                    closure = callee
+                    code = closure.function.chunk.code
+                    constants = closure.function.chunk.constants
+                    upvalues = closure.upvalues
+                    ip = 0
+                    base = frame.base
+                elif op == RETURN:
+                    result: Any = stack.pop()
+                    if self.openUpvalues:
+                        self.closeUpvalues(base)
+                    frames.pop()
+                    del stack[base:]
+
+                    if len(frames) == 0:
+                        return
+
+                    stack.append(result)
+                    frame = frames[-1]
+                    closure = frame.closure
+                    code = closure.function.chunk.code
+                    constants = closure.function.chunk.constants
+                    upvalues = closure.upvalues
+                    ip = frame.ip
+                    base = frame.base
+                elif op == NIL:
+                    stack.append(None)
+                elif op == TRUE:
+                    stack.append(True)
+                elif op == FALSE:
+                    stack.append(False)
+                elif op == EQUAL:
+                    b = stack.pop()
+                    stack[-1] = isEqual(stack[-1], b)
+                elif op == NOT_EQUAL:
+                    b = stack.pop()
+                    stack[-1] = not isEqual(stack[-1], b)
+                elif op == GREATER:
+                    b = stack.pop()
+                    a = stack[-1]
+                    if type(a) is not float or type(b) is not float:
+                        raise VMError("Operands must be numbers.")
+                    stack[-1] = a > b
+                elif op == GREATER_EQUAL:
+                    b = stack.pop()
+                    a = stack[-1]
+                    if type(a) is not float or type(b) is not float:
+                        raise VMError("Operands must be numbers.")
+                    stack[-1] = a >= b
+                elif op == LESS_EQUAL:
+                    b = stack.pop()
+                    a = stack[-1]
+                    if type(a) is not float or type(b) is not float:
+                        raise VMError("Operands must be numbers.")
+                    stack[-1] = a <= b
+                elif op == MULTIPLY:
+                    b = stack.pop()
+                    a = stack[-1]
+                    if type(a) is not float or type(b) is not float:
+                        raise VMError("Operands must be numbers.")
+                    stack[-1] = a * b
+                elif op == DIVIDE:
+                    b = stack.pop()
+                    a = stack[-1]
+                    if type(a) is not float or type(b) is not float:
+                        raise VMError("Operands must be numbers.")
+                    stack[-1] = a / b
+                elif op == NOT:
+                    value = stack[-1]
+                    stack[-1] = value is None or value is False
+                elif op == NEGATE:
+                    if type(stack[-1]) is not float:
+                        raise VMError("Operand must be a number.")
+                    stack[-1] = -stack[-1]
+                elif op == PRINT:
+                    self.output.write(self.stringify(stack.pop()) + "\n")
+                elif op == GET_PROPERTY:
+                    name = constants[code[ip]]
+                    ip += 1
+                    instance: Any = stack[-1]
+                    if type(instance) is not VMInstance:
+                        if not isinstance(instance, LoxNative):
+                            raise VMError("Only instances have properties.")
+                        stack[-1] = instance.getField(closure.function.chunk.tokens[ip - 1])
+                    elif name in instance.fields:
+                        stack[-1] = instance.fields[name]
+                    elif name in instance.klass.methods:
+                        stack[-1] = BoundMethod(instance, instance.klass.methods[name])
+                    else:
+                        raise VMError(f"Undefined property '{name}'.")
+                elif op == SET_PROPERTY:
+                    name = constants[code[ip]]
+                    ip += 1
+                    value = stack.pop()
+                    instance = stack[-1]
+                    if type(instance) is not VMInstance:
+                        raise VMError("Only instances have fields.")
+                    instance.fields[name] = value
+                    stack[-1] = value
+                elif op == GET_SUPER:
+                    name = constants[code[ip]]
+                    ip += 1
+                    superclass = stack.pop()
+                    if name not in superclass.methods:
+                        raise VMError(f"Undefined property '{name}'.")
+                    stack[-1] = BoundMethod(stack[-1], superclass.methods[name])
+                elif op == CLOSURE:
+                    function: FunctionProto = constants[code[ip]]
+                    ip += 1
+                    captured: list[Upvalue] = []
+                    for _ in range(function.upvalueCount):
+                        if code[ip] == 1:
+                            captured.append(self.captureUpvalue(base + code[ip + 1]))
+                        else:
+                            captured.append(upvalues[code[ip + 1]])
+                        ip += 2
+                    stack.append(Closure(function, captured))
+                elif op == CLOSE_UPVALUE:
+                    self.closeUpvalues(len(stack) - 1)
+                    stack.pop()
+                elif op == CLASS:
+                    stack.append(VMClass(constants[code[ip]]))
+                    ip += 1
+                elif op == INHERIT:
+                    superclass = stack[-2]
+                    if type(superclass) is not VMClass:
+                        raise VMError("Superclass must be a class.")
+                    stack[-1].methods.update(superclass.methods)
+                    stack.pop()
+                elif op == METHOD:
+                    method: Closure = stack.pop()
+                    stack[-1].methods[constants[code[ip]]] = method
+                    ip += 1
+                else:
+                    raise Exception(f"Attempted to execute unknown opcode {op}.")
+        except VMError as error:
+            token: Token | None = closure.function.chunk.tokens[ip - 1]
+            assert token is not None
+            frame.ip = ip
+            raise RuntimeError(token, str(error))
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+'''
+Measures what execution hooks cost the tree walker. Each workload runs on a
+fresh interpreter that never had a hook, on one whose hook was added and
+removed again, and on ones with a hook that does nothing and with a
+NodeCounter installed. The first two should take the same time.
+
+    python benchmarks/hook_overhead.py [--repeat N]
+'''
+
+import contextlib
+import io
+import os
+import sys
+import time
+from argparse import ArgumentParser
+from typing import Any, Callable
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.setrecursionlimit(10000)
+
+import Lox
+from Hooks import Hook, NodeCounter
+from Interpreter import Interpreter
+from Scanner import Scanner
+
+WORKLOADS: dict[str, str] = {
+    "calls": """
+        fun fib(n) { if (n < 2) return n; return fib(n - 1) + fib(n - 2); }
+        print fib(20);
+    """,
+    "loop": """
+        var total = 0;
+        for (var i = 0; i < 50000; i = i + 1) { total = total + i * 2; }
+        print total;
+    """,
+    "methods": """
+        class Point {
+            init(x, y) { this.x = x; this.y = y; }
+            add(other) { return Point(this.x + other.x, this.y + other.y); }
+        }
+        var p = Point(0, 0);
+        for (var i = 0; i < 10000; i = i + 1) { p = p.add(Point(1, 2)); }
+        print p.x + p.y;
+    """,
+}
+
+class Nothing(Hook):
+    def statement(self, interpreter: Interpreter, stmt: Any) -> None:
+        ...
+
+    def expression(self, interpreter: Interpreter, expr: Any) -> None:
+        ...
+
+def fresh() -> Interpreter:
+    return Interpreter()
+
+def removed() -> Interpreter:
+    interpreter: Interpreter = Interpreter()
+    hook: Hook = Nothing()
+    interpreter.addHook(hook)
+    interpreter.removeHook(hook)
+    return interpreter
+
+def nothing() -> Interpreter:
+    interpreter: Interpreter = Interpreter()
+    interpreter.addHook(Nothing())
+    return interpreter
+
+def counting() -> Interpreter:
+    interpreter: Interpreter = Interpreter()
+    interpreter.addHook(NodeCounter())
+    return interpreter
+
+SETUPS: dict[str, Callable[[], Interpreter]] = {
+    "no hooks": fresh,
+    "hook removed": removed,
+    "no-op hook": nothing,
+    "NodeCounter": counting,
+}
+
+def measure(source: str, setup: Callable[[], Interpreter]) -> float:
+    # Execution specializes and caches into the tree, so every run parses
+    # the program again.
+    interpreter: Interpreter = setup()
+    stmts: Any = Lox.frontEnd(Scanner(source).scanTokens())
+    with contextlib.redirect_stdout(io.StringIO()):
+        started: float = time.process_time()
+        interpreter.interpret(stmts)
+        return time.process_time() - started
+
+def main() -> None:
+    parser: ArgumentParser = ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="runs of each workload per setup; the fastest counts (default: 5)")
+    options = parser.parse_args()
+
+    print(f"{'workload':<10}" + "".join(f"{name:>16}" for name in SETUPS))
+    for workload, source in WORKLOADS.items():
+        best: dict[str, float] = {name: float("inf") for name in SETUPS}
+        # Interleave the setups so drift in the machine's speed hits them alike.
+        for _ in range(options.repeat):
+            for name, setup in SETUPS.items():
+                best[name] = min(best[name], measure(source, setup))
+
+        baseline: float = best["no hooks"]
+        cells: list[str] = [f"{best[name]:>8.3f}s {best[name] / baseline:>5.2f}x" for name in SETUPS]
+        print(f"{workload:<10}" + "".join(f"{cell:>16}" for cell in cells))
+
+if __name__ == "__main__":
+    main()
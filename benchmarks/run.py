@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+'''
+Runs the Lox programs in this directory and times each phase of running
+them separately: scanning, parsing, resolving, optimizing and executing.
+Every benchmark runs `--repeat` times and the fastest time of each phase
+counts. Results are printed as a table and can be written as JSON.
+
+With `--baseline`, each benchmark's total is compared against a JSON file
+written earlier by `--output`, and any that got slower by more than
+`--threshold` percent is flagged, making the exit status 1.
+
+    python benchmarks/run.py --output baseline.json
+    ... change the interpreter ...
+    python benchmarks/run.py --baseline baseline.json
+'''
+
+import contextlib
+import glob
+import io
+import json
+import os
+import platform
+import sys
+import time
+from argparse import ArgumentParser, Namespace
+from typing import Any
+
+HERE: str = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.setrecursionlimit(10000)
+
+import Lox
+from Interpreter import Interpreter
+from Optimizer import Optimizer
+from Parser import Parser
+from Resolver import Resolver
+from Scanner import Scanner
+
+PHASES: list[str] = ["scan", "parse", "resolve", "optimize", "execute"]
+
+class BenchmarkError(Exception):
+    ...
+
+def newInterpreter(engine: str) -> Interpreter:
+    if engine == "closure":
+        from ClosureCompiler import ClosureInterpreter
+        return ClosureInterpreter()
+    return Interpreter()
+
+def runOnce(source: str, engine: str) -> dict[str, float]:
+    times: dict[str, float] = {}
+    interpreter: Interpreter = newInterpreter(engine)
+    Lox.interpreter = interpreter
+
+    started: float = time.perf_counter()
+    tokens: list[Any] = list(Scanner(source).scanTokens())
+    times["scan"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    stmts: list[Any] = Parser(tokens).parse()
+    times["parse"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    Resolver(interpreter).resolve(stmts)
+    times["resolve"] = time.perf_counter() - started
+    if Lox.hadError:
+        raise BenchmarkError("the program has a compile error")
+
+    started = time.perf_counter()
+    stmts = Optimizer().optimize(stmts)
+    times["optimize"] = time.perf_counter() - started
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        started = time.perf_counter()
+        if engine == "vm":
+            from Compiler import Compiler
+            from VM import VM
+            VM().interpret(Compiler().compile(stmts))
+        else:
+            interpreter.interpret(stmts)
+        times["execute"] = time.perf_counter() - started
+    if Lox.hadRuntimeError:
+        raise BenchmarkError("the program stopped with a runtime error")
+
+    return times
+
+def runBenchmark(path: str, engine: str, repeat: int) -> dict[str, float]:
+    with open(path) as f:
+        source: str = f.read()
+
+    best: dict[str, float] = {phase: float("inf") for phase in PHASES}
+    for _ in range(repeat):
+        for phase, seconds in runOnce(source, engine).items():
+            best[phase] = min(best[phase], seconds)
+    best["total"] = sum(best[phase] for phase in PHASES)
+    return best
+
+def compare(results: dict[str, dict[str, float]], baseline: dict[str, Any],
+            threshold: float) -> list[str]:
+    '''Prints each benchmark's change from the baseline; returns the regressions.'''
+    regressions: list[str] = []
+    before: dict[str, dict[str, float]] = baseline["benchmarks"]
+    print()
+    print(f"{'benchmark':<18} {'baseline':>10} {'now':>10} {'change':>8}")
+    for name, times in results.items():
+        if name not in before:
+            print(f"{name:<18} {'-':>10} {times['total']:>10.4f} {'new':>8}")
+            continue
+
+        old: float = before[name]["total"]
+        change: float = 100 * (times["total"] - old) / old
+        flag: str = ""
+        if change > threshold:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        print(f"{name:<18} {old:>10.4f} {times['total']:>10.4f} {change:>+7.1f}%{flag}")
+    return regressions
+
+def parseArgs(argv: list[str]) -> Namespace:
+    parser: ArgumentParser = ArgumentParser(description="Time the Lox benchmark programs.")
+    parser.add_argument("names", nargs="*",
+                        help="benchmarks to run, by file name without .lox (default: all)")
+    parser.add_argument("--engine", choices=["tree", "closure", "vm"], default="tree",
+                        help="execution engine (default: tree)")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="runs per benchmark; the fastest time of each phase counts (default: 3)")
+    parser.add_argument("--output", metavar="FILE", help="write the results as JSON to FILE")
+    parser.add_argument("--baseline", metavar="FILE",
+                        help="compare against results written earlier with --output")
+    parser.add_argument("--threshold", type=float, default=10.0, metavar="PERCENT",
+                        help="slowdown of a benchmark's total flagged as a regression (default: 10)")
+    return parser.parse_args(argv)
+
+def main(argv: list[str]) -> int:
+    options: Namespace = parseArgs(argv)
+
+    paths: list[str] = sorted(glob.glob(os.path.join(HERE, "*.lox")))
+    names: dict[str, str] = {os.path.splitext(os.path.basename(p))[0]: p for p in paths}
+    for name in options.names:
+        if name not in names:
+            print(f"unknown benchmark '{name}'; have {', '.join(names)}", file=sys.stderr)
+            return 2
+    selected: list[str] = options.names or list(names)
+
+    print(f"{'benchmark':<18}" + "".join(f"{phase:>10}" for phase in PHASES) + f"{'total':>10}")
+    results: dict[str, dict[str, float]] = {}
+    for name in selected:
+        times: dict[str, float] = runBenchmark(names[name], options.engine, options.repeat)
+        results[name] = times
+        print(f"{name:<18}" + "".join(f"{times[phase]:>10.4f}" for phase in [*PHASES, "total"]))
+
+    if options.output is not None:
+        with open(options.output, "w") as f:
+            json.dump({
+                "engine": options.engine,
+                "repeat": options.repeat,
+                "python": platform.python_version(),
+                "benchmarks": results,
+            }, f, indent=2)
+            f.write("\n")
+
+    if options.baseline is not None:
+        with open(options.baseline) as f:
+            baseline: dict[str, Any] = json.load(f)
+        if baseline.get("engine") != options.engine:
+            print(f"note: the baseline was run on the {baseline.get('engine')} engine",
+                  file=sys.stderr)
+        regressions: list[str] = compare(results, baseline, options.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) beyond {options.threshold:g}%: "
+                  f"{', '.join(regressions)}")
+            return 1
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,73 @@
+'''
+Runs a script twice through `Lox.py` with the program cache on and checks
+what the cache reports. Each test gets its own user cache directory, so its
+signing secret is fresh.
+'''
+
+import ast
+import glob
+import os
+import pickle
+import subprocess
+import sys
+
+from test_engines import ROOT
+
+SOURCE: str = 'fun greet(name) { return "hi " + name; } print greet("there");'
+
+def run(tmp_path, source: str | None = None) -> tuple[str, dict[str, int]]:
+    script = tmp_path / "script.lox"
+    if source is not None:
+        script.write_text(source)
+    result = subprocess.run([sys.executable, os.path.join(ROOT, "Lox.py"), "--cache-stats", str(script)],
+                            capture_output=True, text=True, cwd=ROOT,
+                            env={**os.environ, "XDG_CACHE_HOME": str(tmp_path / "home")})
+    assert result.returncode == 0, result.stderr
+    report = result.stderr.strip().splitlines()[-1]
+    assert report.startswith("cache: ")
+    return result.stdout, ast.literal_eval(report.removeprefix("cache: "))
+
+def entries(tmp_path) -> list[str]:
+    return glob.glob(str(tmp_path / "__loxcache__" / "script.lox.*.pickle"))
+
+def test_miss_then_hit(tmp_path):
+    assert run(tmp_path, SOURCE) == ("hi there\n", {"hits": 0, "misses": 1, "writes": 1, "errors": 0})
+    assert run(tmp_path) == ("hi there\n", {"hits": 1, "misses": 0, "writes": 0, "errors": 0})
+    assert len(entries(tmp_path)) == 1
+
+def test_edit_invalidates(tmp_path):
+    run(tmp_path, SOURCE)
+    [old] = entries(tmp_path)
+    edited = SOURCE.replace("hi ", "hello ")
+    assert run(tmp_path, edited) == ("hello there\n", {"hits": 0, "misses": 1, "writes": 1, "errors": 0})
+    [new] = entries(tmp_path)
+    assert new != old
+
+def test_corrupt_entry_is_reparsed(tmp_path):
+    run(tmp_path, SOURCE)
+    [entry] = entries(tmp_path)
+    with open(entry, "r+b") as f:
+        f.seek(-8, os.SEEK_END)
+        f.write(b"\0" * 8)
+    assert run(tmp_path) == ("hi there\n", {"hits": 0, "misses": 1, "writes": 1, "errors": 1})
+    assert run(tmp_path)[1]["hits"] == 1
+
+class Planted:
+    def __reduce__(self):
+        return (open, (os.path.join(os.path.dirname(self.path), "pwned"), "w"))
+
+def test_unsigned_entry_is_not_loaded(tmp_path):
+    run(tmp_path, SOURCE)
+    [entry] = entries(tmp_path)
+    planted = Planted()
+    planted.path = entry
+    with open(entry, "wb") as f:
+        f.write(pickle.dumps(planted))
+    assert run(tmp_path) == ("hi there\n", {"hits": 0, "misses": 1, "writes": 1, "errors": 1})
+    assert not os.path.exists(os.path.join(os.path.dirname(entry), "pwned"))
+
+def test_shared_secret_is_refused(tmp_path):
+    run(tmp_path, SOURCE)
+    secret = tmp_path / "home" / "pylox" / "secret"
+    secret.chmod(0o644)
+    assert run(tmp_path) == ("hi there\n", {"hits": 0, "misses": 1, "writes": 0, "errors": 1})
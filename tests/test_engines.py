@@ -0,0 +1,180 @@
+'''
+Runs Lox programs through `Lox.py` on each engine and checks what they print.
+Programs run in a fresh process, since the driver keeps its state in module
+globals, and without the program cache.
+'''
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT: str = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ENGINES: dict[str, list[str]] = {
+    "tree": [],
+    "closure": ["--engine=closure"],
+    "vm": ["--engine=vm"],
+    "tier": ["--tier", "--tier-threshold", "1"],
+    "closure-tier": ["--engine=closure", "--tier", "--tier-threshold", "1"],
+}
+
+def run(tmp_path, source: str | bytes, *flags: str) -> subprocess.CompletedProcess:
+    script = tmp_path / "script.lox"
+    if isinstance(source, str):
+        source = source.encode()
+    script.write_bytes(source)
+    return subprocess.run([sys.executable, os.path.join(ROOT, "Lox.py"), "--no-cache",
+                           *flags, str(script)],
+                          capture_output=True, text=True, cwd=ROOT)
+
+def output(tmp_path, source: str | bytes, *flags: str) -> str:
+    return run(tmp_path, source, *flags).stdout
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_signed_zero_constants(tmp_path, engine):
+    assert output(tmp_path, "print 0; print -0; print 0 == -0;",
+                  *ENGINES[engine]) == "0\n-0\ntrue\n"
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_booleans_never_equal_numbers(tmp_path, engine):
+    source = '''
+    fun eq(a, b) { return a == b; }
+    fun ne(a, b) { return a != b; }
+    var one = 1; var zero = 0; var t = true; var f = false;
+    print 1 == true; print 0 == false; print 1 != true;
+    print eq(one, t); print eq(zero, f); print ne(one, t);
+    print eq(t, t); print eq(nil, f); print eq(1, 1);
+    '''
+    assert output(tmp_path, source, *ENGINES[engine]).split() == [
+        "false", "false", "true",
+        "false", "false", "true",
+        "true", "false", "true",
+    ]
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_long_strings_equal_short_ones(tmp_path, engine):
+    source = '''
+    var a = ""; var b = "";
+    for (var i = 0; i < 100; i = i + 1) { a = a + "xy"; b = b + "x" + "y"; }
+    print a == b; print a != b; print a == true;
+    '''
+    assert output(tmp_path, source, *ENGINES[engine]).split() == ["true", "false", "false"]
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_long_strings_as_values(tmp_path, engine):
+    source = '''
+    var s = ""; for (var i = 0; i < 100; i = i + 1) s = s + "ab";
+    var flat = ""; for (var i = 0; i < 200; i = i + 1) flat = flat + "ab";
+    var m = Map(); m.set(s + s, "found"); var l = List(); l.append(s + "!");
+    print m.get(flat); print m.has(s); print l.get(0) == s + "!"; print s + "!" == s;
+    print s + "!";
+    '''
+    assert output(tmp_path, source, *ENGINES[engine]).splitlines() == [
+        "found", "false", "true", "false", "ab" * 100 + "!"]
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_non_finite_literals(tmp_path, engine):
+    huge = "9" * 400
+    source = f'''
+    fun big() {{ return {huge}; }}
+    fun overflow() {{ return {huge} * {huge} - {huge} * {huge}; }}
+    print big(); print big() == big(); print overflow() == overflow();
+    '''
+    result = run(tmp_path, source, *ENGINES[engine])
+    assert result.stdout.split() == ["inf", "true", "false"]
+    assert result.returncode == 0
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_default_recursion_depth(tmp_path, engine):
+    source = '''
+    fun rec(n) { if (n == 0) return 0; return rec(n - 1) + 1; }
+    class C { rec(n) { if (n == 0) return 0; return this.rec(n - 1) + 1; } }
+    print rec(110); print C().rec(110);
+    '''
+    assert output(tmp_path, source, *ENGINES[engine]) == "110\n110\n"
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_max_frames_is_exact(tmp_path, engine):
+    source = '''
+    fun rec(n) { if (n == 0) return 0; return rec(n - 1) + 1; }
+    print rec(198);
+    print rec(199);
+    '''
+    result = run(tmp_path, source, *ENGINES[engine], "--max-frames", "200")
+    assert result.stdout == "198\nStack overflow.\n[line: 2]\n"
+    assert result.returncode == 70
+
+def test_max_frames_worker_errors_reach_the_process(tmp_path):
+    # An error the engines don't report as a Lox error must still fail the
+    # run when it happens on the deep-stack thread.
+    script = tmp_path / "script.lox"
+    script.write_text("print 1;")
+    code = ("import Lox\n"
+            "def broken(path): raise ValueError('worker failed')\n"
+            "Lox.runFile = broken\n"
+            f"Lox.runDeep({str(script)!r}, 5000)\n")
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, cwd=ROOT)
+    assert result.returncode == 1
+    assert "ValueError: worker failed" in result.stderr
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_list_methods(tmp_path, engine):
+    source = '''
+    var l = List(); l.append(1); l.append("two"); l.append(nil);
+    print l.get(1); print l.set(0, 5); print l.get(0);
+    print l.pop(); print l.length(); print l;
+    var get = l.get; print get(1);
+    '''
+    assert output(tmp_path, source, *ENGINES[engine]) == "two\n5\n5\nnil\n2\n[5, two]\ntwo\n"
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize("call, message", [
+    ("l.get(2)", "Index out of range."),
+    ("l.get(-1)", "Index out of range."),
+    ("l.set(0.5, 1)", "Index must be a whole number."),
+    ('l.get("0")', "Index must be a whole number."),
+    ("List().pop()", "Can't pop from an empty list."),
+    ("l.missing()", "Undefined property 'missing'."),
+    ("l.get()", "Expected 1 arguments but got 0."),
+])
+def test_list_errors(tmp_path, engine, call, message):
+    result = run(tmp_path, f"var l = List(); l.append(1); l.append(2);\nprint {call};",
+                 *ENGINES[engine])
+    assert result.stdout == f"{message}\n[line: 2]\n"
+    assert result.returncode == 70
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_map_keys(tmp_path, engine):
+    source = '''
+    var m = Map();
+    m.set(1, "one"); m.set(true, "true"); m.set(0, "zero"); m.set(false, "false");
+    m.set("a" + "b", "ab"); m.set(nil, "nil");
+    print m.get(1); print m.get(true); print m.get(0); print m.get(false);
+    print m.get("ab"); print m.get(nil); print m.get(2); print m.has(2);
+    print m.remove(1); print m.has(1); print m.length();
+    print m.keys(); print m.values();
+    '''
+    assert output(tmp_path, source, *ENGINES[engine]).splitlines() == [
+        "one", "true", "zero", "false", "ab", "nil", "nil", "false",
+        "one", "false", "5",
+        "[true, 0, false, ab, nil]", "[true, zero, false, ab, nil]",
+    ]
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_containers_holding_themselves(tmp_path, engine):
+    source = '''
+    var l = List(); l.append(1); l.append(l);
+    var m = Map(); m.set("self", m); m.set("list", l);
+    l.append(m);
+    print l; print m;
+    '''
+    assert output(tmp_path, source, *ENGINES[engine]) == (
+        "[1, ..., {self: ..., list: ...}]\n{self: ..., list: [1, ..., ...]}\n")
+
+@pytest.mark.parametrize("scanner", [[], ["--stream"], ["--legacy-scanner"]])
+def test_crlf_sources(tmp_path, scanner):
+    source = b'print "a\r\nb";\r\nprint 1;\rprint "c\rd";\r\nprint nil + 1;\r\n'
+    result = run(tmp_path, source, *scanner)
+    assert result.stdout == "a\nb\n1\nc\nd\nOperands must both be numbers or strings\n[line: 6]\n"
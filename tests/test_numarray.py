@@ -0,0 +1,140 @@
+'''
+NumArray on both of its backends, loaded with and without NumPy, and
+through `Lox.py` on every engine. Results must match what a Lox loop over
+the same numbers computes.
+'''
+
+from functools import reduce
+import importlib.util
+import math
+import operator
+import os
+import random
+import sys
+
+import pytest
+
+from test_engines import ENGINES, ROOT, output, run
+
+sys.path.insert(0, ROOT)
+
+from LoxCallable import LoxList
+from RuntimeError import NativeError, RuntimeError
+from Token import Token
+from TokenType import TokenType
+
+NAME: Token = Token(TokenType.IDENTIFIER, "method", None, 1)
+
+@pytest.fixture(params=["fallback", "numpy"])
+def backend(request, monkeypatch):
+    if request.param == "numpy":
+        pytest.importorskip("numpy")
+    else:
+        # A None entry makes `import numpy` raise ImportError.
+        monkeypatch.setitem(sys.modules, "numpy", None)
+    spec = importlib.util.spec_from_file_location(f"NumArray_{request.param}",
+                                                  os.path.join(ROOT, "NumArray.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    assert (module.numpy is None) == (request.param == "fallback")
+    return module
+
+def make(backend, values):
+    return backend.makeNumArray(LoxList([float(value) for value in values]))
+
+def call(array, method, *arguments):
+    return array.methods[method][1](array, NAME, *arguments)
+
+def values(array):
+    return call(array, "toList").values
+
+def test_sum_adds_left_to_right(backend):
+    numbers = [0.1] * 10 + [random.Random(7).uniform(-1e6, 1e6) for _ in range(1000)]
+    loop = reduce(operator.add, numbers, 0.0)
+    assert loop != math.fsum(numbers)
+    assert call(make(backend, numbers), "sum") == loop
+    assert call(make(backend, []), "sum") == 0.0
+
+def test_dot_adds_left_to_right(backend):
+    rng = random.Random(11)
+    left = [rng.uniform(-1e3, 1e3) for _ in range(1000)]
+    right = [rng.uniform(-1e3, 1e3) for _ in range(1000)]
+    loop = reduce(operator.add, map(operator.mul, left, right), 0.0)
+    assert call(make(backend, left), "dot", make(backend, right)) == loop
+
+def test_element_wise(backend):
+    xs = make(backend, [1, 2, 3])
+    assert values(call(xs, "add", 0.5)) == [1.5, 2.5, 3.5]
+    assert values(call(xs, "sub", make(backend, [3, 2, 1]))) == [-2.0, 0.0, 2.0]
+    assert values(call(xs, "mul", xs)) == [1.0, 4.0, 9.0]
+    assert values(call(xs, "div", 4.0)) == [0.25, 0.5, 0.75]
+    assert (call(xs, "min"), call(xs, "max"), call(xs, "length")) == (1.0, 3.0, 3.0)
+    assert values(xs) == [1.0, 2.0, 3.0]
+
+def test_division_by_zero(backend):
+    xs = make(backend, [1, 2])
+    with pytest.raises(RuntimeError, match="Division by zero."):
+        call(xs, "div", 0.0)
+    with pytest.raises(RuntimeError, match="Division by zero."):
+        call(xs, "div", make(backend, [1, -0.0]))
+
+def test_slice_bounds(backend):
+    xs = make(backend, [1, 2, 3])
+    assert values(call(xs, "slice", 0.0, 3.0)) == [1.0, 2.0, 3.0]
+    assert values(call(xs, "slice", 3.0, 3.0)) == []
+    part = call(xs, "slice", 1.0, 2.0)
+    call(part, "set", 0.0, 9.0)
+    assert values(xs) == [1.0, 2.0, 3.0]
+    for start, end, message in [(0.0, 4.0, "Index out of range."),
+                                (-1.0, 1.0, "Index out of range."),
+                                (2.0, 1.0, "Slice ends before it starts."),
+                                (0.5, 1.0, "Index must be a whole number.")]:
+        with pytest.raises(RuntimeError, match=message):
+            call(xs, "slice", start, end)
+
+def test_length_mismatch(backend):
+    xs = make(backend, [1, 2, 3])
+    with pytest.raises(RuntimeError, match="NumArrays must have the same length."):
+        call(xs, "dot", make(backend, [1, 2]))
+    with pytest.raises(RuntimeError, match="NumArrays must have the same length."):
+        call(xs, "add", make(backend, [1, 2, 3, 4]))
+    with pytest.raises(RuntimeError, match="Operand must be a NumArray."):
+        call(xs, "dot", 2.0)
+
+def test_constructor_errors(backend):
+    assert values(backend.makeNumArray(2.0)) == [0.0, 0.0]
+    for source, message in [(1.5, "NumArray length must be a whole number."),
+                            (-1.0, "NumArray length must be a whole number."),
+                            (LoxList([1.0, "x"]), "NumArray can only hold numbers."),
+                            ("x", "NumArray takes a length or a List of numbers.")]:
+        with pytest.raises(NativeError, match=message):
+            backend.makeNumArray(source)
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_matches_lox_loop(tmp_path, engine):
+    source = '''
+    var list = List(); var x = 0.1;
+    for (var i = 0; i < 200; i = i + 1) { list.append(x); x = x * 1.37 - 0.5; }
+    var total = 0; var squares = 0;
+    for (var i = 0; i < list.length(); i = i + 1) {
+      total = total + list.get(i);
+      squares = squares + list.get(i) * list.get(i);
+    }
+    var xs = NumArray(list);
+    print xs.sum() == total; print xs.dot(xs) == squares;
+    print xs.slice(1, 3).length(); print NumArray(3).add(1);
+    '''
+    assert output(tmp_path, source, *ENGINES[engine]).splitlines() == [
+        "true", "true", "2", "NumArray[1, 1, 1]"]
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize("call, message", [
+    ("NumArray(2).div(0)", "Division by zero."),
+    ("NumArray(2).dot(NumArray(3))", "NumArrays must have the same length."),
+    ("NumArray(2).slice(1, 3)", "Index out of range."),
+    ("NumArray(0.5)", "NumArray length must be a whole number."),
+])
+def test_errors_on_every_engine(tmp_path, engine, call, message):
+    result = run(tmp_path, f"print 1;\nprint {call};", *ENGINES[engine])
+    assert result.stdout == f"1\n{message}\n[line: 2]\n"
+    assert result.returncode == 70
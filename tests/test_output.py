@@ -0,0 +1,56 @@
+'''
+The output sinks, used directly and through `Lox.py`.
+'''
+
+import io
+import os
+import subprocess
+import sys
+import time
+
+ROOT: str = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from Output import IntervalSink, MemorySink, StreamSink
+
+def test_stream_sink_holds_output_until_limit():
+    stream = io.StringIO()
+    sink = StreamSink(stream, limit=8)
+    sink.write("abc\n")
+    assert stream.getvalue() == ""
+    sink.write("defg\n")
+    assert stream.getvalue() == "abc\ndefg\n"
+    sink.write("h\n")
+    sink.close()
+    assert stream.getvalue() == "abc\ndefg\nh\n"
+
+def test_interval_flushes_without_further_writes():
+    stream = io.StringIO()
+    sink = IntervalSink(StreamSink(stream), 0.05)
+    sink.write("early\n")
+    deadline = time.monotonic() + 5
+    while stream.getvalue() == "" and time.monotonic() < deadline:
+        time.sleep(0.01)
+    sink.close()
+    assert stream.getvalue() == "early\n"
+
+def test_memory_sink():
+    sink = MemorySink()
+    sink.write("a\n")
+    sink.write("b\n")
+    assert sink.text() == "a\nb\n"
+
+def test_flush_interval_during_long_computation(tmp_path):
+    script = tmp_path / "slow.lox"
+    script.write_text('print "started";\n'
+                      'for (var i = 0; i < 100000000; i = i + 1) {}\n'
+                      'print "done";\n')
+    process = subprocess.Popen([sys.executable, os.path.join(ROOT, "Lox.py"), "--no-cache",
+                                "--flush-interval", "0.05", str(script)],
+                               stdout=subprocess.PIPE, text=True, cwd=ROOT)
+    try:
+        assert process.stdout.readline() == "started\n"
+        assert process.poll() is None
+    finally:
+        process.kill()
+        process.wait()
@@ -0,0 +1,39 @@
+'''
+Runs the sample programs and the benchmarks on every engine and checks that
+each prints what the tree walker, the reference implementation, prints.
+'''
+
+import functools
+import glob
+import os
+import subprocess
+import sys
+
+import pytest
+
+from test_engines import ENGINES, ROOT
+
+PROGRAMS: list[str] = sorted(
+    os.path.relpath(path, ROOT)
+    for path in glob.glob(os.path.join(ROOT, "*.lox")) + glob.glob(os.path.join(ROOT, "benchmarks", "*.lox")))
+
+MODES: dict[str, list[str]] = {
+    **{engine: flags for engine, flags in ENGINES.items() if engine != "tree"},
+    "unoptimized": ["-O0"],
+    "memoize": ["--memoize"],
+}
+
+@functools.cache
+def output(program: str, *flags: str) -> str:
+    result = subprocess.run([sys.executable, os.path.join(ROOT, "Lox.py"), "--no-cache",
+                             *flags, program],
+                            capture_output=True, text=True, cwd=ROOT)
+    assert result.returncode == 0, result.stdout + result.stderr
+    return result.stdout
+
+@pytest.mark.parametrize("mode", MODES)
+@pytest.mark.parametrize("program", PROGRAMS)
+def test_matches_tree_walker(program, mode):
+    expected = output(program)
+    assert expected
+    assert output(program, *MODES[mode]) == expected
@@ -0,0 +1,57 @@
+'''
+The tree walker's own semantics, checked through `Lox.py`. It is the
+reference engine that the others are compared against, so these pin down
+what it prints.
+'''
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT: str = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def output(tmp_path, source: str) -> str:
+    script = tmp_path / "script.lox"
+    script.write_text(source)
+    return subprocess.run([sys.executable, os.path.join(ROOT, "Lox.py"), str(script)],
+                          capture_output=True, text=True, cwd=ROOT).stdout
+
+def test_booleans_print_in_lowercase(tmp_path):
+    assert output(tmp_path, "print true; print false; print 1 < 2; print nil;") == (
+        "true\nfalse\ntrue\nnil\n")
+
+def test_comparison_and_unary_operators(tmp_path):
+    source = ("var a_b = 4; print a_b; print 2 > 1; print 1 > 2; print 2 >= 2;"
+              "print !true; print -3; print 6 / 2 * 3;")
+    assert output(tmp_path, source) == "4\ntrue\nfalse\ntrue\nfalse\n-3\n9\n"
+
+def test_grouping_evaluates_its_expression(tmp_path):
+    assert output(tmp_path, 'print (1 + 2) * 3; print !(1 < 2); print ("a");') == "9\nfalse\na\n"
+
+def test_equality_takes_any_operands(tmp_path):
+    source = ('print "a" == "a"; print "a" == "b"; print nil == false;'
+              'print nil == nil; print true != nil; print 1 == "1";')
+    assert output(tmp_path, source).split() == ["true", "false", "false", "true", "true", "false"]
+
+@pytest.mark.parametrize("expression, message", [
+    ('"a" - 1', "Operands must be numbers."),
+    ('1 - "a"', "Operands must be numbers."),
+    ('-"a"', "Operand must be a number."),
+    ("-nil", "Operand must be a number."),
+])
+def test_subtraction_and_negation_check_operands(tmp_path, expression, message):
+    assert output(tmp_path, f"print {expression};") == f"{message}\n[line: 1]\n"
+
+def test_assigning_a_field_evaluates_to_the_value(tmp_path):
+    assert output(tmp_path, "class A {} var a = A(); print a.x = 3; print a.x;") == "3\n3\n"
+
+@pytest.mark.parametrize("source, message", [
+    ("print b;", "Undefined variable 'b'."),
+    ("b = 1;", "Undefined variable 'b'."),
+    ("class A {} print A().y;", "Undefined property 'y'."),
+    ("print 1();", "Can only call functions and classes."),
+])
+def test_runtime_errors_are_lox_errors(tmp_path, source, message):
+    assert output(tmp_path, source) == f"{message}\n[line: 1]\n"
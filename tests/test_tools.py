@@ -0,0 +1,177 @@
+'''
+The driver's diagnostic and tuning options: the profiler, memoization,
+execution hooks and `--stats`.
+'''
+
+import ast
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from test_engines import ENGINES, ROOT, run
+
+sys.path.insert(0, ROOT)
+
+import Lox
+from Hooks import Hook
+from Interpreter import Interpreter
+from Output import MemorySink
+from Scanner import Scanner
+
+FIB: str = '''
+fun fib(n) { if (n < 2) return n; return fib(n - 1) + fib(n - 2); }
+print fib(22);
+'''
+
+@pytest.mark.parametrize("mode", ["sample", "trace"])
+@pytest.mark.parametrize("extra", [["--stats"], ["--max-frames", "500"],
+                                   ["--stats", "--max-frames", "500"]])
+def test_profiler_with_wrapped_calls(tmp_path, mode, extra):
+    result = run(tmp_path, FIB, "--profile", "--profile-mode", mode, *extra)
+    assert result.returncode == 0
+    assert result.stdout == "17711\n"
+    assert "Traceback" not in result.stderr
+    rows = [line.split() for line in result.stderr.splitlines()]
+    assert any(row and row[0] == "fib:2" for row in rows), result.stderr
+
+def memo(tmp_path, source: str, *flags: str) -> tuple[list[str], dict]:
+    result = run(tmp_path, source, "--memoize", "--memo-stats", *flags)
+    assert result.returncode == 0, result.stderr
+    report = result.stderr.strip().splitlines()[-1]
+    assert report.startswith("memo: ")
+    return result.stdout.split(), ast.literal_eval(report.removeprefix("memo: "))
+
+def test_memoize_reuses_pure_results(tmp_path):
+    printed, report = memo(tmp_path, FIB)
+    assert printed == ["17711"]
+    assert report["misses"] == 23
+    assert report["hits"] == 20
+
+@pytest.mark.parametrize("engine", [[], ["--engine=closure"]])
+@pytest.mark.parametrize("impure", [
+    "var base = 1; fun f(x) { return x + base; }",
+    "fun f(x) { print x; return x; }",
+    "fun f(x) { return clock() * 0 + x; }",
+    "class C {} fun f(x) { var c = C(); c.x = x; return c.x; }",
+    "fun g(x) { print x; return x; } fun f(x) { return g(x); }",
+    "fun id(x) { return x; } fun loud(x) { print x; return x; } fun f(x) { return id(x); } id = loud;",
+    "fun f(x) { fun inner() { return x; } return inner(); }",
+])
+def test_memoize_refuses_impure_functions(tmp_path, engine, impure):
+    printed, report = memo(tmp_path, impure + "\nvar a = f(1); var b = f(1);", *engine)
+    assert (report["hits"], report["misses"], report["entries"]) == (0, 0, 0)
+
+def test_memoize_sees_changing_globals(tmp_path):
+    source = "var base = 1; fun f(x) { return x + base; } print f(1); base = 10; print f(1);"
+    assert memo(tmp_path, source)[0] == ["2", "11"]
+
+def test_memo_size_evicts_least_recently_used(tmp_path):
+    source = '''
+    fun square(x) { return x * x; }
+    square(1); square(2); square(1); square(3);
+    square(1); square(2);
+    '''
+    printed, report = memo(tmp_path, source, "--memo-size", "2")
+    # 2 is evicted by 3, then 1 is the most recent and stays.
+    assert report == {"hits": 2, "misses": 4, "hit rate": "33.3%", "evictions": 2, "entries": 2}
+
+class Recorder(Hook):
+    def __init__(self) -> None:
+        self.events: list[tuple[str, str]] = []
+
+    def statement(self, interpreter, stmt) -> None:
+        self.events.append(("statement", type(stmt).__name__))
+
+    def call(self, interpreter, expr) -> None:
+        self.events.append(("call", expr.callee.name.lexeme))
+
+    def returned(self, interpreter, expr, value) -> None:
+        self.events.append(("returned", interpreter.stringify(value)))
+
+    def error(self, interpreter, error) -> None:
+        self.events.append(("error", str(error)))
+
+def interpret(interpreter: Interpreter, source: str) -> str:
+    interpreter.output = MemorySink()
+    interpreter.interpret(Lox.frontEnd(Scanner(source).scanTokens()))
+    return interpreter.output.text()
+
+HOOKED: tuple[str, ...] = ("execute", "evaluate", "visitCallExpr")
+
+def test_hooks_fire(capsys):
+    interpreter = Interpreter()
+    recorder = Recorder()
+    interpreter.addHook(recorder)
+    printed = interpret(interpreter, "fun f(x) { return x + 1; }\nprint f(1);\nprint nil + 1;")
+    assert printed == "2\n"
+    assert recorder.events == [
+        ("statement", "Function"),
+        ("statement", "Print"),
+        ("call", "f"),
+        ("statement", "Return"),
+        ("returned", "2"),
+        ("statement", "Print"),
+        ("error", "Operands must both be numbers or strings"),
+    ]
+    assert capsys.readouterr().out == "Operands must both be numbers or strings\n[line: 3]\n"
+
+def test_hooks_wrap_only_the_events_they_override():
+    interpreter = Interpreter()
+
+    class Calls(Hook):
+        def call(self, interpreter, expr) -> None:
+            ...
+    calls = Calls()
+    interpreter.addHook(calls)
+    assert [name for name in HOOKED if name in vars(interpreter)] == ["visitCallExpr"]
+
+    interpreter.addHook(Hook())
+    assert [name for name in HOOKED if name in vars(interpreter)] == ["visitCallExpr"]
+
+def test_removed_hooks_cost_nothing():
+    interpreter = Interpreter()
+    recorder = Recorder()
+    interpreter.addHook(recorder)
+    interpreter.removeHook(recorder)
+    # The methods are the class's own again, not wrappers that find no hooks.
+    assert not any(name in vars(interpreter) for name in HOOKED)
+    assert interpret(interpreter, "fun f(x) { return x + 1; } print f(1);") == "2\n"
+    assert recorder.events == []
+
+STATS: str = '''
+class P { init(x) { this.x = x; } get() { return this.x; } }
+fun f(n) { return P(n).get(); }
+var t = 0;
+for (var i = 0; i < 10; i = i + 1) t = t + f(i);
+print t;
+'''
+
+PHASES: list[str] = ["scan", "parse", "resolve", "optimize", "execute"]
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_stats_json(tmp_path, engine):
+    result = run(tmp_path, STATS, "--stats", "--stats-format", "json", *ENGINES[engine])
+    assert result.stdout == "45\n"
+    report = json.loads(result.stderr)
+    assert report["memory"] == "peak resident growth"
+    assert list(report["phases"]) == PHASES
+    for phase in report["phases"].values():
+        assert phase["seconds"] >= 0 and isinstance(phase["peak bytes"], int)
+    counts = report["counts"]
+    assert (counts["tokens"], counts["nodes"], counts["instances"], counts["calls"]) == (78, 41, 10, 30)
+
+def test_stats_text(tmp_path):
+    result = run(tmp_path, STATS, "--stats", "--stats-trace-memory")
+    assert result.stdout == "45\n"
+    lines = result.stderr.splitlines()
+    assert lines[0].split() == ["phase", "ms", "peak", "KiB", "(traced", "allocations)"]
+    for line, phase in zip(lines[1:], PHASES):
+        name, ms, kib = line.split()
+        assert name == phase and float(ms) >= 0 and float(kib) >= 0
+    assert lines[6].startswith("peak resident ")
+    assert lines[7] == ""
+    counts = {name: int(count) for name, count in map(str.split, lines[8:])}
+    assert counts == {"tokens": 78, "nodes": 41, "environments": 31, "instances": 10, "calls": 30}